@@ -5,11 +5,30 @@ from tkinter import filedialog, messagebox, simpledialog
 import os
 import sys
 import shutil
+import errno
 import threading
+import multiprocessing
 import time
+import platform
 import json
+import collections
+import hashlib
+import zipfile
+import tarfile
+import argparse
+import ast
+import socket
+import socketserver
+import uuid
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from bs4 import BeautifulSoup # Kept for HTML mode, but lxml is optional if only using HTML mode lightly
 import re # Import regex for parsing AI response
+try:
+    import numpy as np # Optional: only needed for the filename classifier fallback
+except ImportError:
+    np = None
 
 # --- 在文件顶部添加新的映射字典 ---
 known_missing_key_to_subdir = {
@@ -25,6 +44,58 @@ CONFIG_FILE = "comfyui_mover_config.txt" # Config filename
 folder_paths = None # To store imported ComfyUI folder_paths module
 reference_data = None # 新增: 用于存储加载的 JSON 数据
 reference_data_path = "extracted_models.json" # 新增:
+reference_index = None # 由 reference_data 构建的 {相对路径/文件名: (目标关键字, 相对路径)} 索引
+filename_classifier = None # 由参考索引训练的文件名分类器 (需要 numpy)
+CLASSIFIER_SUFFIX = ".classifier.npz" # 分类器保存在参考 JSON 旁边: extracted_models.classifier.npz
+CLASSIFIER_MIN_CONFIDENCE = 0.9 # 分类器结果被采用的最低置信度 (校准得到的阈值不会低于此值)
+CLASSIFIER_TARGET_PRECISION = 0.95 # 校准: 交叉验证中 (按类别) 达到此准确率的最低置信度作为该类别的阈值
+CLASSIFIER_MIN_CLASS_SUPPORT = 20 # 训练样本少于此数的类别, 其预测从不自动采用
+CLASSIFIER_MIN_CALIBRATION_HITS = 5 # 校准时某阈值下至少要有这么多留出样本被采用, 准确率才有意义
+CLASSIFIER_THRESHOLD_GRID = (0.9, 0.95, 0.98, 0.99, 0.995, 0.999, 0.9999) # 校准时尝试的阈值
+CLASSIFIER_MIN_WORD_COVERAGE = 0.5 # 文件名中至少这一比例的单词在训练数据中出现过, 否则不预测
+# 文件名中出现这些词时表示其所属的文件夹关键字 (相邻单词去掉分隔符后也会匹配, 如 'ip-adapter' -> 'ipadapter');
+# 训练数据中没有该类别, 或预测结果与之不同时, 分类器拒绝预测 (而不是猜成别的类别)
+CLASSIFIER_KEY_HINTS = {'lora': 'loras', 'locon': 'loras', 'lycoris': 'loras', 'loha': 'loras', 'lokr': 'loras',
+                        'embedding': 'embeddings', 'embeddings': 'embeddings', 'unet': 'unet',
+                        'hypernetwork': 'hypernetworks', 'ipadapter': 'ipadapter', 'faceid': 'ipadapter',
+                        'motion': 'animatediff_models', 'animatediff': 'animatediff_models'}
+CLASSIFIER_HINT_EXCEPTIONS = {'control', 'controlnet'} # 如 control-lora 属于 controlnet
+# 基础模型名称: 只有文件名中没有组件/类型词时才适用 (如 'sd_xl_base_1.0' 是 checkpoint, 'flux1-dev' 是单独的扩散模型)
+CLASSIFIER_BASE_MODEL_HINTS = {'sdxlbase': 'checkpoints', 'sdxlrefiner': 'checkpoints', 'sdxlturbo': 'checkpoints',
+                               'sd3medium': 'checkpoints', 'sd35large': 'checkpoints', 'sd35medium': 'checkpoints',
+                               'flux1': 'unet', 'flux1dev': 'unet', 'flux1schnell': 'unet'}
+CLASSIFIER_COMPONENT_WORDS = {'vae', 'ae', 'clip', 'encoder', 't5', 't5xxl', 'control', 'controlnet', 'adapter',
+                              'canny', 'depth', 'tile', 'openpose', 'upscaler', 'lora', 'ipadapter'}
+COPY_CHUNK_SIZE = 4 * 1024 * 1024 # 流式复制的块大小
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+# diffusers/transformers 的通用文件名: 只凭文件名无法确定是哪个模型 (或模型的哪个组件)
+GENERIC_MODEL_FILENAMES = {'diffusion_pytorch_model', 'pytorch_model', 'model', 'adapter_model', 'consolidated', 'flax_model', 'tf_model'}
+DIR_COPY_WORKERS = 8 # 跨设备复制目录模型时的并行线程数
+JOB_QUEUE_FILE = "comfyui_mover_jobs.json" # 任务队列服务的持久化队列
+JOB_API_PORT = 8765 # 任务队列服务的默认本地端口
+JOB_API_BACKLOG = 128 # 监听队列长度 (默认的 5 在大量并发提交时会导致连接被重置)
+JOB_API_RETRIES = 4 # 客户端遇到连接被拒绝/重置时的重试次数 (指数退避)
+JOB_BATCH_WINDOW = 2.0 # 合并批次: 最后一次提交后等待的秒数
+JOB_BATCH_MAX_DELAY = 10.0 # 合并批次: 最早的排队任务最多等待的秒数 (持续提交时也会开始运行)
+JOB_BATCH_MAX_FILES = 500 # 合并批次: 排队文件达到此数量时立即开始运行
+JOB_LOG_LINES = 200 # 每个任务保留的日志行数
+JOB_RETENTION_SECONDS = 24 * 3600 # 已结束的任务保留的时间
+JOB_HISTORY_LIMIT = 200 # 最多保留的已结束任务数 (队列文件大小和提交延迟因此有上限)
+MOVE_WORKERS = 4 # 移动调度器的工作线程数
+SCHEDULER_HISTORY = 200 # 队列视图中保留的已完成任务数
+THROUGHPUT_WINDOW = 5.0 # 计算吞吐量的时间窗口 (秒)
+QUEUE_REFRESH_MS = 500 # GUI 队列视图的刷新间隔
+IOPRIO_SET_SYSCALLS = {'x86_64': 251, 'amd64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'arm64': 30, 'armv7l': 314} # ioprio_set 系统调用号
+HASH_CACHE_FILE = "comfyui_mover_hash_cache.json" # 去重模式的持久化哈希缓存
+INGESTED_ARCHIVES_FILE = "comfyui_mover_ingested_archives.json" # 已导入但因含有其他文件而保留的压缩包 (之后的运行跳过)
+DEDUPE_SAMPLE_SIZE = 4096 # 每个采样点读取的字节数 (头/中/尾)
+DEDUPE_MAX_WORKERS = 8 # 哈希线程池大小 (I/O 密集, 不受 CPU 核数限制)
+BROWSER_SCAN_BATCH = 2000 # 下载文件夹浏览器每批加载的文件数
+BROWSER_ROW_HEIGHT = 20 # 浏览器表格的最小行高 (像素)
+NODE_SCAN_CACHE_FILE = "comfyui_mover_scan_cache.json" # 节点静态分析的缓存 (按文件 mtime)
+NODE_SCAN_POOL_MIN_FILES = 32 # 需要重新解析的文件少于此数时不启动进程池
+NODE_SCAN_SKIP_DIRS = {'node_modules', 'venv', 'site-packages', 'tests', 'test', 'docs', 'examples'} # 节点包中不扫描的目录
+FOLDER_PATHS_KEY_FUNCTIONS = {'get_filename_list', 'get_full_path', 'get_full_path_or_raise', 'get_folder_paths'} # 第一个参数是 folder_paths 关键字的函数
 
 # --- 新的映射: Output Type 到 folder_paths key ---
 # 优先使用这个映射
@@ -161,8 +232,8 @@ def save_paths_to_config(config_path, paths):
 
 # --- Helper Functions: HTML Parsing (Mode 1) ---
 # (parse_model_info_from_html remains the same)
-def parse_model_info_from_html(html_file_path, status_callback):
-    """Parse filename to node type mapping from HTML file"""
+def parse_model_info_from_html(html_file_path, status_callback, interactive=True):
+    """Parse filename to node type mapping from HTML file (interactive=False: no message boxes)"""
     mapping = {}
     status_callback(f"Starting to parse HTML file: {os.path.basename(html_file_path)}...")
     try:
@@ -177,7 +248,7 @@ def parse_model_info_from_html(html_file_path, status_callback):
         table = soup.find('table', id='modelTable')
         if not table:
             status_callback(f"Error: Could not find table with id 'modelTable' in HTML file.")
-            messagebox.showerror("HTML Parse Error", f"Could not find table with id 'modelTable' in HTML file.")
+            if interactive: messagebox.showerror("HTML Parse Error", f"Could not find table with id 'modelTable' in HTML file.")
             return None
 
         rows = table.find_all('tr')
@@ -195,7 +266,7 @@ def parse_model_info_from_html(html_file_path, status_callback):
 
         if filename_idx == -1 or nodetype_idx == -1:
             status_callback(f"Error: Could not locate '文件名' or '节点类型' columns in headers {headers_text}.")
-            messagebox.showerror("HTML Parse Error", f"Could not locate '文件名' or '节点类型' columns in headers {headers_text}.")
+            if interactive: messagebox.showerror("HTML Parse Error", f"Could not locate '文件名' or '节点类型' columns in headers {headers_text}.")
             return None
 
         for i, row in enumerate(rows[1:], 1):
@@ -211,11 +282,11 @@ def parse_model_info_from_html(html_file_path, status_callback):
 
     except FileNotFoundError:
         status_callback(f"Error: HTML file '{html_file_path}' not found.")
-        messagebox.showerror("File Not Found", f"HTML file '{html_file_path}' not found.")
+        if interactive: messagebox.showerror("File Not Found", f"HTML file '{html_file_path}' not found.")
         return None
     except Exception as e:
         status_callback(f"Critical error parsing HTML file: {e}")
-        messagebox.showerror("HTML Parse Error", f"Critical error parsing HTML file:\n{e}")
+        if interactive: messagebox.showerror("HTML Parse Error", f"Critical error parsing HTML file:\n{e}")
         return None
 
 # --- Helper Functions: AI Response Parsing (Mode 2) ---
@@ -262,13 +333,13 @@ def parse_ai_response(ai_text, status_callback):
 
 # --- Helper Functions: ComfyUI Interaction ---
 # (initialize_folder_paths, get_destination_folder remain the same)
-def initialize_folder_paths(comfyui_base_path, status_callback):
-    """Dynamically load ComfyUI's folder_paths module"""
+def initialize_folder_paths(comfyui_base_path, status_callback, interactive=True):
+    """Dynamically load ComfyUI's folder_paths module (interactive=False: no message boxes)"""
     global folder_paths
     status_callback(f"Attempting to load ComfyUI modules from {comfyui_base_path}...")
     if not os.path.isdir(comfyui_base_path):
          status_callback(f"Error: ComfyUI path '{comfyui_base_path}' is not a valid directory.")
-         messagebox.showerror("Path Error", f"ComfyUI path '{comfyui_base_path}' is not a valid directory.")
+         if interactive: messagebox.showerror("Path Error", f"ComfyUI path '{comfyui_base_path}' is not a valid directory.")
          return False
 
     original_sys_path = list(sys.path)
@@ -285,11 +356,11 @@ def initialize_folder_paths(comfyui_base_path, status_callback):
                 folder_paths = importlib.import_module('folder_paths')
         except ImportError as e:
              status_callback(f"Error: Failed to import ComfyUI's folder_paths module from '{comfyui_base_path}'. Error: {e}")
-             messagebox.showerror("Import Error", f"Failed to import ComfyUI's folder_paths module from '{comfyui_base_path}'.\nCheck path and ensure folder_paths.py exists.\nError: {e}")
+             if interactive: messagebox.showerror("Import Error", f"Failed to import ComfyUI's folder_paths module from '{comfyui_base_path}'.\nCheck path and ensure folder_paths.py exists.\nError: {e}")
              return False
         except Exception as e:
              status_callback(f"Error during folder_paths import: {e}")
-             messagebox.showerror("Import Error", f"An unexpected error occurred during folder_paths import:\n{e}")
+             if interactive: messagebox.showerror("Import Error", f"An unexpected error occurred during folder_paths import:\n{e}")
              return False
 
         if hasattr(folder_paths, 'init'):
@@ -310,11 +381,23 @@ def initialize_folder_paths(comfyui_base_path, status_callback):
 
     except Exception as e:
         status_callback(f"Error loading ComfyUI folder_paths: {e}")
-        messagebox.showerror("Loading Error", f"Error loading ComfyUI folder_paths:\n{e}")
+        if interactive: messagebox.showerror("Loading Error", f"Error loading ComfyUI folder_paths:\n{e}")
         return False
     finally:
         sys.path = original_sys_path
 
+def try_initialize_folder_paths(comfyui_base_path, status_callback):
+    """
+    Load folder_paths for tasks that can run without it (静态节点扫描):
+    加载失败只输出一条警告, 不作为错误报告.
+    """
+    messages = []
+    if initialize_folder_paths(comfyui_base_path, messages.append, interactive=False):
+        return True
+    reason = messages[-1].rsplit(": ", 1)[-1] if messages else ""
+    status_callback(f"Warning: ComfyUI's folder_paths module could not be loaded ({reason}); continuing without it.")
+    return False
+
 # --- 修改后的 get_destination_folder 函数 ---
 def get_destination_folder(model_type_key, comfyui_base_path, status_callback):
     """Get the preferred destination folder path, falling back to known defaults."""
@@ -323,50 +406,2855 @@ def get_destination_folder(model_type_key, comfyui_base_path, status_callback):
         status_callback("错误: folder_paths 模块未成功加载。")
         return None
 
-    # 统一使用小写关键字进行查找，增加兼容性
-    model_type_key_lower = model_type_key.lower()
+    # 统一使用小写关键字进行查找，增加兼容性
+    model_type_key_lower = model_type_key.lower()
+
+    target_folder = None # 初始化目标文件夹
+
+    try:
+        # 1. 优先尝试从 ComfyUI 配置获取路径
+        paths = folder_paths.get_folder_paths(model_type_key_lower)
+        if paths:
+            target_folder = paths[0] # 使用 ComfyUI 官方/用户配置的路径
+            status_callback(f"信息: 使用 ComfyUI 配置路径 '{target_folder}' (关键字: '{model_type_key_lower}')")
+
+    except KeyError:
+        # 2. 如果 ComfyUI 不认识这个关键字 (KeyError)，尝试从我们的备选默认路径查找
+        status_callback(f"信息: ComfyUI 配置中未找到关键字 '{model_type_key_lower}'。尝试 Mover 默认路径...")
+        # *** 使用新的备选字典 ***
+        default_subdir = known_missing_key_to_subdir.get(model_type_key_lower)
+
+        if default_subdir:
+            # 构建默认路径: ComfyUI根目录/models/子目录名
+            target_folder = os.path.join(comfyui_base_path, "models", default_subdir)
+            status_callback(f"信息: 使用 Mover 默认路径 '{target_folder}' (关键字: '{model_type_key_lower}')")
+        else:
+            # 在 ComfyUI 配置和我们的备选默认路径中都找不到
+            status_callback(f"错误: 无法为关键字 '{model_type_key_lower}' 确定目标文件夹。请检查 ComfyUI 配置或 Mover 的内置映射。")
+            return None # 确实无法处理
+
+    except Exception as e:
+        # 其他访问 folder_paths 的错误
+        status_callback(f"错误: 获取 ComfyUI 路径时出错 (关键字 '{model_type_key_lower}'): {e}")
+        return None
+
+    # 3. 如果找到了路径 (无论是来自 ComfyUI 配置还是 Mover 默认)，则创建目录并返回
+    if target_folder:
+        try:
+            os.makedirs(target_folder, exist_ok=True) # 确保目录存在
+            return target_folder
+        except OSError as e:
+             status_callback(f"错误: 创建目标目录 '{target_folder}' 失败: {e}")
+             return None
+    else:
+        # 如果 get_folder_paths 返回空列表 (理论上不常见，但处理一下)
+        status_callback(f"警告: 未能为关键字 '{model_type_key_lower}' 获取有效路径。")
+        return None
+
+
+# --- Helper Functions: Reference Data & Single File Move ---
+def load_reference_data(status_callback):
+    """Load extracted_models.json into reference_data if it isn't loaded yet. Returns True on success."""
+    global reference_data, reference_index, filename_classifier
+    if reference_data is not None:
+        return True
+    ref_path = os.path.join(get_script_dir(), reference_data_path)
+    if not os.path.exists(ref_path):
+        status_callback(f"错误: 参考 JSON 文件 '{reference_data_path}' 未在脚本目录中找到。")
+        return False
+    try:
+        status_callback(f"正在加载参考数据: {reference_data_path}...")
+        with open(ref_path, 'r', encoding='utf-8') as f_ref:
+            reference_data = json.load(f_ref)
+        reference_index = None # 参考数据变化后需要重建索引 (和分类器)
+        filename_classifier = None
+        register_reference_folder_keys(reference_data)
+        status_callback("参考数据加载成功。")
+        return True
+    except Exception as e_ref:
+        status_callback(f"错误: 加载参考 JSON '{ref_path}' 失败: {e_ref}")
+        return False
+
+def peek_destination_folder(model_type_key, comfyui_base_path):
+    """Like get_destination_folder, but without logging or creating directories. Returns None if unknown."""
+    if not folder_paths:
+        return None
+    model_type_key_lower = model_type_key.lower()
+    try:
+        paths = folder_paths.get_folder_paths(model_type_key_lower)
+        return paths[0] if paths else None
+    except KeyError:
+        default_subdir = known_missing_key_to_subdir.get(model_type_key_lower)
+        return os.path.join(comfyui_base_path, "models", default_subdir) if default_subdir else None
+    except Exception:
+        return None
+
+def is_same_device(path, folder):
+    """Check whether path and folder (or its nearest existing parent) are on the same filesystem"""
+    folder = os.path.abspath(folder)
+    while not os.path.exists(folder):
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            return False
+        folder = parent
+    try:
+        return os.stat(path).st_dev == os.stat(folder).st_dev
+    except OSError:
+        return False
+
+def _move_file(source_path, destination_path, control=None, progress=None):
+    """
+    Move a file. 同一设备时直接重命名 (瞬时完成); 跨设备时分块复制后删除源文件,
+    取消时源文件保持不变, 也不会留下不完整的目标文件.
+    st_dev 相同但重命名仍返回 EXDEV 时 (绑定挂载、overlayfs 等) 同样退回到分块复制.
+    """
+    if is_same_device(source_path, os.path.dirname(destination_path)):
+        if control is not None:
+            control.checkpoint()
+        try:
+            os.replace(source_path, destination_path)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    with open(source_path, 'rb') as src:
+        stream_to_file(src, destination_path, control=control, progress=progress)
+    shutil.copystat(source_path, destination_path)
+    os.remove(source_path)
+
+def model_file_destination(target_folder, mapped_filename):
+    """Destination path of a model file: target_folder plus the sub directories of mapped_filename"""
+    sub_dirs = os.path.dirname(mapped_filename)
+    final_target_folder = os.path.join(target_folder, sub_dirs) if sub_dirs else target_folder
+    return os.path.join(final_target_folder, os.path.basename(mapped_filename))
+
+def move_model_file(source_path, target_key, mapped_filename, target_folder, status_callback, control=None, progress=None):
+    """
+    Move one model file into target_folder (resolved for target_key when the move was planned),
+    keeping the sub directories of mapped_filename.
+    Returns 'moved', 'overwritten', 'skipped' or 'error'; raises MoveCancelled if cancelled via control.
+    """
+    if not target_folder:
+        status_callback(f"  -> 跳过: 无法为关键字 '{target_key}' 确定或创建目标文件夹。")
+        return 'skipped'
+
+    # 构建目标路径，保留原始映射文件名中的子目录结构
+    dest_filename = os.path.basename(mapped_filename) # 用映射源的文件名部分
+    sub_dirs = os.path.dirname(mapped_filename)     # 用映射源的子目录部分
+    final_target_folder = os.path.join(target_folder, sub_dirs) if sub_dirs else target_folder
+    destination_path = os.path.join(final_target_folder, dest_filename)
+
+    status_callback(f"  -> 目标类型 '{target_key}'")
+    try:
+        # 确保目标目录存在
+        os.makedirs(final_target_folder, exist_ok=True)
+
+        target_exists = os.path.exists(destination_path)
+        # 构建相对路径用于日志显示
+        log_dest_path = os.path.join(os.path.basename(target_folder), sub_dirs, dest_filename) if sub_dirs else os.path.join(os.path.basename(target_folder), dest_filename)
+
+        if target_exists:
+            status_callback(f"  -> 移动 (覆盖!) 到: ...{os.sep}{log_dest_path}")
+        else:
+            status_callback(f"  -> 移动到: ...{os.sep}{log_dest_path}")
+
+        _move_file(source_path, destination_path, control, progress)
+
+        if target_exists:
+            status_callback(f"  -> 覆盖成功!")
+            return 'overwritten'
+        status_callback(f"  -> 移动成功!")
+        return 'moved'
+    except MoveCancelled:
+        status_callback(f"  -> 已取消: {os.path.basename(source_path)}")
+        raise
+    except Exception as move_e:
+        status_callback(f"  -> 错误: 移动文件 {os.path.basename(source_path)} 时出错: {move_e}")
+        return 'error'
+
+
+# --- Helper Functions: Folder Key Resolution ---
+def resolve_folder_key_for_nodetype(node_type, status_callback=None):
+    """
+    Map a loader node type to a folder_paths key.
+    先用 JSON reference_data 中的 output_types 映射, 找不到再用 nodetype_to_folderkey 备选映射.
+    """
+    if reference_data and node_type in reference_data:
+        # 节点扫描生成的条目带有 INPUT_TYPES 中使用的 folder_paths 关键字, 只有一个时直接使用
+        folder_keys = reference_data[node_type].get('folder_keys', [])
+        if len(folder_keys) == 1:
+            return folder_keys[0]
+        for out_type in reference_data[node_type].get('output_types', []):
+            # 尝试在 output_type_to_folder_map 中查找 (统一转大写匹配)
+            potential_key = output_type_to_folder_map.get(out_type.upper())
+            if potential_key:
+                return potential_key # 找到第一个匹配就用它
+
+    target_key = nodetype_to_folderkey.get(node_type)
+    if target_key and status_callback:
+        status_callback(f"  信息: 节点类型 '{node_type}' 使用备选映射 -> '{target_key}'.")
+    if target_key is None and reference_data and node_type in reference_data:
+        folder_keys = reference_data[node_type].get('folder_keys', [])
+        target_key = folder_keys[0] if folder_keys else None
+    return target_key
+
+def build_reference_filename_index(ref_data):
+    """
+    Build {relative_path_lower: (folder_key, relative_path)} from the reference JSON.
+    同一文件可能出现在多个加载器下, 按 (加权) 多数投票决定目标关键字.
+    只有在参考数据中唯一的文件名才会额外以 basename 建立索引 (避免 'model.safetensors' 之类的通用名误匹配).
+    """
+    votes = {}
+    for node_type, loader_info in ref_data.items():
+        mapped_keys = []
+        for out_type in loader_info.get('output_types', []):
+            potential_key = output_type_to_folder_map.get(out_type.upper())
+            if potential_key and potential_key not in mapped_keys:
+                mapped_keys.append(potential_key)
+        folder_keys = loader_info.get('folder_keys', [])
+        if len(folder_keys) == 1:
+            mapped_keys = folder_keys # 扫描得到的唯一文件夹关键字最可靠
+        folder_key = mapped_keys[0] if mapped_keys else nodetype_to_folderkey.get(node_type)
+        if folder_key is None:
+            continue
+        # 输出多种模型类型 (或从多个文件夹取文件) 的"一体化"加载器 (如 Efficient Loader) 的文件列表混杂了 VAE/LoRA 等, 只给很低的权重
+        weight = 1.0 if len(mapped_keys) <= 1 and len(folder_keys) <= 1 else 0.1
+        for model_file in set(loader_info.get('model_files', [])):
+            if not is_likely_model_file(model_file):
+                continue
+            counter = votes.setdefault(model_file.replace('\\', '/'), {})
+            counter[folder_key] = counter.get(folder_key, 0) + weight
+
+    index = {}
+    basename_to_paths = {}
+    for rel_path, counter in votes.items():
+        folder_key = max(sorted(counter), key=lambda k: counter[k])
+        index[rel_path.lower()] = (folder_key, rel_path)
+        basename_to_paths.setdefault(rel_path.rsplit('/', 1)[-1].lower(), []).append(rel_path)
+    for basename, rel_paths in basename_to_paths.items():
+        if len(rel_paths) == 1 and basename not in index:
+            index[basename] = index[rel_paths[0].lower()]
+    return index
+
+def get_reference_index():
+    """Return the (lazily built) reference filename index, or {} if reference data isn't loaded"""
+    global reference_index
+    if reference_index is None:
+        if not reference_data:
+            return {}
+        reference_index = build_reference_filename_index(reference_data)
+        build_filename_classifier(reference_index) # 分类器与索引同时构建
+    return reference_index
+
+def lookup_by_path_suffix(rel_path, index, min_parts=1):
+    """
+    Look up a relative path in a {path_lower: value} index, trying the longest
+    path suffix first ('pack/vae/x.bin' -> 'vae/x.bin' -> 'x.bin').
+    min_parts=2 excludes the bare filename.
+    """
+    parts = rel_path.replace('\\', '/').lower().split('/')
+    for i in range(len(parts) - min_parts + 1):
+        value = index.get('/'.join(parts[i:]))
+        if value is not None:
+            return value
+    return None
+
+# --- Helper Functions: Filename Classifier (fallback for unlisted files) ---
+def tokenize_model_filename(filename):
+    """
+    Split a model filename into classifier features: 扩展名, 单词, 相邻单词二元组, 以及单词的字符三元组.
+    'sdxl_vae_fp16.safetensors' -> ['ext:safetensors', 'w:sdxl', ..., 'b:sdxl_vae', ..., 'c:#sd', ...]
+    """
+    name = os.path.basename(filename.replace('\\', '/')).lower()
+    stem, ext = os.path.splitext(name)
+    features = [f"ext:{ext.lstrip('.')}"]
+    words = [w for w in re.split(r'[^a-z0-9]+', stem) if w]
+    features.extend(f"w:{w}" for w in words)
+    features.extend(f"b:{a}_{b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f"#{word}#"
+        features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return features
+
+class FilenameClassifier:
+    """
+    Multinomial naive Bayes over filename tokens/n-grams, predicting a folder_paths key.
+    训练数据来自 extracted_models.json (每个文件的目标关键字由参考索引投票得出), 使用 NumPy 数组运算,
+    一次可预测数千个文件名.
+    """
+    def __init__(self, vocabulary, classes, feature_log_prob, class_log_prior, thresholds=None):
+        self.vocabulary = vocabulary # {feature: column}
+        self.classes = classes # [folder_key]
+        self.feature_log_prob = feature_log_prob # (n_features, n_classes)
+        self.class_log_prior = class_log_prior # (n_classes,)
+        self.thresholds = thresholds or {} # {folder_key: 校准后的置信度阈值}; 没有或 inf 表示从不采用该类别的预测
+
+    @classmethod
+    def train(cls, labelled_names, alpha=1.0):
+        """Train from [(filename, folder_key)]"""
+        classes = sorted({key for _, key in labelled_names})
+        class_ids = {key: i for i, key in enumerate(classes)}
+        vocabulary = {}
+        rows, cols, labels = [], [], []
+        for doc_id, (name, key) in enumerate(labelled_names):
+            for feature in tokenize_model_filename(name):
+                rows.append(doc_id)
+                cols.append(vocabulary.setdefault(feature, len(vocabulary)))
+            labels.append(class_ids[key])
+
+        labels = np.asarray(labels, dtype=np.int64)
+        counts = np.zeros((len(vocabulary), len(classes)), dtype=np.float64)
+        np.add.at(counts, (np.asarray(cols, dtype=np.int64), labels[np.asarray(rows, dtype=np.int64)]), 1.0)
+        smoothed = counts + alpha
+        feature_log_prob = np.log(smoothed) - np.log(smoothed.sum(axis=0, keepdims=True))
+        class_counts = np.bincount(labels, minlength=len(classes)).astype(np.float64)
+        class_log_prior = np.log(class_counts) - np.log(class_counts.sum())
+        return cls(vocabulary, classes, feature_log_prob, class_log_prior)
+
+    @classmethod
+    def calibrate_thresholds(cls, labelled_names, folds=5):
+        """
+        Pick a confidence threshold per class from cross-validated predictions on held-out folds:
+        每个类别取留出数据上准确率达到 CLASSIFIER_TARGET_PRECISION 的最低阈值 (不低于 CLASSIFIER_MIN_CONFIDENCE).
+        训练样本少于 CLASSIFIER_MIN_CLASS_SUPPORT 或达不到准确率的类别阈值为 inf (预测进入未匹配列表).
+        Returns {folder_key: threshold}.
+        """
+        support = collections.Counter(key for _, key in labelled_names)
+        thresholds = {key: float('inf') for key in support}
+        if len(labelled_names) < folds * 2:
+            return thresholds
+        confidences, predicted, correct = [], [], []
+        for fold in range(folds):
+            held_out = labelled_names[fold::folds]
+            training = [item for i, item in enumerate(labelled_names) if i % folds != fold]
+            model = cls.train(training)
+            for (name, key), (predicted_key, confidence) in zip(held_out, model.predict([name for name, _ in held_out])):
+                confidences.append(confidence)
+                predicted.append(predicted_key)
+                correct.append(predicted_key == key)
+        confidences, predicted, correct = np.asarray(confidences), np.asarray(predicted, dtype=object), np.asarray(correct)
+        for key in thresholds:
+            if support[key] < CLASSIFIER_MIN_CLASS_SUPPORT:
+                continue
+            for threshold in CLASSIFIER_THRESHOLD_GRID:
+                if threshold < CLASSIFIER_MIN_CONFIDENCE:
+                    continue
+                accepted = (predicted == key) & (confidences >= threshold)
+                if accepted.sum() >= CLASSIFIER_MIN_CALIBRATION_HITS and correct[accepted].mean() >= CLASSIFIER_TARGET_PRECISION:
+                    thresholds[key] = threshold
+                    break
+        return thresholds
+
+    def accepts(self, folder_key, confidence, min_confidence=None):
+        """
+        Whether a prediction may be used automatically. min_confidence replaces the calibrated threshold,
+        but classes without a calibrated threshold (样本太少或准确率不足) are never accepted.
+        """
+        threshold = self.thresholds.get(folder_key, float('inf')) if folder_key is not None else float('inf')
+        if threshold > 1:
+            return False
+        return confidence >= (threshold if min_confidence is None else min_confidence)
+
+    def describe_thresholds(self):
+        """'checkpoints 0.99, controlnet 0.99; 不自动采用: sams, ...' for the log"""
+        accepted = [f"{key} {self.thresholds[key]:g}" for key in self.classes if self.thresholds.get(key, float('inf')) <= 1]
+        rejected = [key for key in self.classes if self.thresholds.get(key, float('inf')) > 1]
+        text = ", ".join(accepted) if accepted else "无"
+        if rejected:
+            text += f"; 不自动采用: {', '.join(rejected)}"
+        return text
+
+    @staticmethod
+    def _hint_terms(words):
+        """Words plus 2-3 adjacent words joined without separators ('ip', 'adapter' -> 'ipadapter')"""
+        terms = set(words)
+        for n in (2, 3):
+            terms.update(''.join(words[i:i + n]) for i in range(len(words) - n + 1))
+        return terms
+
+    @classmethod
+    def hinted_key(cls, words):
+        """
+        Folder key implied by the filename's words, None if no hint applies, or '' if the hints disagree.
+        类型词 (CLASSIFIER_KEY_HINTS) 优先; 没有类型词和组件词时才使用基础模型名称.
+        """
+        terms = cls._hint_terms(words)
+        if CLASSIFIER_HINT_EXCEPTIONS.intersection(words):
+            keys = set()
+        else:
+            keys = {CLASSIFIER_KEY_HINTS[t] for t in terms if t in CLASSIFIER_KEY_HINTS}
+        if not keys and not CLASSIFIER_COMPONENT_WORDS.intersection(terms):
+            keys = {CLASSIFIER_BASE_MODEL_HINTS[t] for t in terms if t in CLASSIFIER_BASE_MODEL_HINTS}
+        if len(keys) > 1:
+            return ''
+        return keys.pop() if keys else None
+
+    def _refuses(self, features):
+        """
+        True if the filename points to a folder key the training data doesn't cover
+        (如 '..._lora' 而训练数据中没有 loras), or too few of its words were seen in training.
+        """
+        words = [f[2:] for f in features if f.startswith("w:")]
+        if not words:
+            return True
+        hinted_key = self.hinted_key(words)
+        if hinted_key is not None and hinted_key not in self.classes:
+            return True
+        known_words = sum(1 for word in words if f"w:{word}" in self.vocabulary)
+        return known_words / len(words) < CLASSIFIER_MIN_WORD_COVERAGE
+
+    def predict(self, filenames):
+        """
+        Return [(folder_key, confidence)] for a batch of filenames.
+        拒绝预测的文件名返回 (None, 0.0); 是否采用结果由调用者用 self.accepts() 决定.
+        文件名中的提示词指向的类别与预测不同时同样拒绝 (如 'sd_xl_base_1.0' 被预测为 controlnet).
+        """
+        if not filenames:
+            return []
+        doc_ids, cols = [], []
+        vocabulary = self.vocabulary
+        refused = np.zeros(len(filenames), dtype=bool)
+        hinted_keys = []
+        for doc_id, name in enumerate(filenames):
+            features = tokenize_model_filename(name)
+            refused[doc_id] = self._refuses(features)
+            hinted_keys.append(self.hinted_key([f[2:] for f in features if f.startswith("w:")]))
+            for feature in features:
+                col = vocabulary.get(feature)
+                if col is not None:
+                    doc_ids.append(doc_id)
+                    cols.append(col)
+
+        scores = np.tile(self.class_log_prior, (len(filenames), 1))
+        if cols:
+            np.add.at(scores, np.asarray(doc_ids, dtype=np.int64), self.feature_log_prob[np.asarray(cols, dtype=np.int64)])
+        # softmax 得到后验概率, 最大值作为置信度
+        scores -= scores.max(axis=1, keepdims=True)
+        probs = np.exp(scores)
+        probs /= probs.sum(axis=1, keepdims=True)
+        best = probs.argmax(axis=1)
+        confidence = probs[np.arange(len(filenames)), best]
+        # 没有任何已知特征的文件名只有先验概率, 不可信
+        known = np.zeros(len(filenames), dtype=bool)
+        if doc_ids:
+            known[np.asarray(doc_ids, dtype=np.int64)] = True
+        refused |= np.asarray([hint is not None and hint != self.classes[i] for hint, i in zip(hinted_keys, best)], dtype=bool)
+        confidence = np.where(known & ~refused, confidence, 0.0)
+        return [(None, 0.0) if r else (self.classes[i], float(c)) for i, c, r in zip(best, confidence, refused)]
+
+    def save(self, path, source_stamp):
+        """Serialize next to the reference JSON; source_stamp ties the model to that JSON's size/mtime"""
+        features = [None] * len(self.vocabulary)
+        for feature, col in self.vocabulary.items():
+            features[col] = feature
+        tmp_path = path + ".tmp.npz" # np.savez 会自动补 .npz 扩展名
+        np.savez_compressed(tmp_path, features=np.asarray(features), classes=np.asarray(self.classes),
+                            feature_log_prob=self.feature_log_prob, class_log_prior=self.class_log_prior,
+                            thresholds=np.asarray([self.thresholds.get(key, float('inf')) for key in self.classes]), source_stamp=np.asarray(source_stamp, dtype=np.int64))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, source_stamp):
+        """Load a serialized classifier, or return None if missing or trained from a different JSON"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if list(data['source_stamp']) != list(source_stamp) or 'thresholds' not in data:
+                    return None # 旧版本保存的模型没有按类别校准的阈值, 重新训练
+                vocabulary = {str(f): i for i, f in enumerate(data['features'])}
+                classes = [str(c) for c in data['classes']]
+                return cls(vocabulary, classes, data['feature_log_prob'], data['class_log_prior'],
+                           thresholds={key: float(t) for key, t in zip(classes, data['thresholds'])})
+        except Exception as e:
+            print(f"Error reading classifier '{path}': {e}")
+            return None
+
+def _reference_source_stamp():
+    ref_path = os.path.join(get_script_dir(), reference_data_path)
+    try:
+        st = os.stat(ref_path)
+        return ref_path, [st.st_size, st.st_mtime_ns]
+    except OSError:
+        return ref_path, [0, 0]
+
+def build_filename_classifier(index, status_callback=print):
+    """
+    Load the classifier serialized beside the reference JSON, or train it from the reference index
+    and save it there. Returns None if NumPy isn't installed or there is nothing to train on.
+    """
+    global filename_classifier
+    if np is None:
+        return None
+    ref_path, stamp = _reference_source_stamp()
+    model_path = os.path.splitext(ref_path)[0] + CLASSIFIER_SUFFIX
+    classifier = FilenameClassifier.load(model_path, stamp)
+    if classifier is None:
+        labelled = [(rel_path, key) for key, rel_path in set(index.values())]
+        if len(labelled) < 2:
+            return None
+        start_time = time.time()
+        labelled.sort()
+        classifier = FilenameClassifier.train(labelled)
+        classifier.thresholds = FilenameClassifier.calibrate_thresholds(labelled)
+        status_callback(f"文件名分类器训练完成: {len(labelled)} 个文件, {len(classifier.classes)} 个类别, "
+                        f"{len(classifier.vocabulary)} 个特征, 用时 {time.time() - start_time:.2f} 秒。"
+                        f"置信度阈值: {classifier.describe_thresholds()}")
+        try:
+            classifier.save(model_path, stamp)
+        except Exception as e:
+            status_callback(f"警告: 保存文件名分类器失败: {e}")
+    filename_classifier = classifier
+    return classifier
+
+def classify_unlisted_files(filenames, status_callback, min_confidence=None):
+    """
+    Fallback mapping for files that are not in the HTML metadata:
+    先按文件名精确查找参考数据, 再用文件名分类器 (置信度 >= 该类别的校准阈值, 或指定的 min_confidence).
+    Returns {filename: (target_key, filename)}.
+    """
+    mapping = {}
+    index = get_reference_index()
+    remaining = []
+    for filename in filenames:
+        match = index.get(filename.lower())
+        if match:
+            mapping[filename] = (match[0], filename)
+            status_callback(f"  参考数据: {filename} -> '{match[0]}'")
+        else:
+            remaining.append(filename)
+
+    if remaining and filename_classifier is not None:
+        for filename, (target_key, confidence) in zip(remaining, filename_classifier.predict(remaining)):
+            if target_key is None:
+                status_callback(f"  分类器: {filename} 不属于训练数据覆盖的类别, 跳过。")
+            elif filename_classifier.accepts(target_key, confidence, min_confidence):
+                mapping[filename] = (target_key, filename)
+                status_callback(f"  分类器: {filename} -> '{target_key}' (置信度 {confidence:.2f})")
+            else:
+                status_callback(f"  分类器: {filename} 置信度过低 ({target_key} {confidence:.2f}), 跳过。")
+    elif remaining:
+        status_callback(f"  信息: 文件名分类器不可用 (需要 numpy), {len(remaining)} 个未识别文件将被跳过。")
+    return mapping
+
+
+# --- Bandwidth Throttling & I/O Priority ---
+class TokenBucket:
+    """Token bucket limiting one device to `rate` bytes/s (0 = unlimited). The rate can change at any time."""
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = 0.0
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, num_bytes, control=None):
+        """Block until num_bytes may pass. Returns the seconds spent waiting."""
+        waited = 0.0
+        with self.lock: # 同一设备上的复制按顺序获取令牌
+            while True:
+                rate = self.rate
+                if not rate or rate <= 0:
+                    return waited
+                now = time.monotonic()
+                # 桶容量至少为一个块, 否则低于块大小的限速永远无法满足
+                capacity = max(rate, num_bytes)
+                self.tokens = min(capacity, self.tokens + (now - self.last) * rate)
+                self.last = now
+                if self.tokens >= num_bytes:
+                    self.tokens -= num_bytes
+                    return waited
+                delay = min((num_bytes - self.tokens) / rate, 0.2) # 分段睡眠, 以便及时响应限速调整和取消
+                time.sleep(delay)
+                waited += delay
+                if control is not None:
+                    control.checkpoint()
+
+class BandwidthLimiter:
+    """
+    Per-destination-device bandwidth limits for the copy path, adjustable at runtime.
+    默认限速作用于所有设备, 也可以按路径为单个设备单独设置; 同时记录因限速等待的总时间.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.default_rate = 0
+        self.device_rates = {} # {st_dev: (rate, path)}
+        self.buckets = {}
+        self.throttled_seconds = 0.0
+        self.idle_io = False
+        self._thread_state = threading.local()
+
+    def set_limit(self, bytes_per_sec, path=None):
+        """Set the limit in bytes/s (0 = unlimited) for all devices, or only for the device holding path"""
+        bytes_per_sec = max(int(bytes_per_sec or 0), 0)
+        with self.lock:
+            if path is None:
+                self.default_rate = bytes_per_sec
+            else:
+                device = os.stat(path).st_dev
+                if bytes_per_sec:
+                    self.device_rates[device] = (bytes_per_sec, path)
+                else:
+                    self.device_rates.pop(device, None)
+            for device, bucket in self.buckets.items():
+                bucket.rate = self._rate_for_device(device)
+
+    def _rate_for_device(self, device):
+        entry = self.device_rates.get(device)
+        return entry[0] if entry else self.default_rate
+
+    def acquire(self, device, num_bytes, control=None):
+        """Called by the copy loops after every chunk written to `device`"""
+        with self.lock:
+            bucket = self.buckets.get(device)
+            if bucket is None:
+                bucket = self.buckets[device] = TokenBucket(self._rate_for_device(device))
+        if not bucket.rate:
+            return
+        waited = bucket.consume(num_bytes, control)
+        if waited:
+            with self.lock:
+                self.throttled_seconds += waited
+
+    def set_idle_io(self, enabled):
+        """Request idle-class I/O priority for the move worker threads (Linux only)"""
+        self.idle_io = bool(enabled)
+
+    def apply_io_priority(self):
+        """
+        Apply the requested I/O priority to the calling thread if it changed. ioprio 只作用于调用线程:
+        由调度器工作线程在每个任务前调用, 也作为目录复制/zip 解压线程池的 initializer.
+        """
+        if getattr(self._thread_state, 'idle_io', False) != self.idle_io:
+            if set_io_priority(self.idle_io):
+                self._thread_state.idle_io = self.idle_io
+
+    def stats(self):
+        with self.lock:
+            return {
+                'limit': self.default_rate,
+                'device_limits': {path: rate for rate, path in self.device_rates.values()},
+                'throttled_seconds': round(self.throttled_seconds, 2),
+                'idle_io': self.idle_io,
+            }
+
+    def describe(self):
+        """Short description of the active limits, e.g. 'limit 50.0 MB/s'"""
+        stats = self.stats()
+        parts = []
+        if stats['limit']:
+            parts.append(f"limit {format_size(stats['limit'])}/s")
+        if stats['device_limits']:
+            parts.append(f"{len(stats['device_limits'])} device limit(s)")
+        if stats['idle_io']:
+            parts.append("idle I/O")
+        return ", ".join(parts)
+
+def set_io_priority(idle):
+    """
+    Set the calling thread's I/O scheduling class with ioprio_set(2): idle 或恢复默认.
+    只支持 Linux; 其他平台返回 False.
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+    syscall_nr = IOPRIO_SET_SYSCALLS.get(platform.machine().lower())
+    if syscall_nr is None:
+        return False
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        # IOPRIO_WHO_PROCESS=1, who=0 表示调用线程; IOPRIO_CLASS_IDLE=3, class 0 表示恢复默认
+        value = (3 << 13) if idle else 0
+        return libc.syscall(syscall_nr, 1, 0, value) == 0
+    except (OSError, AttributeError):
+        return False
+
+bandwidth_limiter = BandwidthLimiter() # 所有复制路径共享的限速器
+
+
+# --- Helper Functions: Streaming Copy & Archive Ingestion ---
+class MoveCancelled(Exception):
+    """Raised at a chunk boundary when a move has been cancelled"""
+
+class MoveConflict(Exception):
+    """Raised by MoveScheduler.submit when a path is already used by a queued or running task"""
+
+class MoveControl:
+    """
+    Cooperative pause/cancel flags, checked by the copy loops at every chunk boundary.
+    run_event 由调度器共享 (清除即暂停), cancel_event 属于单个任务.
+    """
+    def __init__(self, run_event=None):
+        if run_event is None:
+            run_event = threading.Event()
+            run_event.set()
+        self.run_event = run_event
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def checkpoint(self):
+        """Block while paused; raise MoveCancelled if cancelled"""
+        while not self.run_event.is_set() and not self.cancel_event.is_set():
+            self.run_event.wait(0.2)
+        if self.cancel_event.is_set():
+            raise MoveCancelled("操作已取消")
+
+def stream_to_file(src_fileobj, destination_path, chunk_size=COPY_CHUNK_SIZE, control=None, progress=None):
+    """
+    Stream a file object into destination_path. 先写入同目录下的临时 .part 文件再原子替换,
+    失败或取消时不会留下不完整的目标文件. Returns the number of bytes written.
+    每次调用使用唯一的临时文件名 (独占创建), 并发写入同一目标的两个任务不会互相截断.
+    control (MoveControl) 在每个块之前检查暂停/取消; progress(n) 在每个块写入后调用;
+    每个块都经过 bandwidth_limiter 按目标设备限速.
+    """
+    part_path = f"{destination_path}.{uuid.uuid4().hex[:12]}.part"
+    written = 0
+    device = os.stat(os.path.dirname(os.path.abspath(destination_path))).st_dev
+    try:
+        with open(part_path, 'xb') as out:
+            while True:
+                if control is not None:
+                    control.checkpoint()
+                chunk = src_fileobj.read(chunk_size)
+                if not chunk:
+                    break
+                out.write(chunk)
+                written += len(chunk)
+                bandwidth_limiter.acquire(device, len(chunk), control)
+                if progress is not None:
+                    progress(len(chunk))
+        os.replace(part_path, destination_path)
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+    return written
+
+def is_archive_file(filename):
+    """Check whether a filename looks like a supported model bundle archive"""
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def is_safe_member_name(member_name):
+    """Reject archive member names that are absolute or try to escape with '..'"""
+    name = member_name.replace('\\', '/')
+    if not name or name.startswith('/') or re.match(r'^[A-Za-z]:', name):
+        return False
+    return '..' not in name.split('/')
+
+def is_within_directory(base_dir, target_path):
+    """Check that target_path resolves to a location inside base_dir"""
+    base = os.path.realpath(base_dir)
+    target = os.path.realpath(target_path)
+    return target == base or target.startswith(base + os.sep)
+
+def is_generic_model_filename(filename):
+    """Check for names like 'diffusion_pytorch_model.safetensors' or 'model-00001-of-00002.safetensors'"""
+    stem = os.path.basename(filename.replace('\\', '/')).lower().split('.')[0]
+    return re.sub(r'-\d+-of-\d+$', '', stem) in GENERIC_MODEL_FILENAMES
+
+def classify_archive_member(member_name, mapped_index, reference_index_):
+    """
+    Classify an archive member. HTML 映射优先, 然后是参考数据索引.
+    子目录中的通用文件名 (如 'sdx/unet/diffusion_pytorch_model.safetensors') 只按包含目录的路径后缀匹配,
+    不会退回到只按文件名匹配, 否则多组件模型的各个组件会被放到同一个位置.
+    Returns (target_key, mapped_filename) or None.
+    """
+    nested = '/' in member_name.replace('\\', '/').strip('/')
+    min_parts = 2 if nested and is_generic_model_filename(member_name) else 1
+    match = lookup_by_path_suffix(member_name, mapped_index, min_parts)
+    if match is None:
+        match = lookup_by_path_suffix(member_name, reference_index_, min_parts)
+    return match
+
+def _list_zip_members(archive_path):
+    """Return the names of the regular file members of a zip archive"""
+    with zipfile.ZipFile(archive_path) as zf:
+        return [info.filename for info in zf.infolist() if not info.is_dir()]
+
+def _extract_members_from_zip(archive_path, jobs, status_callback, control=None, progress=None):
+    """Stream the given (member_name, destination_path) jobs out of a zip, using a private handle"""
+    results = []
+    with zipfile.ZipFile(archive_path) as zf:
+        for member_name, destination_path in jobs:
+            results.append(_extract_one_member(lambda: zf.open(member_name), member_name, destination_path, status_callback, control, progress))
+    return results
+
+def _extract_one_member(open_member, member_name, destination_path, status_callback, control=None, progress=None):
+    """Stream one member to its destination and return 'moved', 'overwritten' or 'error'"""
+    try:
+        target_exists = os.path.exists(destination_path)
+        with open_member() as src:
+            stream_to_file(src, destination_path, control=control, progress=progress)
+        status_callback(f"  -> {'覆盖' if target_exists else '解压'}成功: {member_name} -> {destination_path}")
+        return 'overwritten' if target_exists else 'moved'
+    except MoveCancelled:
+        raise
+    except Exception as e:
+        status_callback(f"  -> 错误: 解压 {member_name} 时出错: {e}")
+        return 'error'
+
+def ingest_archive(archive_path, filename_to_process_map, destination_folders, status_callback, control=None, progress=None):
+    """
+    Extract the model files of one zip/tar archive directly into their ComfyUI destinations.
+    destination_folders is the {folder_key: folder} map from resolve_archive_destinations(), built when the move was planned.
+
+    每个成员直接流式写入目标文件夹, 不经过临时解压目录. zip 文件中发往不同磁盘的成员并行处理
+    (每个设备一个线程); tar 以流模式只读取一遍, 每个成员读到时立即分类并解压.
+    多个成员解析到同一目标时不会互相覆盖: zip 中这些成员全部拒绝, tar 中拒绝后出现的成员 (记为错误).
+    没有错误时, 所有成员都已解压的压缩包被删除; 还含有其他文件的压缩包被记录为已导入, 之后的运行跳过它.
+    Returns a dict of counts: moved, overwritten, skipped, errors.
+    """
+    counts = {'moved': 0, 'overwritten': 0, 'skipped': 0, 'errors': 0}
+    archive_name = os.path.basename(archive_path)
+    mapped_index = {k.replace('\\', '/').lower(): v for k, v in filename_to_process_map.items()}
+    ref_index = get_reference_index()
+    ignored_members = [] # 不是模型文件的成员 (如 README), 不解压
+
+    def plan_member(member_name):
+        """Return the destination path for one member, or None (counted as skipped/error)"""
+        if not is_likely_model_file(os.path.basename(member_name)):
+            ignored_members.append(member_name)
+            return None
+        if not is_safe_member_name(member_name):
+            status_callback(f"  -> 跳过: 不安全的成员路径 '{member_name}' ({archive_name})")
+            counts['skipped'] += 1
+            return None
+        match = classify_archive_member(member_name, mapped_index, ref_index)
+        if match is None:
+            status_callback(f"  -> 跳过: 无法识别 '{member_name}' ({archive_name})")
+            counts['skipped'] += 1
+            return None
+        target_key, mapped_filename = match
+        target_folder = destination_folders.get(target_key.lower())
+        if not target_folder:
+            status_callback(f"  -> 跳过: 无法为关键字 '{target_key}' 确定或创建目标文件夹。")
+            counts['skipped'] += 1
+            return None
+
+        destination_path = os.path.join(target_folder, *mapped_filename.replace('\\', '/').split('/'))
+        if not is_within_directory(target_folder, destination_path):
+            status_callback(f"  -> 跳过: 目标路径 '{mapped_filename}' 超出目标文件夹。")
+            counts['skipped'] += 1
+            return None
+        try:
+            os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+        except OSError as e:
+            status_callback(f"  -> 错误: 创建目标目录失败: {e}")
+            counts['errors'] += 1
+            return None
+        return destination_path
+
+    results = []
+    try:
+        if zipfile.is_zipfile(archive_path):
+            members_by_destination = {} # {规范化的目标路径: [(member_name, destination_path)]}
+            for member_name in _list_zip_members(archive_path):
+                destination_path = plan_member(member_name)
+                if destination_path:
+                    members_by_destination.setdefault(os.path.normcase(destination_path), []).append((member_name, destination_path))
+            jobs_by_device = {} # {st_dev: [(member_name, destination_path)]}
+            for planned in members_by_destination.values():
+                if len(planned) > 1:
+                    names = ", ".join(f"'{member_name}'" for member_name, _ in planned)
+                    status_callback(f"  -> 错误: 成员 {names} 会写入同一目标 '{planned[0][1]}', 全部跳过 ({archive_name})")
+                    counts['errors'] += len(planned)
+                    continue
+                member_name, destination_path = planned[0]
+                device = os.stat(os.path.dirname(destination_path)).st_dev
+                jobs_by_device.setdefault(device, []).append((member_name, destination_path))
+            if jobs_by_device:
+                planned_count = sum(len(jobs) for jobs in jobs_by_device.values())
+                status_callback(f"  压缩包 '{archive_name}': {planned_count} 个成员将解压到 {len(jobs_by_device)} 个设备。")
+                # ioprio 按线程生效, 解压线程也要设置
+                with ThreadPoolExecutor(max_workers=len(jobs_by_device), initializer=bandwidth_limiter.apply_io_priority) as executor:
+                    futures = [executor.submit(_extract_members_from_zip, archive_path, jobs, status_callback, control, progress)
+                               for jobs in jobs_by_device.values()]
+                    for future in futures:
+                        results.extend(future.result())
+        else:
+            # 'r|*' 是流模式: 只能按顺序读取一遍, 不能回头, 所以边读边分类边解压
+            claimed = {} # {规范化的目标路径: 已解压到该处的成员}
+            with tarfile.open(archive_path, 'r|*') as tf:
+                for info in tf:
+                    # 只处理普通文件, 跳过符号链接/硬链接/设备文件
+                    if not info.isfile():
+                        continue
+                    destination_path = plan_member(info.name)
+                    if not destination_path:
+                        continue
+                    key = os.path.normcase(destination_path)
+                    if key in claimed:
+                        status_callback(f"  -> 错误: 成员 '{info.name}' 与 '{claimed[key]}' 会写入同一目标 '{destination_path}', 跳过 ({archive_name})")
+                        counts['errors'] += 1
+                        continue
+                    claimed[key] = info.name
+                    results.append(_extract_one_member(lambda: tf.extractfile(info), info.name, destination_path, status_callback, control, progress))
+    except (zipfile.BadZipFile, tarfile.TarError, OSError) as e:
+        status_callback(f"  -> 错误: 无法读取压缩包 '{archive_name}': {e}")
+        counts['errors'] += 1
+
+    if not results and not counts['errors']:
+        status_callback(f"  压缩包 '{archive_name}' 中没有可识别的模型文件。")
+
+    for result in results:
+        if result == 'error':
+            counts['errors'] += 1
+        else:
+            counts['moved'] += 1
+            if result == 'overwritten':
+                counts['overwritten'] += 1
+
+    # 导入成功后不再留下会被下一次运行重新解压的压缩包
+    if counts['moved'] and not counts['errors']:
+        try:
+            if counts['skipped'] or ignored_members:
+                mark_archive_ingested(archive_path)
+                status_callback(f"  压缩包 '{archive_name}' 中还有 {counts['skipped'] + len(ignored_members)} 个成员未导入, "
+                                f"保留压缩包; 之后的运行将跳过它 (记录在 {INGESTED_ARCHIVES_FILE})。")
+            else:
+                os.remove(archive_path)
+                status_callback(f"  压缩包 '{archive_name}' 已全部导入, 已删除。")
+        except OSError as e:
+            status_callback(f"  -> 警告: 无法删除或记录已导入的压缩包 '{archive_name}': {e}")
+    return counts
+
+def resolve_archive_destinations(filename_to_process_map, comfyui_path):
+    """
+    Resolve the destination folder of every folder key an archive member can map to
+    (HTML 映射和参考数据索引中的关键字). 不记录日志, 也不创建目录; 解压时按需创建.
+    """
+    keys = {key.lower() for key, _ in filename_to_process_map.values()}
+    keys.update(key.lower() for key, _ in get_reference_index().values())
+    destinations = {}
+    for key in keys:
+        folder = peek_destination_folder(key, comfyui_path)
+        if folder:
+            destinations[key] = folder
+    return destinations
+
+ingested_archives_lock = threading.Lock() # 多个导入任务可能同时记录
+
+def _ingested_archives_path():
+    return os.path.join(get_script_dir(), INGESTED_ARCHIVES_FILE)
+
+def load_ingested_archives():
+    """Load {archive_realpath: [size, mtime_ns]} of archives that were ingested but kept"""
+    path = _ingested_archives_path()
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            ledger = json.load(f)
+        return ledger if isinstance(ledger, dict) else {}
+    except Exception as e:
+        print(f"Error reading ingested archives '{path}': {e}")
+        return {}
+
+def _archive_stamp(archive_path):
+    st = os.stat(archive_path)
+    return [st.st_size, st.st_mtime_ns]
+
+def mark_archive_ingested(archive_path):
+    """Record an archive (by size and mtime) so find_archives() skips it until it changes"""
+    with ingested_archives_lock:
+        ledger = load_ingested_archives()
+        # 只保留仍然存在的压缩包
+        ledger = {path: stamp for path, stamp in ledger.items() if os.path.exists(path)}
+        ledger[os.path.realpath(archive_path)] = _archive_stamp(archive_path)
+        path = _ingested_archives_path()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(ledger, f)
+        os.replace(tmp_path, path)
+
+def find_archives(download_path):
+    """Return the names of the supported archives found directly in the download folder, except those already ingested"""
+    ledger = load_ingested_archives()
+    archives = []
+    for f in sorted(os.listdir(download_path)):
+        archive_path = os.path.join(download_path, f)
+        if not is_archive_file(f) or not os.path.isfile(archive_path):
+            continue
+        if ledger.get(os.path.realpath(archive_path)) == _archive_stamp(archive_path):
+            continue
+        archives.append(f)
+    return archives
+
+
+# --- Helper Functions: Directory Models (diffusers / multi-file folders) ---
+def build_directory_index(file_index):
+    """
+    Build {directory_lower: (folder_key, relative_dir)} from a {path_lower: (folder_key, relative_path)} index.
+    索引两类目录, 且目录下所有已知文件必须属于同一个文件夹关键字:
+      顶层模型目录 - 多组件模型 (如 'PixArt-XL-2-1024-MS/{transformer,vae}') 作为一个整体
+      叶子目录     - 直接包含已知文件、下面没有更深的已知目录 (如 'restoration/VAE_A_quality')
+    嵌套的叶子目录的最后一级名称只有在唯一、不与任何上级目录同名、且目录中不只有通用文件名时才会额外建立索引
+    (多组件模型的 'transformer', 'vae' 等组件目录不能单独匹配).
+    是否真的整体移动由 _directory_matches_index() 检查 (下载目录中的模型文件必须全部已知), 移动时合并而不是替换.
+    """
+    dirs = {} # {dir_lower: [relative_dir, {folder_key}]}
+    parent_dirs = set()
+    specific_dirs = set() # 直接包含非通用文件名的目录
+    for folder_key, rel_path in sorted(set(file_index.values())):
+        parts = rel_path.replace('\\', '/').split('/')
+        if len(parts) > 1 and not is_generic_model_filename(parts[-1]):
+            specific_dirs.add('/'.join(parts[:-1]).lower())
+        for depth in range(1, len(parts)):
+            rel_dir = '/'.join(parts[:depth])
+            dirs.setdefault(rel_dir.lower(), [rel_dir, set()])[1].add(folder_key)
+            if depth < len(parts) - 1:
+                parent_dirs.add(rel_dir.lower())
+
+    index = {}
+    name_to_dirs = {}
+    for dir_lower, (rel_dir, folder_keys) in dirs.items():
+        if len(folder_keys) != 1:
+            continue # 混合了多种模型类型, 不能整体移动到一个文件夹
+        top_level = '/' not in rel_dir
+        if not top_level and dir_lower in parent_dirs:
+            continue # 中间目录 (既不是顶层也不是叶子)
+        index[dir_lower] = (next(iter(folder_keys)), rel_dir)
+        if not top_level and dir_lower in specific_dirs:
+            name_to_dirs.setdefault(dir_lower.rsplit('/', 1)[-1], []).append(rel_dir)
+    parent_names = {d.rsplit('/', 1)[-1] for d in parent_dirs}
+    for name, rel_dirs in name_to_dirs.items():
+        if len(rel_dirs) == 1 and name not in index and name not in parent_names and name not in dirs:
+            index[name] = index[rel_dirs[0].lower()]
+    return index
+
+def _directory_matches_index(source_dir, rel_dir, file_index):
+    """
+    Check that source_dir holds model files and every one of them is a known file under rel_dir.
+    目录中有任何未知的模型文件 (如用户自己的模型) 时不作为整体移动.
+    """
+    found = False
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        for name in filenames:
+            if not is_likely_model_file(name):
+                continue
+            rel_file = os.path.relpath(os.path.join(dirpath, name), source_dir).replace(os.sep, '/')
+            if f"{rel_dir}/{rel_file}".lower() not in file_index:
+                return False
+            found = True
+    return found
+
+def _merge_into_directory(new_dir, destination_dir):
+    """
+    Move new_dir to destination_dir (same filesystem). 目标不存在时一次重命名;
+    已存在时逐个文件移入 (同名文件被覆盖), 目标目录中的其他文件保持不变, 从不删除目标目录.
+    Returns True if new_dir was merged into an existing directory.
+    """
+    if not os.path.exists(destination_dir):
+        os.rename(new_dir, destination_dir)
+        return False
+    if not os.path.isdir(destination_dir):
+        raise OSError(f"目标 '{destination_dir}' 已存在且不是目录")
+    for dirpath, dirnames, filenames in os.walk(new_dir):
+        target_dirpath = os.path.join(destination_dir, os.path.relpath(dirpath, new_dir))
+        os.makedirs(target_dirpath, exist_ok=True)
+        for name in filenames:
+            os.replace(os.path.join(dirpath, name), os.path.join(target_dirpath, name))
+    # 文件已全部移走, 只删除剩下的空目录 (os.rmdir 遇到非空目录会失败而不是删除内容)
+    for dirpath, dirnames, filenames in os.walk(new_dir, topdown=False):
+        os.rmdir(dirpath)
+    return True
+
+def _copy_file_for_directory(src_path, dest_path, control=None, progress=None):
+    """Copy one file of a directory model, keeping its timestamps"""
+    with open(src_path, 'rb') as src:
+        stream_to_file(src, dest_path, control=control, progress=progress)
+    shutil.copystat(src_path, dest_path)
+
+def get_directory_size(path):
+    """Total size in bytes of the regular files below path"""
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+def move_model_directory(source_dir, destination_dir, status_callback, max_workers=DIR_COPY_WORKERS, control=None, progress=None):
+    """
+    Move a whole model directory to destination_dir as a unit.
+
+    同一设备: 一次目录重命名. 跨设备: 先并行复制所有文件到目标旁的暂存目录, 完成后换入并删除源目录.
+    目标目录已存在时逐个文件合并, 不会删除其中的其他文件.
+    重命名返回 EXDEV 时退回到复制 (已合并的文件不在源目录中了, 只复制剩下的).
+    Returns True if merged into an existing destination directory.
+    """
+    parent_dir = os.path.dirname(destination_dir)
+    os.makedirs(parent_dir, exist_ok=True)
+
+    if os.stat(source_dir).st_dev == os.stat(parent_dir).st_dev:
+        if control is not None:
+            control.checkpoint()
+        try:
+            return _merge_into_directory(source_dir, destination_dir)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+
+    staging_dir = destination_dir + ".mover-partial"
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+    try:
+        copy_jobs = []
+        total_bytes = 0
+        for dirpath, dirnames, filenames in os.walk(source_dir):
+            target_dirpath = os.path.join(staging_dir, os.path.relpath(dirpath, source_dir))
+            os.makedirs(target_dirpath, exist_ok=True)
+            for name in filenames:
+                src_path = os.path.join(dirpath, name)
+                copy_jobs.append((src_path, os.path.join(target_dirpath, name)))
+                total_bytes += os.path.getsize(src_path)
+        status_callback(f"  -> 跨设备复制 {len(copy_jobs)} 个文件 ({format_size(total_bytes)})...")
+        # ioprio 按线程生效, 复制线程也要设置
+        with ThreadPoolExecutor(max_workers=max_workers, initializer=bandwidth_limiter.apply_io_priority) as executor:
+            futures = [executor.submit(_copy_file_for_directory, src, dst, control, progress) for src, dst in copy_jobs]
+            for future in futures:
+                future.result()
+        replaced = _merge_into_directory(staging_dir, destination_dir)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    shutil.rmtree(source_dir)
+    return replaced
+
+def find_model_directories(download_path, filename_to_process_map):
+    """
+    Find model directories directly inside the download folder.
+    Returns [(dir_name, target_key, relative_dir)]; HTML 映射优先, 然后是参考数据.
+    """
+    directories = sorted(d for d in os.listdir(download_path) if os.path.isdir(os.path.join(download_path, d)))
+    if not directories:
+        return []
+
+    mapped_index = {k.replace('\\', '/').lower(): v for k, v in filename_to_process_map.items()}
+    sources = [(mapped_index, build_directory_index(mapped_index))]
+    ref_index = get_reference_index()
+    if ref_index:
+        sources.append((ref_index, build_directory_index(ref_index)))
+
+    matches = []
+    for dir_name in directories:
+        source_dir = os.path.join(download_path, dir_name)
+        for file_index, dir_index in sources:
+            candidate = dir_index.get(dir_name.lower())
+            if candidate and _directory_matches_index(source_dir, candidate[1], file_index):
+                matches.append((dir_name, candidate[0], candidate[1]))
+                break
+    return matches
+
+def move_matched_directory(source_dir, target_key, rel_dir, target_folder, status_callback, control=None, progress=None):
+    """
+    Move one directory found by find_model_directories() as a unit into target_folder
+    (resolved for target_key when the move was planned).
+    Returns 'moved', 'overwritten', 'skipped' or 'error'; raises MoveCancelled if cancelled via control.
+    """
+    dir_name = os.path.basename(source_dir)
+    status_callback(f"目录模型: {dir_name} -> 目标类型 '{target_key}'")
+    if not target_folder:
+        status_callback(f"  -> 跳过: 无法为关键字 '{target_key}' 确定或创建目标文件夹。")
+        return 'skipped'
+    destination_dir = os.path.join(target_folder, *rel_dir.split('/'))
+    if not is_within_directory(target_folder, destination_dir):
+        status_callback(f"  -> 跳过: 目标路径 '{rel_dir}' 超出目标文件夹。")
+        return 'skipped'
+    try:
+        log_dest_path = os.path.join(os.path.basename(target_folder), *rel_dir.split('/'))
+        status_callback(f"  -> 移动目录到: ...{os.sep}{log_dest_path}")
+        replaced = move_model_directory(source_dir, destination_dir, status_callback, control=control, progress=progress)
+        status_callback("  -> 目录已合并到现有目录 (同名文件被覆盖)!" if replaced else "  -> 目录移动成功!")
+        return 'overwritten' if replaced else 'moved'
+    except MoveCancelled:
+        status_callback(f"  -> 已取消: {dir_name}")
+        raise
+    except Exception as e:
+        status_callback(f"  -> 错误: 移动目录 {dir_name} 时出错: {e}")
+        return 'error'
+
+
+# --- Helper Functions: Duplicate Detection (Dedupe Mode) ---
+def format_size(num_bytes):
+    """Format a byte count as a human readable string"""
+    size = float(num_bytes)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.2f} TB"
+
+def get_model_roots(comfyui_base_path):
+    """
+    收集所有需要扫描的模型根目录: ComfyUI/models 加上 folder_paths 中配置的路径
+    (例如 extra_model_paths.yaml). 去掉不存在的目录和嵌套在其他根目录下的目录.
+    """
+    candidates = [os.path.join(comfyui_base_path, "models")]
+    if folder_paths is not None and hasattr(folder_paths, 'folder_names_and_paths'):
+        for value in folder_paths.folder_names_and_paths.values():
+            try:
+                candidates.extend(value[0])
+            except (TypeError, IndexError):
+                continue
+
+    roots = []
+    # sorted() 保证父目录排在子目录之前
+    for path in sorted({os.path.realpath(p) for p in candidates if p and os.path.isdir(p)}):
+        if not any(path == root or path.startswith(root + os.sep) for root in roots):
+            roots.append(path)
+    return roots
+
+def load_hash_cache(cache_path):
+    """Load the persistent hash cache ({path: {size, mtime_ns, sample, sha256}})"""
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except Exception as e:
+        print(f"Error reading hash cache '{cache_path}': {e}")
+        return {}
+
+def save_hash_cache(cache_path, cache):
+    """Save the persistent hash cache"""
+    try:
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        print(f"Error saving hash cache '{cache_path}': {e}")
+
+def _sample_fingerprint(path, size):
+    """
+    读取文件头/中/尾各 DEDUPE_SAMPLE_SIZE 字节并计算摘要.
+    safetensors 的头部只描述张量布局, 同架构的不同模型头部往往相同, 所以必须同时采样中部和尾部.
+    Returns (hexdigest, bytes_read).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    bytes_read = 0
+    with open(path, 'rb') as f:
+        if size <= DEDUPE_SAMPLE_SIZE * 3:
+            data = f.read()
+            digest.update(data)
+            return digest.hexdigest(), len(data)
+        for offset in (0, size // 2, size - DEDUPE_SAMPLE_SIZE):
+            f.seek(offset)
+            data = f.read(DEDUPE_SAMPLE_SIZE)
+            digest.update(data)
+            bytes_read += len(data)
+    return digest.hexdigest(), bytes_read
+
+def _full_hash(path, chunk_size=1024 * 1024):
+    """Compute the full SHA-256 of a file. Returns (hexdigest, bytes_read)."""
+    digest = hashlib.sha256()
+    bytes_read = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            bytes_read += len(chunk)
+    return digest.hexdigest(), bytes_read
+
+def _collect_model_file_stats(roots, status_callback):
+    """Walk the model roots and return [(path, size, mtime_ns, st_dev, st_ino)] for model files."""
+    entries = []
+    seen_inodes = set()
+    for root in roots:
+        status_callback(f"扫描模型目录: {root}")
+        for dirpath, dirnames, filenames in os.walk(root):
+            for name in filenames:
+                if not is_likely_model_file(name):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.lstat(path)
+                except OSError:
+                    continue
+                if not os.path.isfile(path) or os.path.islink(path):
+                    continue
+                # 已经是硬链接的文件不占用额外空间, 只保留一个代表
+                inode = (st.st_dev, st.st_ino)
+                if inode in seen_inodes:
+                    continue
+                seen_inodes.add(inode)
+                entries.append((path, st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino))
+    return entries
+
+def _hash_stage(candidates, cache, field, hash_func, status_callback, max_workers):
+    """
+    Compute `field` ('sample' or 'sha256') for every candidate, using cached values when
+    size/mtime still match. Returns (path -> digest, bytes_read).
+    """
+    results = {}
+    to_compute = []
+    for path, size, mtime_ns, _dev, _ino in candidates:
+        cached = cache.get(path)
+        if cached and cached.get('size') == size and cached.get('mtime_ns') == mtime_ns and cached.get(field):
+            results[path] = cached[field]
+        else:
+            to_compute.append((path, size, mtime_ns))
+
+    bytes_read = 0
+    if to_compute:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for path, size, mtime_ns in to_compute:
+                if field == 'sample':
+                    futures[executor.submit(hash_func, path, size)] = (path, size, mtime_ns)
+                else:
+                    futures[executor.submit(hash_func, path)] = (path, size, mtime_ns)
+            for future, (path, size, mtime_ns) in futures.items():
+                try:
+                    digest, read = future.result()
+                except OSError as e:
+                    status_callback(f"  警告: 读取 '{path}' 失败: {e}")
+                    continue
+                bytes_read += read
+                results[path] = digest
+                entry = cache.get(path)
+                if not entry or entry.get('size') != size or entry.get('mtime_ns') != mtime_ns:
+                    entry = {'size': size, 'mtime_ns': mtime_ns}
+                    cache[path] = entry
+                entry[field] = digest
+    return results, bytes_read
+
+def find_duplicate_models(comfyui_base_path, status_callback, cache_path=None, max_workers=DEDUPE_MAX_WORKERS):
+    """
+    Find duplicate model files across all ComfyUI model folders.
+
+    三级过滤: 先按文件大小分桶, 再比较头/中/尾采样指纹, 最后只对剩余候选计算完整 SHA-256.
+    大多数非重复文件只会被读取几 KB 甚至完全不读取.
+    Returns a report dict: {'groups': [{'size', 'sha256', 'paths'}, ...], 'scanned', 'wasted_bytes', 'bytes_read'}.
+    """
+    if cache_path is None:
+        cache_path = os.path.join(get_script_dir(), HASH_CACHE_FILE)
+    roots = get_model_roots(comfyui_base_path)
+    if not roots:
+        status_callback(f"错误: 在 '{comfyui_base_path}' 下未找到任何模型目录。")
+        return None
+
+    cache = load_hash_cache(cache_path)
+    entries = _collect_model_file_stats(roots, status_callback)
+    status_callback(f"共找到 {len(entries)} 个模型文件。")
+
+    # 阶段 1: 按大小分桶
+    by_size = {}
+    for entry in entries:
+        by_size.setdefault(entry[1], []).append(entry)
+    candidates = [e for bucket in by_size.values() if len(bucket) > 1 for e in bucket]
+    status_callback(f"阶段 1 (大小): {len(candidates)} 个文件存在相同大小的候选。")
+
+    # 阶段 2: 采样指纹
+    samples, sample_bytes = _hash_stage(candidates, cache, 'sample', _sample_fingerprint, status_callback, max_workers)
+    by_sample = {}
+    for entry in candidates:
+        if entry[0] in samples:
+            by_sample.setdefault((entry[1], samples[entry[0]]), []).append(entry)
+    candidates = [e for bucket in by_sample.values() if len(bucket) > 1 for e in bucket]
+    status_callback(f"阶段 2 (采样指纹): {len(candidates)} 个文件需要完整哈希。")
+
+    # 阶段 3: 完整哈希
+    full_hashes, full_bytes = _hash_stage(candidates, cache, 'sha256', _full_hash, status_callback, max_workers)
+    by_hash = {}
+    for entry in candidates:
+        if entry[0] in full_hashes:
+            by_hash.setdefault((entry[1], full_hashes[entry[0]]), []).append(entry)
+
+    groups = []
+    wasted_bytes = 0
+    for (size, digest), bucket in by_hash.items():
+        if len(bucket) > 1:
+            groups.append({
+                'size': size, 'sha256': digest, 'paths': sorted(e[0] for e in bucket),
+                # 扫描时的 (mtime_ns, st_ino), 硬链接前用来确认文件未被修改或替换
+                'stats': {e[0]: (e[2], e[4]) for e in bucket},
+            })
+            wasted_bytes += size * (len(bucket) - 1)
+    groups.sort(key=lambda g: -g['size'])
+
+    # 保存缓存: 保留扫描范围之外的条目, 丢弃扫描范围内已不存在的文件
+    seen_paths = {e[0] for e in entries}
+    def in_roots(path):
+        return any(path.startswith(root + os.sep) for root in roots)
+    new_cache = {p: v for p, v in cache.items() if p in seen_paths or not in_roots(p)}
+    save_hash_cache(cache_path, new_cache)
+
+    return {
+        'groups': groups,
+        'scanned': len(entries),
+        'wasted_bytes': wasted_bytes,
+        'bytes_read': sample_bytes + full_bytes,
+    }
+
+def _changed_since_scan(group, path, st):
+    """True if the file's size, mtime or inode differ from what find_duplicate_models() recorded"""
+    if st.st_size != group['size']:
+        return True
+    recorded = group.get('stats', {}).get(path)
+    return recorded is not None and tuple(recorded) != (st.st_mtime_ns, st.st_ino)
+
+def hardlink_duplicates(groups, status_callback):
+    """
+    Replace every duplicate in each group with a hardlink to the group's first path.
+    跨设备的文件无法硬链接, 会被跳过; 扫描后被修改或替换的文件也会被跳过 (哈希已不可信).
+    Returns (linked_count, reclaimed_bytes).
+    """
+    linked_count = 0
+    reclaimed_bytes = 0
+    for group in groups:
+        keep = group['paths'][0]
+        try:
+            keep_stat = os.stat(keep)
+        except OSError as e:
+            status_callback(f"  错误: 无法读取 '{keep}': {e}")
+            continue
+        if _changed_since_scan(group, keep, keep_stat):
+            status_callback(f"  -> 跳过整组 (扫描后文件已变化): {keep}")
+            continue
+        for dup in group['paths'][1:]:
+            try:
+                dup_stat = os.stat(dup)
+                if dup_stat.st_dev != keep_stat.st_dev:
+                    status_callback(f"  -> 跳过 (不同设备, 无法硬链接): {dup}")
+                    continue
+                if dup_stat.st_ino == keep_stat.st_ino:
+                    continue
+                if _changed_since_scan(group, dup, dup_stat):
+                    status_callback(f"  -> 跳过 (扫描后文件已变化): {dup}")
+                    continue
+                # 先创建临时硬链接再原子替换, 中途失败不会丢失文件
+                tmp_path = dup + ".mover-link"
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                os.link(keep, tmp_path)
+                os.replace(tmp_path, dup)
+                linked_count += 1
+                reclaimed_bytes += dup_stat.st_size
+                status_callback(f"  -> 已硬链接: {dup}")
+            except OSError as e:
+                status_callback(f"  -> 错误: 硬链接 '{dup}' 失败: {e}")
+    return linked_count, reclaimed_bytes
+
+def report_duplicate_groups(report, status_callback):
+    """Write the duplicate groups of a find_duplicate_models() report to the status log."""
+    groups = report['groups']
+    status_callback("-" * 30)
+    status_callback(f"扫描了 {report['scanned']} 个文件, 实际读取 {format_size(report['bytes_read'])}。")
+    if not groups:
+        status_callback("未发现重复模型。")
+        return
+    status_callback(f"发现 {len(groups)} 组重复模型, 可回收空间: {format_size(report['wasted_bytes'])}")
+    for i, group in enumerate(groups, 1):
+        status_callback(f"[{i}] {format_size(group['size'])} x {len(group['paths'])}  sha256={group['sha256'][:16]}...")
+        for path in group['paths']:
+            status_callback(f"    {path}")
+
+
+# --- Helper Functions: Static Node Scan (regenerate reference data) ---
+def _literal_strings(node):
+    """String items of a tuple/list literal; IO.MODEL 这样的属性取属性名"""
+    if not isinstance(node, (ast.Tuple, ast.List)):
+        return []
+    values = []
+    for element in node.elts:
+        if isinstance(element, ast.Constant) and isinstance(element.value, str):
+            values.append(element.value)
+        elif isinstance(element, ast.Attribute):
+            values.append(element.attr)
+    return values
+
+def _folder_keys_in(node):
+    """folder_paths keys used in a function body, e.g. folder_paths.get_filename_list("loras"), plus names of called functions"""
+    keys, called = [], []
+    for child in ast.walk(node):
+        if not isinstance(child, ast.Call):
+            continue
+        func = child.func
+        func_name = func.attr if isinstance(func, ast.Attribute) else func.id if isinstance(func, ast.Name) else None
+        if func_name in FOLDER_PATHS_KEY_FUNCTIONS:
+            if child.args and isinstance(child.args[0], ast.Constant) and isinstance(child.args[0].value, str):
+                if child.args[0].value not in keys:
+                    keys.append(child.args[0].value)
+        elif func_name:
+            called.append(func_name)
+    return keys, called
+
+def _class_mapping_items(node):
+    """(node_type, class_name) pairs from a {"Name": Class} dict literal"""
+    items = []
+    for key, value in zip(node.keys, node.values):
+        if isinstance(key, ast.Constant) and isinstance(key.value, str):
+            if isinstance(value, ast.Name):
+                items.append((key.value, value.id))
+            elif isinstance(value, ast.Attribute):
+                items.append((key.value, value.attr))
+    return items
+
+def _is_class_mappings_name(node):
+    name = node.id if isinstance(node, ast.Name) else node.attr if isinstance(node, ast.Attribute) else ""
+    return name.endswith("NODE_CLASS_MAPPINGS")
+
+def _module_statements(body):
+    """Top-level statements, including those inside if/try/with blocks (不进入函数体, 比 ast.walk 快得多)"""
+    for node in body:
+        yield node
+        if isinstance(node, (ast.If, ast.Try, ast.With)):
+            for block in (node.body, getattr(node, 'orelse', []), getattr(node, 'finalbody', [])):
+                yield from _module_statements(block)
+            for handler in getattr(node, 'handlers', []):
+                yield from _module_statements(handler.body)
+
+def scan_node_file(path):
+    """
+    Statically parse one node source file with ast (never imported).
+    Returns {'classes': {class_name: {'return_types', 'folder_keys', 'bases'}}, 'mappings': {node_type: class_name}}
+    or {'error': message}. Runs in a worker process, so it only returns plain data.
+    """
+    try:
+        with open(path, 'rb') as f:
+            tree = ast.parse(f.read(), filename=path)
+    except (SyntaxError, ValueError, OSError) as e:
+        return {'error': str(e)}
+
+    module_functions = {}
+    classes = {}
+    mappings = {}
+    statements = list(_module_statements(tree.body))
+    for node in statements:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            module_functions[node.name] = node
+    for node in statements:
+        if isinstance(node, ast.ClassDef):
+            info = {'return_types': [], 'folder_keys': [],
+                    'bases': [b.id if isinstance(b, ast.Name) else b.attr for b in node.bases if isinstance(b, (ast.Name, ast.Attribute))]}
+            for item in node.body:
+                if isinstance(item, ast.Assign) and any(isinstance(t, ast.Name) and t.id == "RETURN_TYPES" for t in item.targets):
+                    info['return_types'] = _literal_strings(item.value)
+                elif isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and item.name == "INPUT_TYPES":
+                    keys, called = _folder_keys_in(item)
+                    # INPUT_TYPES 常通过同文件的辅助函数获取文件列表, 跟踪一层
+                    for func_name in called:
+                        if func_name in module_functions:
+                            keys.extend(k for k in _folder_keys_in(module_functions[func_name])[0] if k not in keys)
+                    info['folder_keys'] = keys
+            classes.setdefault(node.name, info)
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if _is_class_mappings_name(target) and isinstance(node.value, ast.Dict):
+                    mappings.update(_class_mapping_items(node.value))
+                elif (isinstance(target, ast.Subscript) and _is_class_mappings_name(target.value)
+                      and isinstance(node.value, (ast.Name, ast.Attribute))):
+                    key = target.slice.value if isinstance(target.slice, getattr(ast, 'Index', ())) else target.slice # Python 3.8
+                    if isinstance(key, ast.Constant) and isinstance(key.value, str):
+                        mappings[key.value] = node.value.id if isinstance(node.value, ast.Name) else node.value.attr
+        elif (isinstance(node, ast.Expr) and isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Attribute)
+              and node.value.func.attr == "update" and _is_class_mappings_name(node.value.func.value)
+              and node.value.args and isinstance(node.value.args[0], ast.Dict)):
+            mappings.update(_class_mapping_items(node.value.args[0]))
+    return {'classes': classes, 'mappings': mappings}
+
+def collect_node_source_files(comfyui_path):
+    """
+    Return [(pack_name, path)]: 内置节点 (nodes.py, comfy_extras/) 归为 'comfy',
+    custom_nodes 下每个子目录 (或单文件) 是一个节点包. 跳过 .disabled 包和隐藏目录.
+    """
+    files = []
+    core_nodes = os.path.join(comfyui_path, "nodes.py")
+    if os.path.isfile(core_nodes):
+        files.append(("comfy", core_nodes))
+    extras_dir = os.path.join(comfyui_path, "comfy_extras")
+    if os.path.isdir(extras_dir):
+        files.extend(("comfy", os.path.join(extras_dir, f)) for f in sorted(os.listdir(extras_dir)) if f.endswith(".py"))
+
+    custom_dir = os.path.join(comfyui_path, "custom_nodes")
+    if not os.path.isdir(custom_dir):
+        return files
+    for entry in sorted(os.listdir(custom_dir)):
+        entry_path = os.path.join(custom_dir, entry)
+        if entry.startswith(('.', '__')) or entry.endswith(".disabled"):
+            continue
+        if os.path.isfile(entry_path) and entry.endswith(".py"):
+            files.append((entry[:-3], entry_path))
+        elif os.path.isdir(entry_path):
+            for root, dirs, filenames in os.walk(entry_path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith(('.', '__')) and d not in NODE_SCAN_SKIP_DIRS)
+                files.extend((entry, os.path.join(root, f)) for f in sorted(filenames) if f.endswith(".py"))
+    return files
+
+def _resolve_class_field(classes, class_name, field, depth=0):
+    """Look up a class field, following base classes defined in the same node pack"""
+    info = classes.get(class_name)
+    if info is None or depth > 8:
+        return []
+    if info[field]:
+        return info[field]
+    for base in info['bases']:
+        value = _resolve_class_field(classes, base, field, depth + 1)
+        if value:
+            return value
+    return []
+
+def scan_comfyui_nodes(comfyui_path, status_callback, cache_path=None, max_workers=None):
+    """
+    Scan nodes.py, comfy_extras/ and custom_nodes/** for loader nodes (no imports).
+    文件在进程池中解析, 结果按 (mtime, size) 缓存, 未修改的文件不会重新解析.
+    Returns {node_type: {'output_types': [...], 'folder_keys': [...]}}.
+    """
+    start_time = time.time()
+    cache_path = cache_path or os.path.join(get_script_dir(), NODE_SCAN_CACHE_FILE)
+    cache = load_hash_cache(cache_path)
+    source_files = collect_node_source_files(comfyui_path)
+    status_callback(f"找到 {len(source_files)} 个节点源文件, 开始静态分析...")
+
+    results, stale = {}, []
+    for _, path in source_files:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entry = cache.get(path)
+        if entry and entry.get('mtime_ns') == st.st_mtime_ns and entry.get('size') == st.st_size:
+            results[path] = entry['result']
+        else:
+            stale.append((path, st))
+
+    if stale:
+        paths = [path for path, _ in stale]
+        if len(stale) < NODE_SCAN_POOL_MIN_FILES:
+            parsed = [scan_node_file(path) for path in paths] # 文件很少时启动进程池不划算
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                parsed = list(executor.map(scan_node_file, paths, chunksize=16))
+        for (path, st), result in zip(stale, parsed):
+            results[path] = result
+            cache[path] = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'result': result}
+        # 删除已不存在的文件
+        current = {path for _, path in source_files}
+        for path in [p for p in cache if p not in current]:
+            del cache[path]
+        save_hash_cache(cache_path, cache)
+
+    errors = [path for path, result in results.items() if 'error' in result]
+    for path in errors[:10]:
+        status_callback(f"  警告: 无法解析 {path}: {results[path]['error']}")
+
+    # 每个节点包内合并类和 NODE_CLASS_MAPPINGS (映射常在 __init__.py 中, 类定义在其他文件)
+    packs = {}
+    for pack_name, path in source_files:
+        result = results.get(path)
+        if not result or 'error' in result:
+            continue
+        pack = packs.setdefault(pack_name, {'classes': {}, 'mappings': {}})
+        for class_name, info in result['classes'].items():
+            pack['classes'].setdefault(class_name, info)
+        pack['mappings'].update(result['mappings'])
+
+    loaders = {}
+    for pack in packs.values():
+        for node_type, class_name in pack['mappings'].items():
+            folder_keys = _resolve_class_field(pack['classes'], class_name, 'folder_keys')
+            if folder_keys:
+                loaders[node_type] = {'output_types': list(_resolve_class_field(pack['classes'], class_name, 'return_types')),
+                                      'folder_keys': list(folder_keys)}
+
+    status_callback(f"静态分析完成: {len(source_files)} 个文件 (重新解析 {len(stale)} 个, 失败 {len(errors)} 个), "
+                    f"{len(packs)} 个节点包, 找到 {len(loaders)} 个加载器节点, 用时 {time.time() - start_time:.2f} 秒。")
+    return loaders
+
+def list_model_folder_files(folder_key, comfyui_path):
+    """Relative model file paths for a folder key (folder_paths, or the Mover default subdirectory)"""
+    if folder_paths:
+        try:
+            return [f.replace('\\', '/') for f in folder_paths.get_filename_list(folder_key)]
+        except Exception:
+            pass
+    folder = peek_destination_folder(folder_key, comfyui_path)
+    if not folder or not os.path.isdir(folder):
+        return []
+    files = []
+    for root, _, filenames in os.walk(folder):
+        for filename in filenames:
+            if is_likely_model_file(filename):
+                files.append(os.path.relpath(os.path.join(root, filename), folder).replace(os.sep, '/'))
+    return files
+
+def register_reference_folder_keys(ref_data):
+    """Folder keys found by the node scan but unknown to folder_paths default to ComfyUI/models/<key> (如 instantid)"""
+    for loader_info in ref_data.values():
+        for folder_key in loader_info.get('folder_keys', []):
+            known_missing_key_to_subdir.setdefault(folder_key.lower(), folder_key)
+
+def generate_reference_data(comfyui_path, status_callback, output_path=None, cache_path=None, max_workers=None):
+    """
+    Regenerate the reference JSON from a static scan of the ComfyUI install.
+    扫描到的加载器更新 output_types/folder_keys, model_files 合并当前安装中对应文件夹的文件
+    (需要 folder_paths; 未加载时只保留现有的 model_files); 未扫描到的旧条目保留.
+    Returns the number of loader entries written, or None on error.
+    """
+    global reference_data, reference_index, filename_classifier
+    loaders = scan_comfyui_nodes(comfyui_path, status_callback, cache_path=cache_path, max_workers=max_workers)
+    output_path = output_path or os.path.join(get_script_dir(), reference_data_path)
+    existing = {}
+    if os.path.exists(output_path):
+        try:
+            with open(output_path, 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+        except Exception as e:
+            status_callback(f"错误: 读取现有参考文件 '{output_path}' 失败: {e}")
+            return None
+    register_reference_folder_keys(loaders)
+    if not folder_paths:
+        status_callback("警告: 未加载 ComfyUI 的 folder_paths 模块, 已安装的模型文件未合并到 model_files (保留现有条目)。")
+
+    folder_files = {}
+    new_count = 0
+    for node_type, info in loaders.items():
+        files = set(existing.get(node_type, {}).get('model_files', []))
+        for folder_key in info['folder_keys'] if folder_paths else []:
+            if folder_key not in folder_files:
+                folder_files[folder_key] = list_model_folder_files(folder_key, comfyui_path)
+            files.update(folder_files[folder_key])
+        if node_type not in existing:
+            new_count += 1
+        existing[node_type] = {'model_files': sorted(files), 'output_types': info['output_types'], 'folder_keys': info['folder_keys']}
+
+    try:
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(existing, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, output_path)
+    except OSError as e:
+        status_callback(f"错误: 写入参考文件 '{output_path}' 失败: {e}")
+        return None
+    status_callback(f"参考文件已更新: {output_path} ({len(loaders)} 个加载器, 新增 {new_count} 个, 共 {len(existing)} 个条目)。")
+    if os.path.abspath(output_path) == os.path.abspath(os.path.join(get_script_dir(), reference_data_path)):
+        reference_data = reference_index = filename_classifier = None # 下次使用时重新加载
+    return len(loaders)
+
+
+# --- Helper Functions: Download Folder Browser ---
+def plan_download_files(filenames, comfyui_path):
+    """
+    Detect the folder key and planned destination for a batch of download-folder filenames.
+    识别顺序与 HTML 模式的备选阶段一致: 参考数据精确匹配, 然后文件名分类器.
+    Returns [(key_label, destination)]; 未识别的文件返回 ("", "").
+    """
+    index = get_reference_index() if reference_data is not None else {}
+    detected = [None] * len(filenames)
+    to_classify = []
+    for i, filename in enumerate(filenames):
+        if is_archive_file(filename):
+            detected[i] = ("(archive)", None)
+        elif not is_likely_model_file(filename):
+            detected[i] = ("", None)
+        else:
+            match = index.get(filename.lower())
+            if match:
+                detected[i] = (match[0], match[0])
+            else:
+                to_classify.append(i)
+
+    if to_classify and filename_classifier is not None:
+        predictions = filename_classifier.predict([filenames[i] for i in to_classify])
+        for i, (target_key, confidence) in zip(to_classify, predictions):
+            if filename_classifier.accepts(target_key, confidence):
+                detected[i] = (f"{target_key} ~{confidence:.0%}", target_key)
+    rows = []
+    for label_and_key in detected:
+        label, target_key = label_and_key or ("", None)
+        destination = peek_destination_folder(target_key, comfyui_path) if target_key and comfyui_path else None
+        rows.append((label, destination or ""))
+    return rows
+
+def scan_download_folder(download_path, comfyui_path=None, batch_size=BROWSER_SCAN_BATCH, stop_event=None):
+    """
+    Generator: scan the download folder with os.scandir and yield row batches
+    ([name], [size], [key_label], [destination]) so the browser can fill in while scanning.
+    """
+    names, sizes = [], []
+    with os.scandir(download_path) as entries:
+        for entry in entries:
+            if stop_event is not None and stop_event.is_set():
+                return
+            try:
+                if not entry.is_file():
+                    continue
+                size = entry.stat().st_size
+            except OSError:
+                continue
+            names.append(entry.name)
+            sizes.append(size)
+            if len(names) >= batch_size:
+                planned = plan_download_files(names, comfyui_path)
+                yield names, sizes, [p[0] for p in planned], [p[1] for p in planned]
+                names, sizes = [], []
+    if names:
+        planned = plan_download_files(names, comfyui_path)
+        yield names, sizes, [p[0] for p in planned], [p[1] for p in planned]
+
+
+# --- Move Scheduler (prioritized, pausable, cancellable) ---
+def result_counts(result):
+    """Convert a task result ('moved', 'overwritten', ... or a counts dict) to a counts dict"""
+    if isinstance(result, dict):
+        return result
+    counts = {'moved': 0, 'overwritten': 0, 'skipped': 0, 'errors': 0}
+    if result in ('moved', 'overwritten'):
+        counts['moved'] = 1
+        counts['overwritten'] = 1 if result == 'overwritten' else 0
+    elif result in ('skipped', 'cancelled'):
+        counts['skipped'] = 1
+    else:
+        counts['errors'] = 1
+    return counts
+
+def format_duration(seconds):
+    """Format seconds as H:MM:SS"""
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+class MoveTask:
+    """One unit of work in the MoveScheduler (a file, a directory model or an archive)"""
+    def __init__(self, task_id, name, func, args, size, instant, priority, control, on_done):
+        self.id = task_id
+        self.name = name
+        self.func = func
+        self.args = args
+        self.size = size
+        self.instant = instant
+        self.priority = priority
+        self.control = control
+        self.on_done = on_done
+        self.status = 'queued' # queued / running / done / cancelled / error
+        self.paths = [] # 规范化后的源/目标路径, 任务结束前其他任务不能使用
+        self.seq = 0
+        self.bytes_done = 0
+        self.result = None
+        self.error = None
+        self.done_event = threading.Event()
+
+    def wait(self, timeout=None):
+        """Wait until the task finished and return its result"""
+        self.done_event.wait(timeout)
+        return self.result
+
+class MoveScheduler:
+    """
+    Runs move tasks on a small worker pool, ordered by policy:
+    同设备重命名 (瞬时完成) 总是最先执行, 然后按策略排序:
+      'smallest_first' - 小文件优先, 让尽可能多的模型尽早可用
+      'priority'       - 用户优先级高的优先, 相同优先级时小文件优先
+    支持在块边界暂停/继续和取消; 取消的复制不会留下不完整的目标文件.
+    排队或运行中的任务占用其源/目标路径, 再次提交相同 (或包含/被包含的) 路径会引发 MoveConflict.
+    """
+    POLICIES = ('smallest_first', 'priority')
+
+    def __init__(self, workers=MOVE_WORKERS, policy='smallest_first'):
+        self.lock = threading.Lock()
+        self.work_available = threading.Condition(self.lock)
+        self.run_event = threading.Event()
+        self.run_event.set()
+        self.policy = policy
+        self.pending = []
+        self.running = []
+        self.finished = collections.deque(maxlen=SCHEDULER_HISTORY)
+        self.next_id = 1
+        self.next_seq = 0
+        self.samples = collections.deque() # (time, bytes) 用于计算吞吐量
+        self.bytes_copied = 0
+        self.active_paths = {} # {path: MoveTask}
+        self.active_ancestors = collections.Counter() # 活动路径的所有上级目录, 用于检测目录包含关系
+        for _ in range(workers):
+            threading.Thread(target=self._worker_loop, daemon=True).start()
+
+    def _sort_key(self, task):
+        if self.policy == 'priority':
+            return (not task.instant, -task.priority, task.size, task.seq)
+        return (not task.instant, task.size, task.seq)
+
+    @staticmethod
+    def _ancestors(path):
+        parent = os.path.dirname(path)
+        while parent != path:
+            yield parent
+            path, parent = parent, os.path.dirname(parent)
+
+    def _find_conflict(self, paths):
+        """Return (task, path) of an active task using one of paths (or a parent/child of it), or None"""
+        for path in paths:
+            if path in self.active_paths:
+                return self.active_paths[path], path
+            for ancestor in self._ancestors(path):
+                if ancestor in self.active_paths:
+                    return self.active_paths[ancestor], ancestor
+            if self.active_ancestors[path]:
+                for active_path, task in self.active_paths.items():
+                    if active_path.startswith(path + os.sep):
+                        return task, active_path
+        return None
+
+    def _release_paths(self, task):
+        for path in task.paths:
+            if self.active_paths.get(path) is task:
+                del self.active_paths[path]
+                for ancestor in self._ancestors(path):
+                    self.active_ancestors[ancestor] -= 1
+                    if not self.active_ancestors[ancestor]:
+                        del self.active_ancestors[ancestor]
+        task.paths = []
+
+    def submit(self, name, func, args=(), size=0, instant=False, priority=0, on_done=None, paths=()):
+        """
+        Queue func(*args, control=..., progress=...). Returns the MoveTask immediately.
+        on_done(task) is called from the worker thread once the task finished.
+        paths: the source/destination paths the task reads or writes; raises MoveConflict
+        if one of them is already used by a queued or running task.
+        """
+        keys = list(dict.fromkeys(os.path.normcase(os.path.realpath(p)) for p in paths))
+        with self.lock:
+            conflict = self._find_conflict(keys)
+            if conflict is not None:
+                raise MoveConflict(f"'{conflict[1]}' 正被队列中的任务 '{conflict[0].name}' 使用")
+            task = MoveTask(self.next_id, name, func, args, size, instant, priority, MoveControl(self.run_event), on_done)
+            task.paths = keys
+            for path in keys:
+                self.active_paths[path] = task
+                for ancestor in self._ancestors(path):
+                    self.active_ancestors[ancestor] += 1
+            task.seq = self.next_seq
+            self.next_id += 1
+            self.next_seq += 1
+            self.pending.append(task)
+            self.work_available.notify()
+            return task
+
+    def _worker_loop(self):
+        while True:
+            with self.lock:
+                while not self.pending or not self.run_event.is_set():
+                    self.work_available.wait(0.5)
+                task = min(self.pending, key=self._sort_key)
+                self.pending.remove(task)
+                task.status = 'running'
+                self.running.append(task)
+
+            bandwidth_limiter.apply_io_priority()
+            try:
+                task.result = task.func(*task.args, control=task.control, progress=lambda n, task=task: self._on_progress(task, n))
+                status = 'done'
+            except MoveCancelled:
+                task.result = 'cancelled'
+                status = 'cancelled'
+            except Exception as e:
+                task.result = 'error'
+                task.error = str(e)
+                status = 'error'
+            self._finish(task, status)
+
+    def _finish(self, task, status):
+        with self.lock:
+            task.status = status
+            self._release_paths(task)
+            if task in self.running:
+                self.running.remove(task)
+            self.finished.append(task)
+        task.done_event.set()
+        if task.on_done:
+            try:
+                task.on_done(task)
+            except Exception as e:
+                print(f"Error in task callback: {e}")
+
+    def _on_progress(self, task, num_bytes):
+        with self.lock:
+            task.bytes_done += num_bytes
+            self.bytes_copied += num_bytes
+            self.samples.append((time.time(), num_bytes))
 
-    target_folder = None # 初始化目标文件夹
+    def pause(self):
+        self.run_event.clear()
 
-    try:
-        # 1. 优先尝试从 ComfyUI 配置获取路径
-        paths = folder_paths.get_folder_paths(model_type_key_lower)
-        if paths:
-            target_folder = paths[0] # 使用 ComfyUI 官方/用户配置的路径
-            status_callback(f"信息: 使用 ComfyUI 配置路径 '{target_folder}' (关键字: '{model_type_key_lower}')")
+    def resume(self):
+        with self.lock:
+            self.run_event.set()
+            self.work_available.notify_all()
 
-    except KeyError:
-        # 2. 如果 ComfyUI 不认识这个关键字 (KeyError)，尝试从我们的备选默认路径查找
-        status_callback(f"信息: ComfyUI 配置中未找到关键字 '{model_type_key_lower}'。尝试 Mover 默认路径...")
-        # *** 使用新的备选字典 ***
-        default_subdir = known_missing_key_to_subdir.get(model_type_key_lower)
+    @property
+    def paused(self):
+        return not self.run_event.is_set()
 
-        if default_subdir:
-            # 构建默认路径: ComfyUI根目录/models/子目录名
-            target_folder = os.path.join(comfyui_base_path, "models", default_subdir)
-            status_callback(f"信息: 使用 Mover 默认路径 '{target_folder}' (关键字: '{model_type_key_lower}')")
+    def cancel(self, task_id):
+        """Cancel a queued or running task. Returns False if no such active task."""
+        with self.lock:
+            for task in self.pending:
+                if task.id == task_id:
+                    self.pending.remove(task)
+                    task.result = 'cancelled'
+                    break
+            else:
+                for task in self.running:
+                    if task.id == task_id:
+                        task.control.cancel()
+                        return True
+                return False
+        self._finish(task, 'cancelled')
+        return True
+
+    def cancel_all(self):
+        with self.lock:
+            task_ids = [t.id for t in self.pending] + [t.id for t in self.running]
+        for task_id in task_ids:
+            self.cancel(task_id)
+
+    def set_priority(self, task_id, priority):
+        with self.lock:
+            for task in self.pending:
+                if task.id == task_id:
+                    task.priority = priority
+                    return True
+        return False
+
+    def move_to_front(self, task_id):
+        """Give a queued task the highest priority (and switch to the 'priority' policy)"""
+        with self.lock:
+            top = max([t.priority for t in self.pending] + [0]) + 1
+            self.policy = 'priority'
+        return self.set_priority(task_id, top)
+
+    def set_policy(self, policy):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        with self.lock:
+            self.policy = policy
+
+    def snapshot(self):
+        """Return a dict describing the live queue: tasks in execution order, throughput and ETA"""
+        with self.lock:
+            now = time.time()
+            while self.samples and now - self.samples[0][0] > THROUGHPUT_WINDOW:
+                self.samples.popleft()
+            throughput = sum(n for _, n in self.samples) / THROUGHPUT_WINDOW
+            remaining = sum(max(t.size - t.bytes_done, 0) for t in self.pending + self.running if not t.instant)
+            def row(task):
+                return {'id': task.id, 'name': task.name, 'status': task.status, 'size': task.size,
+                        'bytes_done': task.bytes_done, 'priority': task.priority, 'instant': task.instant}
+            return {
+                'paused': self.paused,
+                'policy': self.policy,
+                'running': [row(t) for t in self.running],
+                'queued': [row(t) for t in sorted(self.pending, key=self._sort_key)],
+                'finished': [row(t) for t in reversed(self.finished)],
+                'throughput': throughput,
+                'remaining_bytes': remaining,
+                'eta': remaining / throughput if throughput > 0 else None,
+                'bytes_copied': self.bytes_copied,
+                'throttle': bandwidth_limiter.stats(),
+            }
+
+    def format_summary(self, snapshot=None):
+        """One-line summary of the queue for the status bar"""
+        snap = snapshot or self.snapshot()
+        if not snap['running'] and not snap['queued']:
+            parts = ["Queue: idle"]
         else:
-            # 在 ComfyUI 配置和我们的备选默认路径中都找不到
-            status_callback(f"错误: 无法为关键字 '{model_type_key_lower}' 确定目标文件夹。请检查 ComfyUI 配置或 Mover 的内置映射。")
-            return None # 确实无法处理
+            parts = [f"Queue: {len(snap['running'])} running, {len(snap['queued'])} queued",
+                     f"{format_size(snap['throughput'])}/s"]
+        if snap['eta'] is not None:
+            parts.append(f"ETA {format_duration(snap['eta'])}")
+        throttle = bandwidth_limiter.describe()
+        if throttle:
+            parts.append(throttle)
+        if snap['paused']:
+            parts.append("PAUSED")
+        return " | ".join(parts)
 
-    except Exception as e:
-        # 其他访问 folder_paths 的错误
-        status_callback(f"错误: 获取 ComfyUI 路径时出错 (关键字 '{model_type_key_lower}'): {e}")
+
+# --- Job Queue Service (Local API for download managers) ---
+def _timestamp():
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+class MoveJobQueue:
+    """
+    Persistent queue of move jobs. 每个任务包含文件路径列表, 以及 folder_key (直接指定目标关键字)
+    或 html (HTML 元数据文件) 之一; 都没有时使用参考数据按文件名识别.
+    任务状态保存在 JSON 文件中, 服务重启后未完成的任务会重新排队.
+    任务只能使用启动时指定的 ComfyUI 根目录 (default_comfyui 和 allowed_comfyui), 因为加载 folder_paths.py 会执行该目录中的代码.
+    """
+    def __init__(self, queue_path, default_comfyui=None, allowed_comfyui=None, batch_window=JOB_BATCH_WINDOW,
+                 max_batch_delay=JOB_BATCH_MAX_DELAY, max_batch_files=JOB_BATCH_MAX_FILES, max_workers=MOVE_WORKERS):
+        self.queue_path = queue_path
+        self.details_dir = os.path.splitext(queue_path)[0] + "_details" # 已结束任务的日志和报告, 每个任务一个文件
+        self.default_comfyui = default_comfyui
+        self.allowed_comfyui = {os.path.realpath(p): p for p in [default_comfyui, *(allowed_comfyui or [])] if p}
+        self.batch_window = batch_window
+        self.max_batch_delay = max_batch_delay
+        self.max_batch_files = max_batch_files
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.jobs = {}
+        self.next_batch_id = 1
+        self.last_submit_time = 0.0
+        self.scheduler = MoveScheduler(workers=max_workers)
+        self.job_tasks = {} # {job_id: [MoveTask]}, 仅当前批次
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.queue_path):
+            return
+        try:
+            with open(self.queue_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for job in data.get('jobs', []):
+                if job.get('status') == 'running':
+                    job['status'] = 'queued' # 上次运行被中断
+                if job['status'] not in ('done', 'failed', 'cancelled'):
+                    job.setdefault('log', [])
+                if job['status'] == 'queued' and self.allowed_root(job.get('comfyui')) is None:
+                    job['status'] = 'failed'
+                    job['log'].append(f"错误: ComfyUI 根目录 '{job.get('comfyui')}' 不在本次服务允许的列表中。")
+                    job['finished_at'] = _timestamp()
+                self.jobs[job['id']] = job
+            self.next_batch_id = data.get('next_batch_id', 1)
+        except Exception as e:
+            print(f"Error reading job queue '{self.queue_path}': {e}")
+
+    def _prune_finished(self):
+        """Drop finished jobs older than JOB_RETENTION_SECONDS, keeping at most JOB_HISTORY_LIMIT. Caller must hold self.lock."""
+        finished = []
+        for job in self.jobs.values():
+            if job['status'] in ('done', 'failed', 'cancelled'):
+                try:
+                    finished_time = time.mktime(time.strptime(job['finished_at'], "%Y-%m-%d %H:%M:%S"))
+                except (TypeError, ValueError):
+                    finished_time = 0.0
+                finished.append((finished_time, job['id']))
+        finished.sort(reverse=True)
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for index, (finished_time, job_id) in enumerate(finished):
+            if index >= JOB_HISTORY_LIMIT or finished_time < cutoff:
+                del self.jobs[job_id]
+                try:
+                    os.remove(self._details_path(job_id))
+                except OSError:
+                    pass
+
+    def _details_path(self, job_id):
+        return os.path.join(self.details_dir, f"{job_id}.json")
+
+    def _store_finished_details(self):
+        """
+        Move the log and report of newly finished jobs into their own files, so the queue file
+        (rewritten on every submit) only holds small job records. Caller must hold self.lock.
+        """
+        for job in self.jobs.values():
+            if job['status'] not in ('done', 'failed', 'cancelled') or 'log' not in job:
+                continue
+            try:
+                os.makedirs(self.details_dir, exist_ok=True)
+                with open(self._details_path(job['id']), 'w', encoding='utf-8') as f:
+                    json.dump({'log': job['log'], 'report': job['report']}, f, ensure_ascii=False)
+            except Exception as e:
+                print(f"Error saving job details for '{job['id']}': {e}")
+                continue
+            del job['log'], job['report']
+
+    def _save(self):
+        """Persist the queue (after pruning old finished jobs). Caller must hold self.lock."""
+        self._prune_finished()
+        self._store_finished_details()
+        try:
+            tmp_path = self.queue_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'next_batch_id': self.next_batch_id, 'jobs': list(self.jobs.values())}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.queue_path)
+        except Exception as e:
+            print(f"Error saving job queue '{self.queue_path}': {e}")
+
+    def allowed_root(self, comfyui_path):
+        """Return the configured ComfyUI root matching comfyui_path, or None if it wasn't allowed at startup"""
+        if not comfyui_path or not isinstance(comfyui_path, str):
+            return None
+        return self.allowed_comfyui.get(os.path.realpath(comfyui_path))
+
+    def submit(self, payload):
+        """Validate and enqueue a job. Never blocks on moving; returns the job dict. Raises ValueError."""
+        files = payload.get('files')
+        if not isinstance(files, list) or not files or not all(isinstance(f, str) and f for f in files):
+            raise ValueError("'files' must be a non-empty list of paths")
+        folder_key = payload.get('folder_key')
+        html_path = payload.get('html')
+        if folder_key is not None and not isinstance(folder_key, str):
+            raise ValueError("'folder_key' must be a string")
+        if html_path is not None and not isinstance(html_path, str):
+            raise ValueError("'html' must be a string")
+        priority = payload.get('priority', 0)
+        if not isinstance(priority, int):
+            raise ValueError("'priority' must be an integer")
+        classify = payload.get('classify', False)
+        if not isinstance(classify, bool):
+            raise ValueError("'classify' must be a boolean")
+        requested_comfyui = payload.get('comfyui')
+        if requested_comfyui is not None and not isinstance(requested_comfyui, str):
+            raise ValueError("'comfyui' must be a string")
+        if requested_comfyui:
+            comfyui_path = self.allowed_root(requested_comfyui)
+            if comfyui_path is None:
+                raise ValueError("'comfyui' is not an allowed ComfyUI root (start the service with --comfyui / --allow-comfyui)")
+        else:
+            comfyui_path = self.default_comfyui
+        if not comfyui_path or not os.path.isdir(comfyui_path):
+            raise ValueError("no valid ComfyUI root folder (start the service with --comfyui)")
+
+        with self.lock:
+            job = {
+                'id': uuid.uuid4().hex[:12],
+                'status': 'queued',
+                'submitted_at': _timestamp(),
+                'submitted_epoch': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'batch_id': None,
+                'files': [os.path.abspath(f) for f in files],
+                'folder_key': folder_key.lower() if folder_key else None,
+                'html': html_path,
+                'comfyui': comfyui_path,
+                'priority': priority,
+                'classify': classify,
+                'progress': {'done': 0, 'total': len(files)},
+                'report': None,
+                'log': [],
+            }
+            self.jobs[job['id']] = job
+            self.last_submit_time = time.time()
+            self._save()
+            self.wakeup.notify()
+            return job
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or the remaining moves of a running one. Returns the job status or None."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] == 'queued':
+                job['status'] = 'cancelled'
+                job['finished_at'] = _timestamp()
+                self._save()
+                return job['status']
+            tasks = list(self.job_tasks.get(job_id, []))
+        for task in tasks:
+            self.scheduler.cancel(task.id)
+        return job['status']
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            job = json.loads(json.dumps(job)) if job else None
+        if job is not None and 'log' not in job:
+            try:
+                with open(self._details_path(job_id), 'r', encoding='utf-8') as f:
+                    job.update(json.load(f))
+            except (OSError, ValueError):
+                job.update({'log': [], 'report': None})
+        return job
+
+    def summaries(self):
+        with self.lock:
+            return [{k: job[k] for k in ('id', 'status', 'submitted_at', 'finished_at', 'batch_id', 'progress')}
+                    for job in self.jobs.values()]
+
+    def _next_batch(self):
+        """
+        Wait for queued jobs and coalesce them into one batch: 收到第一个任务后继续等待,
+        直到 batch_window 秒内没有新的提交, 这样一次突发的几百个提交只会触发一次运行.
+        持续不断的提交不会无限推迟: 最早的任务等待 max_batch_delay 秒或排队文件达到 max_batch_files 个时立即运行.
+        """
+        with self.lock:
+            while True:
+                queued = [job for job in self.jobs.values() if job['status'] == 'queued']
+                if queued:
+                    now = time.time()
+                    quiet_for = now - self.last_submit_time
+                    waited = now - min(job.get('submitted_epoch', 0) for job in queued)
+                    queued_files = sum(len(job['files']) for job in queued)
+                    if quiet_for >= self.batch_window or waited >= self.max_batch_delay or queued_files >= self.max_batch_files:
+                        break
+                    self.wakeup.wait(min(self.batch_window - quiet_for, self.max_batch_delay - waited))
+                else:
+                    self.wakeup.wait()
+            batch_id = self.next_batch_id
+            self.next_batch_id += 1
+            for job in queued:
+                job['status'] = 'running'
+                job['batch_id'] = batch_id
+                job['started_at'] = _timestamp()
+            self._save()
+            return batch_id, queued
+
+    def _job_logger(self, job):
+        def log(message):
+            with self.lock:
+                job['log'].append(message)
+                del job['log'][:-JOB_LOG_LINES]
+        return log
+
+    def run_forever(self):
+        """Batch loop, run on a background thread by serve_job_api()"""
+        while True:
+            batch_id, jobs = self._next_batch()
+            print(f"[{_timestamp()}] Batch {batch_id}: {len(jobs)} job(s)")
+            try:
+                self._run_batch(jobs)
+            except Exception as e:
+                print(f"Batch {batch_id} failed: {e}")
+                with self.lock:
+                    for job in jobs:
+                        if job['status'] == 'running':
+                            job['status'] = 'failed'
+                            job['log'].append(f"严重错误: {e}")
+                            job['finished_at'] = _timestamp()
+                    self._save()
+
+    def _run_batch(self, jobs):
+        if not load_reference_data(print):
+            raise Exception("参考数据加载失败。")
+        html_cache = {}
+        seen_sources = set()
+        batch_start = time.time()
+        throttled_before = bandwidth_limiter.stats()['throttled_seconds']
+        by_comfyui = {}
+        for job in jobs:
+            by_comfyui.setdefault(job['comfyui'], []).append(job)
+
+        for comfyui_path, comfy_jobs in by_comfyui.items():
+            if self.allowed_root(comfyui_path) is None: # submit() 已检查, 这里防止队列文件被修改
+                raise Exception(f"ComfyUI 根目录不在允许列表中: {comfyui_path}")
+            if not initialize_folder_paths(comfyui_path, print, interactive=False):
+                raise Exception(f"ComfyUI folder_paths 初始化失败: {comfyui_path}")
+            tasks = []
+            try:
+                self._plan_jobs(comfy_jobs, comfyui_path, html_cache, seen_sources, tasks)
+            finally:
+                # 规划中途出错时, 已提交给调度器的任务仍会执行, 等待它们并记录结果
+                for task, job, source_path in tasks:
+                    result = task.wait()
+                    if task.error:
+                        self._job_logger(job)(f"  -> 错误: {task.error}")
+                    self._record_result(job, source_path, result)
+
+        throttle = bandwidth_limiter.stats()
+        batch_metrics = {
+            'batch_seconds': round(time.time() - batch_start, 2),
+            'bandwidth_limit': throttle['limit'],
+            'device_limits': throttle['device_limits'],
+            'throttled_seconds': round(throttle['throttled_seconds'] - throttled_before, 2),
+            'idle_io': throttle['idle_io'],
+        }
+        with self.lock:
+            for job in jobs:
+                self.job_tasks.pop(job['id'], None)
+                job['report']['metrics'] = batch_metrics
+                cancelled = any(r.startswith('cancelled') for r in job['report']['files'].values())
+                if cancelled:
+                    job['status'] = 'cancelled'
+                elif job['report']['errors'] and not job['report']['moved']:
+                    job['status'] = 'failed'
+                else:
+                    job['status'] = 'done'
+                job['finished_at'] = _timestamp()
+            self._save()
+
+    def _plan_jobs(self, jobs, comfyui_path, html_cache, seen_sources, tasks):
+        """Classify the files of jobs (all for one ComfyUI root) and submit them; appends (task, job, source_path) to tasks"""
+        for job in jobs:
+            log = self._job_logger(job)
+            with self.lock:
+                job['report'] = {'moved': 0, 'overwritten': 0, 'skipped': 0, 'errors': 0, 'files': {}}
+            html_map = None
+            if job['html'] and not job['folder_key']:
+                if job['html'] not in html_cache:
+                    html_cache[job['html']] = parse_model_info_from_html(job['html'], print, interactive=False) or {}
+                html_map = {os.path.basename(k).lower(): v for k, v in html_cache[job['html']].items()}
+            for source_path in job['files']:
+                # 同一批次中重复提交的文件只移动一次
+                if source_path in seen_sources:
+                    self._record_result(job, source_path, 'skipped', "重复提交")
+                    continue
+                seen_sources.add(source_path)
+                match = self._classify(source_path, job['folder_key'], html_map, log, classify=job.get('classify', False))
+                if match is None:
+                    self._record_result(job, source_path, 'skipped', "无法确定目标文件夹")
+                    continue
+                target_key, mapped_filename = match
+                # 在计划时确定目标文件夹: 任务执行时 folder_paths 可能已被其他批次重新初始化
+                target_folder = get_destination_folder(target_key, comfyui_path, log)
+                if not target_folder:
+                    self._record_result(job, source_path, 'skipped', "无法确定目标文件夹")
+                    continue
+                try:
+                    size = os.path.getsize(source_path)
+                except OSError as e: # 文件在分类后被删除或移走
+                    log(f"  -> 跳过: 无法读取文件 '{source_path}': {e}")
+                    self._record_result(job, source_path, 'skipped', f"无法读取文件: {e}")
+                    continue
+                try:
+                    task = self.scheduler.submit(
+                        os.path.basename(source_path), move_model_file,
+                        (source_path, target_key, mapped_filename, target_folder, log),
+                        size=size,
+                        instant=is_same_device(source_path, target_folder),
+                        priority=job.get('priority', 0),
+                        paths=(source_path, model_file_destination(target_folder, mapped_filename)))
+                except MoveConflict as e:
+                    self._record_result(job, source_path, 'skipped', f"已在队列中: {e}")
+                    continue
+                with self.lock:
+                    self.job_tasks.setdefault(job['id'], []).append(task)
+                tasks.append((task, job, source_path))
+
+    def _classify(self, source_path, folder_key, html_map, log, classify=False):
+        """Return (target_key, mapped_filename) for one submitted file, or None"""
+        filename = os.path.basename(source_path)
+        if not os.path.isfile(source_path):
+            log(f"  -> 跳过: 文件 '{source_path}' 不存在。")
+            return None
+        # 与 GUI 模式相同的过滤, 指定 folder_key 时也不例外
+        if not is_likely_model_file(filename):
+            log(f"  -> 跳过: '{filename}' 根据名称/扩展名判断不是标准模型文件。")
+            return None
+        if folder_key:
+            return folder_key, filename
+        if html_map is not None:
+            node_type = html_map.get(filename.lower())
+            target_key = resolve_folder_key_for_nodetype(node_type, log) if node_type else None
+            return (target_key, filename) if target_key else None
+        match = get_reference_index().get(filename.lower())
+        if match:
+            return match
+        if classify and filename_classifier is not None:
+            target_key, confidence = filename_classifier.predict([filename])[0]
+            if filename_classifier.accepts(target_key, confidence):
+                log(f"  分类器: {filename} -> '{target_key}' (置信度 {confidence:.2f})")
+                return target_key, filename
         return None
 
-    # 3. 如果找到了路径 (无论是来自 ComfyUI 配置还是 Mover 默认)，则创建目录并返回
-    if target_folder:
+    def _record_result(self, job, source_path, result, reason=None):
+        with self.lock:
+            report = job['report']
+            report['files'][source_path] = result if reason is None else f"{result}: {reason}"
+            if result == 'error':
+                report['errors'] += 1
+            elif result in ('skipped', 'cancelled'):
+                report['skipped'] += 1
+            else:
+                report['moved'] += 1
+                if result == 'overwritten':
+                    report['overwritten'] += 1
+            job['progress']['done'] += 1
+
+
+class JobAPIRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /jobs       提交任务 {"files": [...], "folder_key": "loras"} 或 {"files": [...], "html": "..."}, 可选 "priority"
+    POST /jobs/<id>/cancel  取消任务
+    GET  /throttle   当前带宽限制和限速统计
+    POST /throttle   调整限速 {"limit_mbps": 50, "device_limits": {"/path": 20}, "idle_io": true}
+    GET  /jobs       所有任务的状态摘要
+    GET  /jobs/<id>  单个任务的状态、进度、日志和运行报告
+    """
+    job_queue = None # set by serve_job_api()
+    allowed_hosts = {"localhost", "127.0.0.1", "::1"} # 可接受的 Host/Origin 主机名; serve_job_api() 会加入监听地址
+
+    def _request_rejection(self, is_post):
+        """
+        Return an error message if the request may come from a web page, else None.
+        浏览器可以跨域发送 text/plain 的 POST (无预检), DNS rebinding 会带上外部 Host,
+        所以要求 application/json, 拒绝外部 Origin, 并检查 Host.
+        """
+        def host_allowed(netloc):
+            if netloc.startswith('['): # [::1]:8765
+                host, _, rest = netloc[1:].partition(']')
+                port = rest[1:] if rest.startswith(':') else ''
+            else:
+                host, _, port = netloc.partition(':') if netloc.count(':') == 1 else (netloc, '', '')
+            host = host.lower()
+            if port and (not port.isdigit() or (self.server.server_port and int(port) != self.server.server_port)):
+                return False
+            if host in self.allowed_hosts:
+                return True
+            # 客户端直接用 IP 连接 (如局域网中的下载管理器): Host 与本连接的本地地址相同
+            local_address = self.connection.getsockname() if self.server.server_port else None
+            return bool(local_address) and host == str(local_address[0]).lower()
+
+        if not host_allowed(self.headers.get('Host', '')):
+            return "invalid Host header"
+        origin = self.headers.get('Origin')
+        if origin is not None:
+            scheme, sep, netloc = origin.partition('://')
+            if not sep or scheme not in ('http', 'https') or not host_allowed(netloc.rstrip('/')):
+                return "cross-origin requests are not allowed"
+        if is_post and self.headers.get('Content-Type', '').split(';')[0].strip().lower() != "application/json":
+            return "Content-Type must be application/json"
+        return None
+
+    def _send_json(self, status_code, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        """Read the JSON object request body. Raises ValueError."""
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length).decode('utf-8') or '{}') # JSONDecodeError 是 ValueError 的子类
+        if not isinstance(payload, dict):
+            raise ValueError("request body must be a JSON object")
+        return payload
+
+    def do_GET(self):
+        rejection = self._request_rejection(is_post=False)
+        if rejection:
+            self._send_json(403, {'error': rejection})
+            return
+        parts = [p for p in self.path.split('?')[0].split('/') if p]
+        if parts == ['throttle']:
+            self._send_json(200, bandwidth_limiter.stats())
+        elif parts == ['jobs']:
+            self._send_json(200, {'jobs': self.job_queue.summaries()})
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = self.job_queue.get(parts[1])
+            if job:
+                self._send_json(200, job)
+            else:
+                self._send_json(404, {'error': f"job '{parts[1]}' not found"})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        rejection = self._request_rejection(is_post=True)
+        if rejection:
+            self._send_json(403, {'error': rejection})
+            return
+        parts = [p for p in self.path.split('?')[0].split('/') if p]
+        if parts == ['throttle']:
+            try:
+                apply_throttle_settings(self._read_json())
+            except (ValueError, OSError) as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            self._send_json(200, bandwidth_limiter.stats())
+            return
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'cancel':
+            status = self.job_queue.cancel(parts[1])
+            if status is None:
+                self._send_json(404, {'error': f"job '{parts[1]}' not found"})
+            else:
+                self._send_json(200, {'id': parts[1], 'status': status})
+            return
+        if parts != ['jobs']:
+            self._send_json(404, {'error': 'not found'})
+            return
         try:
-            os.makedirs(target_folder, exist_ok=True) # 确保目录存在
-            return target_folder
-        except OSError as e:
-             status_callback(f"错误: 创建目标目录 '{target_folder}' 失败: {e}")
-             return None
+            job = self.job_queue.submit(self._read_json())
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        self._send_json(202, {'id': job['id'], 'status': job['status']})
+
+    def address_string(self):
+        # Unix socket 的 client_address 是空字符串
+        return self.client_address[0] if self.client_address and isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        print(f"[{_timestamp()}] {self.address_string()} {format % args}")
+
+
+class JobAPIServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer with a listen backlog large enough for bursts of submissions"""
+    request_queue_size = JOB_API_BACKLOG
+
+if hasattr(socket, 'AF_UNIX'):
+    class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """HTTP over a Unix domain socket"""
+        daemon_threads = True
+        request_queue_size = JOB_API_BACKLOG
+
+        def server_bind(self):
+            socketserver.UnixStreamServer.server_bind(self)
+            self.server_name, self.server_port = "localhost", 0
+
+def apply_throttle_settings(settings):
+    """
+    Apply {"limit_mbps", "device_limits": {path: mbps}, "idle_io"} to bandwidth_limiter.
+    Shared by the job API and the command line. Raises ValueError / OSError.
+    """
+    def to_rate(value):
+        if not isinstance(value, (int, float)) or value < 0:
+            raise ValueError("limits must be non-negative numbers (MB/s, 0 = unlimited)")
+        return int(value * 1024 * 1024)
+    if settings.get('limit_mbps') is not None:
+        bandwidth_limiter.set_limit(to_rate(settings['limit_mbps']))
+    for path, mbps in (settings.get('device_limits') or {}).items():
+        bandwidth_limiter.set_limit(to_rate(mbps), path=path)
+    if settings.get('idle_io') is not None:
+        bandwidth_limiter.set_idle_io(settings['idle_io'])
+
+def parse_device_limits(values):
+    """Parse repeated --device-limit PATH=MBPS options into {path: mbps}"""
+    limits = {}
+    for value in values or []:
+        path, sep, mbps = value.rpartition('=')
+        if not sep or not path:
+            raise ValueError(f"Invalid --device-limit '{value}', expected PATH=MBPS")
+        limits[path] = float(mbps)
+    return limits
+
+def call_job_api(method, path, payload=None, host="127.0.0.1", port=JOB_API_PORT, socket_path=None, retries=JOB_API_RETRIES):
+    """
+    Send a request to a running job API and return the decoded JSON response.
+    连接被拒绝或重置 (服务繁忙、监听队列已满) 时按指数退避重试 retries 次.
+    """
+    if socket_path:
+        class UnixHTTPConnection(http.client.HTTPConnection):
+            def connect(self):
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.connect(socket_path)
+    body = json.dumps(payload).encode('utf-8') if payload is not None else None
+    for attempt in range(retries + 1):
+        if socket_path:
+            connection = UnixHTTPConnection("localhost")
+        else:
+            connection = http.client.HTTPConnection(host, port, timeout=10)
+        try:
+            connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            return response.status, json.loads(response.read().decode('utf-8') or '{}')
+        except (ConnectionRefusedError, ConnectionResetError, BrokenPipeError, http.client.RemoteDisconnected):
+            if attempt == retries:
+                raise
+            time.sleep(0.1 * 2 ** attempt)
+        finally:
+            connection.close()
+
+def serve_job_api(comfyui_path=None, host="127.0.0.1", port=JOB_API_PORT, socket_path=None, allowed_comfyui=None):
+    """Run the local job API until interrupted"""
+    job_queue = MoveJobQueue(os.path.join(get_script_dir(), JOB_QUEUE_FILE), default_comfyui=comfyui_path, allowed_comfyui=allowed_comfyui)
+    JobAPIRequestHandler.job_queue = job_queue
+    if not socket_path and host not in ("", "0.0.0.0", "::"):
+        JobAPIRequestHandler.allowed_hosts = JobAPIRequestHandler.allowed_hosts | {host.lower()}
+    threading.Thread(target=job_queue.run_forever, daemon=True).start()
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, JobAPIRequestHandler)
+        print(f"ComfyMover job API listening on unix socket {socket_path}")
     else:
-        # 如果 get_folder_paths 返回空列表 (理论上不常见，但处理一下)
-        status_callback(f"警告: 未能为关键字 '{model_type_key_lower}' 获取有效路径。")
-        return None
+        server = JobAPIServer((host, port), JobAPIRequestHandler)
+        print(f"ComfyMover job API listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down...")
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+# --- GUI Widget: Virtualized File Table ---
+class VirtualFileTable(ctk.CTkFrame):
+    """
+    Table for very large file lists: 数据按列保存在列表中, 过滤/排序只重排行索引,
+    Canvas 上只绘制可见的行 (固定数量的文本项循环复用).
+    """
+    COLUMNS = (("names", "File", 0.40), ("sizes", "Size", 0.10), ("keys", "Folder Key", 0.15), ("dests", "Destination", 0.35))
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+        self.font = ctk.CTkFont(size=12)
+        self.row_height = max(BROWSER_ROW_HEIGHT, self.font.metrics("linespace") + 4)
+        self.char_width = max(1, self.font.measure("0"))
+        self.header = tk.Canvas(self, height=self.row_height + 4, highlightthickness=0)
+        self.header.grid(row=0, column=0, sticky="ew")
+        self.canvas = tk.Canvas(self, highlightthickness=0)
+        self.canvas.grid(row=1, column=0, sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.yview)
+        self.scrollbar.grid(row=0, column=1, rowspan=2, sticky="ns")
+
+        self.names, self.sizes, self.keys, self.dests = [], [], [], []
+        self.search_text = [] # 小写的 "文件名 关键字", 用于过滤
+        self.sorted_order = None # 排序后的全部行索引 (缓存, 数据或排序列变化时失效)
+        self.view = [] # 过滤后、按排序顺序的行索引
+        self.filter_text = ""
+        self.sort_column = None
+        self.sort_reverse = False
+        self.top = 0 # 第一个可见行在 view 中的位置
+        self.row_items = [] # 复用的 Canvas 文本项: 每行每列一个
+
+        self.canvas.bind("<Configure>", lambda event: self.render())
+        self.canvas.bind("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind("<Button-4>", lambda event: self.scroll_rows(-3))
+        self.canvas.bind("<Button-5>", lambda event: self.scroll_rows(3))
+        self.header.bind("<Button-1>", self._on_header_click)
+        self._apply_colors()
+
+    def _apply_colors(self):
+        self.bg_color = self._apply_appearance_mode(ctk.ThemeManager.theme["CTkTextbox"]["fg_color"])
+        self.text_color = self._apply_appearance_mode(ctk.ThemeManager.theme["CTkTextbox"]["text_color"])
+        self.header_color = self._apply_appearance_mode(ctk.ThemeManager.theme["CTkFrame"]["top_fg_color"])
+        self.canvas.configure(bg=self.bg_color)
+        self.header.configure(bg=self.header_color)
+        for items in self.row_items:
+            for item in items:
+                self.canvas.itemconfigure(item, fill=self.text_color)
+
+    def _set_appearance_mode(self, mode_string):
+        super()._set_appearance_mode(mode_string)
+        self._apply_colors()
+        self.render()
+
+    # --- Data ---
+    def clear(self):
+        self.names, self.sizes, self.keys, self.dests, self.search_text = [], [], [], [], []
+        self.sorted_order = None
+        self.top = 0
+        self._rebuild_view()
+
+    def append_rows(self, names, sizes, keys, dests):
+        """Append one scanned batch (parallel lists)"""
+        self.names.extend(names)
+        self.sizes.extend(sizes)
+        self.keys.extend(keys)
+        self.dests.extend(dests)
+        self.search_text.extend(f"{name} {key}".lower() for name, key in zip(names, keys))
+        self.sorted_order = None
+        self._rebuild_view()
+
+    def set_filter(self, text):
+        self.filter_text = text.strip().lower()
+        self.top = 0
+        self._rebuild_view()
+
+    def sort_by(self, column):
+        if self.sort_column == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column, self.sort_reverse = column, False
+        self.sorted_order = None
+        self._rebuild_view()
+
+    def _rebuild_view(self):
+        if self.sorted_order is None:
+            order = range(len(self.names))
+            if self.sort_column == "names":
+                lowered = [name.lower() for name in self.names]
+                order = sorted(order, key=lowered.__getitem__, reverse=self.sort_reverse)
+            elif self.sort_column is not None:
+                order = sorted(order, key=getattr(self, self.sort_column).__getitem__, reverse=self.sort_reverse)
+            self.sorted_order = list(order)
+        if self.filter_text:
+            search_text, needle = self.search_text, self.filter_text
+            self.view = [i for i in self.sorted_order if needle in search_text[i]]
+        else:
+            self.view = self.sorted_order
+        self.render()
+
+    def visible_names(self):
+        return [self.names[i] for i in self.view]
+
+    # --- Scrolling ---
+    def _visible_row_count(self):
+        return max(1, self.canvas.winfo_height() // self.row_height)
+
+    def yview(self, *args):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units'|'pages')"""
+        if args and args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.view))
+        elif args and args[0] == "scroll":
+            step = int(args[1])
+            self.top += step * self._visible_row_count() if len(args) > 2 and args[2] == "pages" else step * 3
+        self.render()
+
+    def scroll_rows(self, rows):
+        self.top += rows
+        self.render()
+
+    def _on_mousewheel(self, event):
+        # Windows: delta 以 120 为单位; macOS: 小整数
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll_rows(-3 * delta)
+
+    # --- Rendering ---
+    def _column_layout(self, width):
+        layout, x = [], 4
+        for column, title, fraction in self.COLUMNS:
+            col_width = int(width * fraction)
+            layout.append((column, title, x, max(1, (col_width - 8) // self.char_width)))
+            x += col_width
+        return layout
+
+    def _cell_text(self, column, row):
+        if column == "sizes":
+            return format_size(self.sizes[row])
+        return getattr(self, column)[row]
+
+    @staticmethod
+    def _clip(text, max_chars):
+        return text if len(text) <= max_chars else text[:max(0, max_chars - 1)] + "…"
+
+    def render(self):
+        width = self.canvas.winfo_width()
+        if width <= 1: # 尚未布局
+            return
+        visible = self._visible_row_count()
+        total = len(self.view)
+        self.top = max(0, min(self.top, total - visible))
+        layout = self._column_layout(width)
+
+        self.header.delete("all")
+        for column, title, x, max_chars in layout:
+            if column == self.sort_column:
+                title += " ▼" if self.sort_reverse else " ▲"
+            self.header.create_text(x, (self.row_height + 4) // 2, anchor="w", text=self._clip(title, max_chars),
+                                    font=self.font, fill=self.text_color)
+
+        while len(self.row_items) < visible + 1:
+            self.row_items.append([self.canvas.create_text(0, 0, anchor="w", font=self.font, fill=self.text_color)
+                                   for _ in self.COLUMNS])
+        for slot, items in enumerate(self.row_items):
+            position = self.top + slot
+            y = slot * self.row_height + self.row_height // 2
+            row = self.view[position] if slot <= visible and position < total else None
+            for item, (column, _, x, max_chars) in zip(items, layout):
+                self.canvas.coords(item, x, y)
+                self.canvas.itemconfigure(item, text="" if row is None else self._clip(self._cell_text(column, row), max_chars))
+
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _on_header_click(self, event):
+        for column, _, x, max_chars in reversed(self._column_layout(self.canvas.winfo_width())):
+            if event.x >= x:
+                self.sort_by(column)
+                return
 
 
 # --- GUI Application Class (Sidebar Layout) ---
@@ -380,7 +3268,9 @@ class App(ctk.CTk):
         ctk.set_default_color_theme("blue")
 
         self.config_path = os.path.join(get_script_dir(), CONFIG_FILE)
-        self.processing_thread = None
+        self.processing_thread = None # 扫描/规划线程; 实际移动由 self.scheduler 执行
+        self.listing_stop_event = None # 下载文件夹浏览器的后台扫描
+        self.scheduler = MoveScheduler()
         self.current_mode = "html" # Default mode
 
         # --- Main Window Grid Configuration ---
@@ -410,6 +3300,10 @@ class App(ctk.CTk):
         self.html_mode_button.grid(row=1, column=0, padx=20, pady=10, sticky="ew")
         self.ai_mode_button = ctk.CTkButton(self.sidebar_frame, text="AI Mode", command=lambda: self.show_content_frame("ai"))
         self.ai_mode_button.grid(row=2, column=0, padx=20, pady=10, sticky="ew")
+        self.dedupe_mode_button = ctk.CTkButton(self.sidebar_frame, text="Dedupe Mode", command=lambda: self.show_content_frame("dedupe"))
+        self.dedupe_mode_button.grid(row=3, column=0, padx=20, pady=10, sticky="ew")
+        self.queue_mode_button = ctk.CTkButton(self.sidebar_frame, text="Queue", command=lambda: self.show_content_frame("queue"))
+        self.queue_mode_button.grid(row=4, column=0, padx=20, pady=10, sticky="new")
         self.appearance_mode_label = ctk.CTkLabel(self.sidebar_frame, text="Appearance:", anchor="w")
         self.appearance_mode_label.grid(row=5, column=0, padx=20, pady=(10, 0), sticky="s")
         self.appearance_mode_optionemenu = ctk.CTkOptionMenu(self.sidebar_frame, values=["Light", "Dark", "System"],
@@ -426,6 +3320,8 @@ class App(ctk.CTk):
         self.status_frame.grid_columnconfigure(0, weight=1)
         self.status_frame.grid_rowconfigure(1, weight=1)
         ctk.CTkLabel(self.status_frame, text="Processing Log:").grid(row=0, column=0, padx=5, sticky="w")
+        self.queue_summary_label = ctk.CTkLabel(self.status_frame, text="Queue: idle")
+        self.queue_summary_label.grid(row=0, column=0, padx=5, sticky="e")
         self.status_textbox = ctk.CTkTextbox(self.status_frame, state="disabled", wrap="word", height=150)
         self.status_textbox.grid(row=1, column=0, padx=5, pady=5, sticky="nsew")
 
@@ -433,6 +3329,7 @@ class App(ctk.CTk):
         self.load_initial_paths()
         self.show_content_frame(self.current_mode)
         self.appearance_mode_optionemenu.set("System")
+        self.after(QUEUE_REFRESH_MS, self.refresh_queue_view)
 
     def build_html_mode_ui(self, parent_frame):
         """Creates widgets for the HTML mode in the parent_frame"""
@@ -444,8 +3341,15 @@ class App(ctk.CTk):
         loaded_paths = load_paths_from_config(self.config_path)
         if loaded_paths and 'html' in loaded_paths:
             self.html_path_entry.insert(0, loaded_paths.get('html', ''))
+        self.classify_unlisted_var = tk.BooleanVar(value=False) # Define instance variable (opt-in: 分类器可能猜错文件夹)
+        classifier_note = "experimental" if np is not None else "requires numpy"
+        ctk.CTkCheckBox(parent_frame, text=f"Also move files not listed in the HTML, classified by filename ({classifier_note})",
+                        variable=self.classify_unlisted_var).grid(row=1, column=0, columnspan=3, padx=5, pady=5, sticky="w")
         self.process_button_html = ctk.CTkButton(parent_frame, text="Start Moving (HTML Mode - Overwrites)", command=lambda: self.start_processing(mode="html")) # Define instance variable
-        self.process_button_html.grid(row=1, column=0, columnspan=3, pady=20)
+        self.process_button_html.grid(row=2, column=0, columnspan=3, pady=20)
+        self.scan_nodes_button = ctk.CTkButton(parent_frame, text="Update Reference Data from ComfyUI Nodes", fg_color="transparent", border_width=1,
+                                               command=self.start_node_scan) # Define instance variable
+        self.scan_nodes_button.grid(row=3, column=0, columnspan=3, pady=(0, 10))
 
     def build_ai_mode_ui(self, parent_frame):
         """Creates widgets for the AI mode in the parent_frame"""
@@ -459,21 +3363,140 @@ class App(ctk.CTk):
         self.ai_response_textbox.grid(row=2, column=0, padx=10, pady=5, sticky="nsew")
         self.process_button_ai = ctk.CTkButton(parent_frame, text="Start Moving (AI Mode - Overwrites)", command=lambda: self.start_processing(mode="ai")) # Define instance variable
         self.process_button_ai.grid(row=3, column=0, padx=10, pady=10)
-        ctk.CTkLabel(parent_frame, text="Download Folder Files (Output):").grid(row=4, column=0, padx=10, pady=(10,0), sticky="w")
-        self.filename_list_textbox = ctk.CTkTextbox(parent_frame, state="disabled", wrap="none", height=100) # Define instance variable
-        self.filename_list_textbox.grid(row=5, column=0, padx=10, pady=5, sticky="nsew")
+        listing_bar = ctk.CTkFrame(parent_frame, fg_color="transparent")
+        listing_bar.grid(row=4, column=0, padx=10, pady=(10, 0), sticky="ew")
+        listing_bar.grid_columnconfigure(2, weight=1)
+        ctk.CTkLabel(listing_bar, text="Download Folder Files:").grid(row=0, column=0, padx=(0, 10), sticky="w")
+        self.file_filter_entry = ctk.CTkEntry(listing_bar, placeholder_text="Filter by name or folder key...") # Define instance variable
+        self.file_filter_entry.grid(row=0, column=1, columnspan=2, sticky="ew")
+        self.file_filter_entry.bind("<KeyRelease>", lambda event: self.apply_file_filter())
+        self.file_count_label = ctk.CTkLabel(listing_bar, text="") # Define instance variable
+        self.file_count_label.grid(row=0, column=3, padx=10)
+        ctk.CTkButton(listing_bar, text="Copy Names", width=90, command=self.copy_listed_filenames).grid(row=0, column=4)
+        self.file_table = VirtualFileTable(parent_frame, height=160) # Define instance variable
+        self.file_table.grid(row=5, column=0, padx=10, pady=5, sticky="nsew")
+
+    def build_dedupe_mode_ui(self, parent_frame):
+        """Creates widgets for the duplicate detection mode in the parent_frame"""
+        parent_frame.grid_columnconfigure(0, weight=1)
+        ctk.CTkLabel(parent_frame, text="Scan all ComfyUI model folders for identical files (size -> sampled fingerprint -> full hash).",
+                     wraplength=550, justify="left").grid(row=0, column=0, padx=10, pady=(10, 5), sticky="w")
+        self.dedupe_hardlink_var = tk.BooleanVar(value=False) # Define instance variable
+        ctk.CTkCheckBox(parent_frame, text="Replace duplicates with hardlinks (same disk only)", variable=self.dedupe_hardlink_var).grid(row=1, column=0, padx=10, pady=5, sticky="w")
+        self.process_button_dedupe = ctk.CTkButton(parent_frame, text="Scan for Duplicates", command=self.start_dedupe) # Define instance variable
+        self.process_button_dedupe.grid(row=2, column=0, padx=10, pady=20)
+
+    def build_queue_mode_ui(self, parent_frame):
+        """Creates widgets for the live move queue view in the parent_frame"""
+        parent_frame.grid_columnconfigure(5, weight=1)
+        parent_frame.grid_rowconfigure(2, weight=1)
+        ctk.CTkButton(parent_frame, text="Pause", width=80, command=self.scheduler.pause).grid(row=0, column=0, padx=5, pady=10)
+        ctk.CTkButton(parent_frame, text="Resume", width=80, command=self.scheduler.resume).grid(row=0, column=1, padx=5, pady=10)
+        ctk.CTkButton(parent_frame, text="Cancel All", width=80, command=self.cancel_all_tasks).grid(row=0, column=2, padx=5, pady=10)
+        ctk.CTkLabel(parent_frame, text="Order:").grid(row=0, column=3, padx=(15, 5), pady=10)
+        self.queue_policy_menu = ctk.CTkOptionMenu(parent_frame, values=list(MoveScheduler.POLICIES), width=140,
+                                                   command=self.scheduler.set_policy) # Define instance variable
+        self.queue_policy_menu.set(self.scheduler.policy)
+        self.queue_policy_menu.grid(row=0, column=4, padx=5, pady=10, sticky="w")
+        ctk.CTkLabel(parent_frame, text="Task ID:").grid(row=1, column=0, padx=5, pady=5)
+        self.queue_task_entry = ctk.CTkEntry(parent_frame, width=80) # Define instance variable
+        self.queue_task_entry.grid(row=1, column=1, padx=5, pady=5)
+        ctk.CTkButton(parent_frame, text="Cancel Task", width=80, command=self.cancel_selected_task).grid(row=1, column=2, padx=5, pady=5)
+        ctk.CTkButton(parent_frame, text="Move to Front", width=100, command=self.prioritize_selected_task).grid(row=1, column=3, columnspan=2, padx=5, pady=5, sticky="w")
+        self.queue_textbox = ctk.CTkTextbox(parent_frame, state="disabled", wrap="none", font=ctk.CTkFont(family="Courier", size=12)) # Define instance variable
+        self.queue_textbox.grid(row=2, column=0, columnspan=6, padx=5, pady=5, sticky="nsew")
+        ctk.CTkLabel(parent_frame, text="Limit MB/s:").grid(row=3, column=0, padx=5, pady=(5, 10))
+        self.bandwidth_limit_entry = ctk.CTkEntry(parent_frame, width=80, placeholder_text="0 = off") # Define instance variable
+        limit = bandwidth_limiter.stats()['limit']
+        if limit:
+            self.bandwidth_limit_entry.insert(0, f"{limit / (1024 * 1024):g}")
+        self.bandwidth_limit_entry.grid(row=3, column=1, padx=5, pady=(5, 10))
+        ctk.CTkButton(parent_frame, text="Apply", width=80, command=self.apply_bandwidth_limit).grid(row=3, column=2, padx=5, pady=(5, 10))
+        self.idle_io_var = tk.BooleanVar(value=bandwidth_limiter.idle_io) # Define instance variable
+        idle_io_checkbox = ctk.CTkCheckBox(parent_frame, text="Idle I/O priority (Linux)", variable=self.idle_io_var,
+                                           command=lambda: bandwidth_limiter.set_idle_io(self.idle_io_var.get()))
+        idle_io_checkbox.grid(row=3, column=3, columnspan=2, padx=5, pady=(5, 10), sticky="w")
+        if not sys.platform.startswith('linux'):
+            idle_io_checkbox.configure(state="disabled")
+
+    def apply_bandwidth_limit(self):
+        """Apply the bandwidth limit entered in the Queue view (takes effect for running copies too)"""
+        text = self.bandwidth_limit_entry.get().strip() if hasattr(self, 'bandwidth_limit_entry') else ""
+        try:
+            mbps = float(text) if text else 0.0
+            if mbps < 0: raise ValueError
+        except ValueError:
+            messagebox.showerror("Input Error", "Please enter the limit in MB/s (0 or empty = unlimited).")
+            return
+        bandwidth_limiter.set_limit(int(mbps * 1024 * 1024))
+        self.update_status(f"带宽限制已设置为: {f'{mbps:g} MB/s' if mbps else '不限速'}")
+
+    def _get_queue_task_id(self):
+        try:
+            return int(self.queue_task_entry.get().strip())
+        except (ValueError, AttributeError, tk.TclError):
+            messagebox.showerror("Input Error", "Please enter a numeric task ID from the queue list.")
+            return None
+
+    def cancel_selected_task(self):
+        task_id = self._get_queue_task_id()
+        if task_id is not None and not self.scheduler.cancel(task_id):
+            messagebox.showwarning("Queue", f"Task {task_id} is not queued or running.")
+
+    def prioritize_selected_task(self):
+        task_id = self._get_queue_task_id()
+        if task_id is not None:
+            if self.scheduler.move_to_front(task_id):
+                if hasattr(self, 'queue_policy_menu') and self.queue_policy_menu.winfo_exists():
+                    self.queue_policy_menu.set(self.scheduler.policy)
+            else:
+                messagebox.showwarning("Queue", f"Task {task_id} is not waiting in the queue.")
+
+    def cancel_all_tasks(self):
+        if messagebox.askyesno("Confirm Action", "Cancel all queued and running moves?\n\nFiles being copied stay in the download folder.", icon=messagebox.WARNING):
+            self.scheduler.cancel_all()
+
+    def refresh_queue_view(self):
+        """Periodic refresh of the queue summary label and (if visible) the queue list"""
+        try:
+            snapshot = self.scheduler.snapshot()
+            self.queue_summary_label.configure(text=self.scheduler.format_summary(snapshot))
+            if hasattr(self, 'queue_textbox') and self.queue_textbox.winfo_exists():
+                lines = [f"{'ID':>5}  {'Status':<10} {'Progress':>20}  {'Prio':>4}  Name"]
+                for row in snapshot['running'] + snapshot['queued'] + snapshot['finished']:
+                    if row['instant']:
+                        progress = "rename"
+                    elif row['size']:
+                        progress = f"{format_size(row['bytes_done'])}/{format_size(row['size'])}"
+                    else:
+                        progress = "-"
+                    lines.append(f"{row['id']:>5}  {row['status']:<10} {progress:>20}  {row['priority']:>4}  {row['name']}")
+                self.queue_textbox.configure(state="normal")
+                self.queue_textbox.delete("1.0", tk.END)
+                self.queue_textbox.insert("1.0", "\n".join(lines))
+                self.queue_textbox.configure(state="disabled")
+        except tk.TclError as e:
+            print(f"Error refreshing queue view (maybe closed?): {e}")
+        self.after(QUEUE_REFRESH_MS, self.refresh_queue_view)
 
     def show_content_frame(self, mode):
         """Clears the content frame and builds the UI for the selected mode"""
+        if self.listing_stop_event: self.listing_stop_event.set()
         for widget in self.content_frame.winfo_children():
             widget.destroy()
         self.current_mode = mode
         self.html_mode_button.configure(fg_color=self.html_mode_button.cget("hover_color") if mode == "html" else "transparent")
         self.ai_mode_button.configure(fg_color=self.ai_mode_button.cget("hover_color") if mode == "ai" else "transparent")
+        self.dedupe_mode_button.configure(fg_color=self.dedupe_mode_button.cget("hover_color") if mode == "dedupe" else "transparent")
+        self.queue_mode_button.configure(fg_color=self.queue_mode_button.cget("hover_color") if mode == "queue" else "transparent")
         if mode == "html":
             self.build_html_mode_ui(self.content_frame)
         elif mode == "ai":
             self.build_ai_mode_ui(self.content_frame)
+        elif mode == "dedupe":
+            self.build_dedupe_mode_ui(self.content_frame)
+        elif mode == "queue":
+            self.build_queue_mode_ui(self.content_frame)
         else:
              ctk.CTkLabel(self.content_frame, text=f"Unknown mode: {mode}").pack()
         # Buttons are implicitly reset by being recreated
@@ -527,11 +3550,11 @@ class App(ctk.CTk):
         if dirpath:
             self.download_path_entry.delete(0, tk.END)
             self.download_path_entry.insert(0, dirpath)
-            # Clear filename listbox only if it currently exists
-            if self.current_mode == "ai" and hasattr(self, 'filename_list_textbox') and self.filename_list_textbox.winfo_exists():
-                 self.filename_list_textbox.configure(state="normal")
-                 self.filename_list_textbox.delete("1.0", tk.END)
-                 self.filename_list_textbox.configure(state="disabled")
+            # Clear file table only if it currently exists
+            if self.current_mode == "ai" and hasattr(self, 'file_table') and self.file_table.winfo_exists():
+                 if self.listing_stop_event: self.listing_stop_event.set()
+                 self.file_table.clear()
+                 self._update_file_count()
 
     def browse_comfyui_folder(self):
         initial_dir = self.comfyui_path_entry.get() if self.comfyui_path_entry.get() else None
@@ -541,32 +3564,66 @@ class App(ctk.CTk):
             self.comfyui_path_entry.insert(0, dirpath)
 
     def list_download_files(self):
-        if not hasattr(self, 'filename_list_textbox') or not self.filename_list_textbox.winfo_exists():
-             self.update_status("Error: Filename listbox not available in current view.")
+        if not hasattr(self, 'file_table') or not self.file_table.winfo_exists():
+             self.update_status("Error: File table not available in current view.")
              return
         download_path = self.download_path_entry.get().strip()
         if not download_path or not os.path.isdir(download_path):
              messagebox.showerror("Path Error", "Please select a valid Download Folder first.")
              return
+        comfyui_path = self.comfyui_path_entry.get().strip()
+        # 重新列出时停止上一次扫描
+        if self.listing_stop_event: self.listing_stop_event.set()
+        self.listing_stop_event = threading.Event()
+        self.file_table.clear()
+        self._update_file_count()
         self.update_status(f"Listing files in {download_path}...")
-        self.filename_list_textbox.configure(state="normal")
-        self.filename_list_textbox.delete("1.0", tk.END)
+        threading.Thread(target=self.run_listing_thread,
+                         args=(download_path, comfyui_path, self.file_table, self.listing_stop_event),
+                         daemon=True).start()
+
+    def run_listing_thread(self, download_path, comfyui_path, table, stop_event):
+        """Background scan for the file table: rows are appended batch by batch on the GUI thread"""
+        # 参考数据/分类器和 folder_paths 仅用于显示识别结果和目标文件夹, 失败时只显示文件名和大小
+        if load_reference_data(self.update_status):
+            get_reference_index()
+        if not comfyui_path or not os.path.isdir(comfyui_path):
+            comfyui_path = None
+        elif folder_paths is None:
+            initialize_folder_paths(comfyui_path, self.update_status, interactive=False)
+        file_count = 0
         try:
-            filenames = [f for f in os.listdir(download_path) if os.path.isfile(os.path.join(download_path, f))]
-            filenames.sort()
-            if filenames:
-                 self.filename_list_textbox.insert("1.0", "\n".join(filenames))
-                 self.update_status(f"Found {len(filenames)} files. List displayed below for copying.")
-                 self.after(10, lambda: messagebox.showinfo("Files Listed", f"Found {len(filenames)} files... You can copy the list..."))
-            else:
-                 self.filename_list_textbox.insert("1.0", "(No files found)")
-                 self.update_status("No files found in the download folder.")
-        except Exception as e:
-            self.filename_list_textbox.insert("1.0", f"Error listing files: {e}")
+            for batch in scan_download_folder(download_path, comfyui_path, stop_event=stop_event):
+                file_count += len(batch[0])
+                self.after(0, self._append_listing_batch, table, stop_event, batch)
+        except OSError as e:
             self.update_status(f"Error listing files: {e}")
             self.after(10, lambda e=e: messagebox.showerror("Listing Error", f"Could not list files:\n{e}"))
-        finally:
-            self.filename_list_textbox.configure(state="disabled")
+            return
+        if not stop_event.is_set():
+            self.update_status(f"Found {file_count} files." if file_count else "No files found in the download folder.")
+
+    def _append_listing_batch(self, table, stop_event, batch):
+        if stop_event.is_set() or not table.winfo_exists():
+            return
+        table.append_rows(*batch)
+        self._update_file_count()
+
+    def _update_file_count(self):
+        if hasattr(self, 'file_count_label') and self.file_count_label.winfo_exists():
+            shown, total = len(self.file_table.view), len(self.file_table.names)
+            self.file_count_label.configure(text=f"{shown} / {total} files" if shown != total else f"{total} files")
+
+    def apply_file_filter(self):
+        self.file_table.set_filter(self.file_filter_entry.get())
+        self._update_file_count()
+
+    def copy_listed_filenames(self):
+        """Copy the (filtered) filenames to the clipboard, e.g. for pasting into an AI prompt"""
+        names = self.file_table.visible_names()
+        self.clipboard_clear()
+        self.clipboard_append("\n".join(names))
+        self.update_status(f"Copied {len(names)} filenames to the clipboard.")
 
     # --- Processing Logic ---
     def start_processing(self, mode):
@@ -582,12 +3639,14 @@ class App(ctk.CTk):
         if not comfyui_path or not os.path.isdir(comfyui_path): messagebox.showerror("Path Error", "Please provide a valid ComfyUI Root Folder path."); return
         html_path = None
         ai_response_text = None
+        classify_unlisted = False
         if mode == "html":
             # Check widget exists before accessing .get()
             if not hasattr(self, 'html_path_entry') or not self.html_path_entry.winfo_exists():
                  messagebox.showerror("Internal Error", "HTML path entry widget not found."); return
             html_path = self.html_path_entry.get().strip()
             if not html_path or not os.path.isfile(html_path): messagebox.showerror("Path Error", "Mode 1 requires a valid HTML Metadata File path."); return
+            classify_unlisted = self.classify_unlisted_var.get()
         elif mode == "ai":
              if not hasattr(self, 'ai_response_textbox') or not self.ai_response_textbox.winfo_exists():
                  messagebox.showerror("Internal Error", "AI response textbox widget not found."); return
@@ -621,40 +3680,29 @@ class App(ctk.CTk):
         save_paths_to_config(self.config_path, current_paths)
 
         # --- Disable Buttons and Start Thread ---
-        self.status_textbox.configure(state="normal"); self.status_textbox.delete("1.0", tk.END); self.status_textbox.configure(state="disabled")
+        # 调度器中仍有任务时保留日志, 新任务会排入同一队列
+        snapshot = self.scheduler.snapshot()
+        if not snapshot['running'] and not snapshot['queued']:
+            self.status_textbox.configure(state="normal"); self.status_textbox.delete("1.0", tk.END); self.status_textbox.configure(state="disabled")
         self.update_status(f"User confirmed. Starting processing (Mode: {mode.upper()}, Overwrite: On)...")
         self._set_buttons_processing_state(True) # Disable relevant buttons
 
         self.processing_thread = threading.Thread(
             target=self.run_processing_thread,
-            args=(mode, download_path, comfyui_path, html_path, ai_response_text),
+            args=(mode, download_path, comfyui_path, html_path, ai_response_text, classify_unlisted),
             daemon=True )
         self.processing_thread.start()
 
-    def run_processing_thread(self, mode, download_path, comfyui_path, html_path, ai_response_text):
-        # (This function remains identical to the previous version - no changes needed here)
-        global folder_paths, reference_data
+    def run_processing_thread(self, mode, download_path, comfyui_path, html_path, ai_response_text, classify_unlisted=False):
         # --- 加载 JSON 参考数据 (如果尚未加载) ---
-        if reference_data is None:
-            ref_path = os.path.join(get_script_dir(), reference_data_path)
-            if not os.path.exists(ref_path):
-                self.update_status(f"错误: 参考 JSON 文件 '{reference_data_path}' 未在脚本目录中找到。")
-                self.after(0, lambda: messagebox.showerror("错误", f"参考文件 '{reference_data_path}' 未找到。请将其放在脚本同目录下。"))
-                self.after(0, self._set_buttons_processing_state, False)
-                return
-            try:
-                self.update_status(f"正在加载参考数据: {reference_data_path}...")
-                with open(ref_path, 'r', encoding='utf-8') as f_ref:
-                    reference_data = json.load(f_ref)
-                self.update_status("参考数据加载成功。")
-            except Exception as e_ref:
-                self.update_status(f"错误: 加载参考 JSON '{ref_path}' 失败: {e_ref}")
-                self.after(0, lambda e=e_ref: messagebox.showerror("JSON 加载错误", f"加载参考 JSON 失败:\n{e}"))
-                self.after(0, self._set_buttons_processing_state, False)
-                return
+        if not load_reference_data(self.update_status):
+            self.after(0, lambda: messagebox.showerror("错误", f"参考文件 '{reference_data_path}' 加载失败，详情见处理日志。请将其放在脚本同目录下。"))
+            self.after(0, self._set_buttons_processing_state, False)
+            return
         # --- JSON 数据加载结束 ---
         
-        moved_count = 0; skipped_count = 0; error_count = 0; overwritten_count = 0
+        skipped_count = 0 # 规划阶段跳过的文件; 移动结果由调度器任务汇总
+        tasks = []
         filename_to_process_map = {} # 存储: {源文件名: (目标关键字, 原始映射文件名)}
         try:
             self.update_status(f"--- 开始处理模式: {mode.upper()} ---")
@@ -671,26 +3719,8 @@ class App(ctk.CTk):
                     skipped_mapping_count = 0
 
                     for fname_from_html, ntype_from_html in filename_nodetype_map.items():
-                        target_key = None # 目标 ComfyUI 文件夹关键字 (如 'vae', 'checkpoints')
-
-                        # 步骤 1: 尝试使用 JSON reference_data 和 output_types 进行映射
-                        if ntype_from_html in reference_data:
-                            loader_info = reference_data[ntype_from_html]
-                            output_types = loader_info.get('output_types', [])
-                            for out_type in output_types:
-                                # 尝试在 output_type_to_folder_map 中查找 (统一转大写匹配)
-                                potential_key = output_type_to_folder_map.get(out_type.upper())
-                                if potential_key:
-                                    target_key = potential_key
-                                    # print(f"Debug: Found map via output_type: '{ntype_from_html}' -> '{out_type}' -> '{target_key}'") # 调试信息
-                                    break # 找到第一个匹配就用它
-
-                        # 步骤 2: 如果基于 output_types 没找到，尝试使用旧的 fallback 映射
-                        if target_key is None:
-                            # *** 使用正确的备选映射字典 (nodetype_to_folderkey) ***
-                            target_key = nodetype_to_folderkey.get(ntype_from_html)
-                            if target_key:
-                                self.update_status(f"  信息: 节点类型 '{ntype_from_html}' 使用备选映射 -> '{target_key}'.")
+                        # 步骤 1/2: 通过 output_types 或备选映射确定目标 ComfyUI 文件夹关键字 (如 'vae', 'checkpoints')
+                        target_key = resolve_folder_key_for_nodetype(ntype_from_html, self.update_status)
                         # 步骤 3: 如果仍然没有找到映射
                         if target_key is None:
                             self.update_status(f"  警告: 无法为节点类型 '{ntype_from_html}' 确定目标文件夹关键字。跳过文件 '{fname_from_html}'.")
@@ -703,11 +3733,27 @@ class App(ctk.CTk):
                         mapped_count += 1
 
                     self.update_status(f"完成映射: {mapped_count} 个条目成功映射, {skipped_mapping_count} 个条目因无法映射而被跳过。")
-                    if not filename_to_process_map:
-                        self.update_status("没有可处理的文件映射。")
-                        # 提前结束，避免后续扫描文件夹
-                        self.after(0, self._set_buttons_processing_state, False)
-                        return
+
+                # --- 备选阶段: HTML 中未列出的模型文件按参考数据/文件名分类器归类 ---
+                if classify_unlisted:
+                    # HTML 中的文件名可能带子文件夹 (如 SDXL/foo.safetensors), 下载文件夹中只有 basename
+                    listed_names = {os.path.basename(name.replace('\\', '/')).lower() for name in filename_nodetype_map}
+                    try:
+                        unlisted = sorted(f for f in os.listdir(download_path)
+                                          if f.lower() not in listed_names and is_likely_model_file(f)
+                                          and os.path.isfile(os.path.join(download_path, f)))
+                    except OSError as e:
+                        self.update_status(f"警告: 读取下载文件夹失败, 跳过未列出文件的分类: {e}")
+                        unlisted = []
+                    if unlisted:
+                        self.update_status(f"对 {len(unlisted)} 个 HTML 中未列出的文件进行分类...")
+                        fallback_map = classify_unlisted_files(unlisted, self.update_status)
+                        filename_to_process_map.update(fallback_map)
+                        self.update_status(f"分类完成: {len(fallback_map)} 个文件已归类, {len(unlisted) - len(fallback_map)} 个文件未归类。")
+
+                # 映射为空时不提前结束: 压缩包按参考数据分类, 不依赖 HTML 映射
+                if not filename_to_process_map:
+                    self.update_status("没有可处理的文件映射, 仍会检查下载文件夹中的压缩包。")
 
             # --- AI 模式逻辑 (按计划移除或保留旧逻辑) ---
             elif mode == "ai":
@@ -737,8 +3783,35 @@ class App(ctk.CTk):
                 files_actually_found_in_download = set(f for f in all_items_in_download if os.path.isfile(os.path.join(download_path, f)))
                 processed_files_counter = 0
 
+                # --- 目录模型 (diffusers 等多文件模型): 整个目录作为一个单元移动 ---
+                moved_directory_names = set()
+                for dir_name, target_key, rel_dir in find_model_directories(download_path, filename_to_process_map):
+                    source_dir = os.path.join(download_path, dir_name)
+                    # 目标文件夹在计划时确定, 排队期间 folder_paths 的变化不会影响已排队的任务
+                    target_folder = get_destination_folder(target_key, comfyui_path, self.update_status)
+                    if not target_folder:
+                        self.update_status(f"  -> 跳过目录 '{dir_name}': 无法为关键字 '{target_key}' 确定或创建目标文件夹。")
+                        skipped_count += 1
+                        continue
+                    try:
+                        tasks.append(self.scheduler.submit(
+                            dir_name + os.sep, move_matched_directory,
+                            (source_dir, target_key, rel_dir, target_folder, self.update_status),
+                            size=get_directory_size(source_dir),
+                            instant=is_same_device(source_dir, target_folder),
+                            paths=(source_dir, os.path.join(target_folder, *rel_dir.split('/')))))
+                    except MoveConflict as e:
+                        self.update_status(f"  -> 跳过目录 '{dir_name}': 已在队列中 ({e})。")
+                        skipped_count += 1
+                    # 已在队列中的目录同样不再逐个文件处理
+                    moved_directory_names.add(dir_name.lower())
+
                 for filename_to_move, (target_key, original_mapped_filename) in filename_to_process_map.items():
                      processed_files_counter += 1
+                     # 已随目录一起移动的文件不再单独处理
+                     path_parts = filename_to_move.replace('\\', '/').split('/')
+                     if any(part.lower() in moved_directory_names for part in path_parts[:-1]):
+                         continue
                      self.update_status(f"[{processed_files_counter}/{len(filename_to_process_map)}] 检查: {filename_to_move}")
 
                      # --- 过滤非模型文件 ---
@@ -766,45 +3839,22 @@ class App(ctk.CTk):
                              skipped_count += 1
                              continue # 跳到下一个文件
 
-                     # 获取目标文件夹
+                     # 交给调度器: 同设备重命名最先执行, 然后按策略 (默认小文件优先)
                      target_folder = get_destination_folder(target_key, comfyui_path, self.update_status)
-
-                     if target_folder:
-                         # 构建目标路径，保留原始映射文件名中的子目录结构
-                         dest_filename = os.path.basename(original_mapped_filename) # 用映射源的文件名部分
-                         sub_dirs = os.path.dirname(original_mapped_filename)     # 用映射源的子目录部分
-                         final_target_folder = os.path.join(target_folder, sub_dirs) if sub_dirs else target_folder
-                         destination_path = os.path.join(final_target_folder, dest_filename)
-
-                         self.update_status(f"  -> 目标类型 '{target_key}'")
-                         try:
-                             # 确保目标目录存在
-                             os.makedirs(final_target_folder, exist_ok=True)
-
-                             target_exists = os.path.exists(destination_path)
-                             # 构建相对路径用于日志显示
-                             log_dest_path = os.path.join(os.path.basename(target_folder), sub_dirs, dest_filename) if sub_dirs else os.path.join(os.path.basename(target_folder), dest_filename)
-
-                             if target_exists:
-                                 self.update_status(f"  -> 移动 (覆盖!) 到: ...{os.sep}{log_dest_path}")
-                             else:
-                                 self.update_status(f"  -> 移动到: ...{os.sep}{log_dest_path}")
-
-                             shutil.move(source_path, destination_path)
-
-                             if target_exists:
-                                 self.update_status(f"  -> 覆盖成功!")
-                                 overwritten_count += 1
-                             else:
-                                  self.update_status(f"  -> 移动成功!")
-                             moved_count += 1
-
-                         except Exception as move_e:
-                             self.update_status(f"  -> 错误: 移动文件 {filename_to_move} 时出错: {move_e}")
-                             error_count += 1
-                     else:
+                     if not target_folder:
                          self.update_status(f"  -> 跳过: 无法为关键字 '{target_key}' 确定或创建目标文件夹。")
                          skipped_count += 1
+                         continue
+                     try:
+                         tasks.append(self.scheduler.submit(
+                             os.path.basename(source_path), move_model_file,
+                             (source_path, target_key, original_mapped_filename, target_folder, self.update_status),
+                             size=os.path.getsize(source_path),
+                             instant=is_same_device(source_path, target_folder),
+                             paths=(source_path, model_file_destination(target_folder, original_mapped_filename))))
+                     except MoveConflict as e:
+                         self.update_status(f"  -> 跳过: 已在队列中 ({e})。")
+                         skipped_count += 1
 
                 # 统计在 map 中但从未在下载文件夹中找到的文件 (可选，可能意义不大，因为上面已经处理了)
                 # map_files_processed_or_skipped = set(filename_to_process_map.keys())
@@ -812,14 +3862,26 @@ class App(ctk.CTk):
                 # if files_in_map_never_found:
                 #    self.update_status(f"Info: {len(files_in_map_never_found)} files from map were never found in download folder.")
 
-            # --- 最终总结 ---
-            self.update_status("-" * 30)
-            self.update_status("处理完成!")
-            self.update_status(f"已移动: {moved_count} 文件")
-            if overwritten_count > 0:
-                self.update_status(f"(其中 {overwritten_count} 个文件被覆盖)")
-            self.update_status(f"已跳过 (映射/目标路径/非模型/未找到): {skipped_count} 文件")
-            self.update_status(f"移动时出错: {error_count} 文件")
+            # --- 压缩包: 直接流式解压到目标文件夹 ---
+            archives = find_archives(download_path)
+            if archives:
+                self.update_status(f"发现 {len(archives)} 个压缩包, 将直接解压模型文件到目标文件夹。")
+            archive_destinations = resolve_archive_destinations(filename_to_process_map, comfyui_path) if archives else {}
+            for archive_name in archives:
+                archive_path = os.path.join(download_path, archive_name)
+                try:
+                    tasks.append(self.scheduler.submit(
+                        archive_name, ingest_archive,
+                        (archive_path, filename_to_process_map, archive_destinations, self.update_status),
+                        size=os.path.getsize(archive_path),
+                        paths=(archive_path,)))
+                except MoveConflict as e:
+                    self.update_status(f"  -> 跳过压缩包 '{archive_name}': 已在队列中 ({e})。")
+                    skipped_count += 1
+
+            # --- 最终总结在所有任务完成后输出, 按钮现在即可重新启用 ---
+            self.update_status(f"已加入队列: {len(tasks)} 个任务。可在 Queue 视图中暂停、取消或调整顺序。")
+            threading.Thread(target=self._report_when_done, args=(tasks, skipped_count), daemon=True).start()
 
         except Exception as e:
             self.update_status(f"严重错误: 处理过程中发生意外: {e}")
@@ -829,6 +3891,111 @@ class App(ctk.CTk):
         finally:
             self.after(0, self._set_buttons_processing_state, False) # 重新启用按钮
 
+    def _report_when_done(self, tasks, skipped_count):
+        """Wait for a batch of scheduler tasks and write the final summary"""
+        totals = {'moved': 0, 'overwritten': 0, 'skipped': skipped_count, 'errors': 0}
+        cancelled_count = 0
+        start_time = time.time()
+        throttled_before = bandwidth_limiter.stats()['throttled_seconds']
+        for task in tasks:
+            result = task.wait()
+            if result == 'cancelled':
+                cancelled_count += 1
+                continue
+            if task.error:
+                self.update_status(f"  -> 错误: 任务 '{task.name}' 失败: {task.error}")
+            for key, value in result_counts(result).items():
+                totals[key] += value
+
+        # --- 最终总结 ---
+        self.update_status("-" * 30)
+        self.update_status("处理完成!")
+        self.update_status(f"已移动: {totals['moved']} 文件")
+        if totals['overwritten'] > 0:
+            self.update_status(f"(其中 {totals['overwritten']} 个文件被覆盖)")
+        self.update_status(f"已跳过 (映射/目标路径/非模型/未找到): {totals['skipped']} 文件")
+        if cancelled_count > 0:
+            self.update_status(f"已取消: {cancelled_count} 个任务")
+        self.update_status(f"移动时出错: {totals['errors']} 文件")
+        throttle = bandwidth_limiter.stats()
+        if throttle['limit'] or throttle['device_limits']:
+            throttled = throttle['throttled_seconds'] - throttled_before
+            self.update_status(f"带宽限制: {bandwidth_limiter.describe()}, 因限速等待 {throttled:.1f} 秒 (总用时 {time.time() - start_time:.1f} 秒)")
+
+    def start_dedupe(self):
+        if self.processing_thread and self.processing_thread.is_alive():
+            messagebox.showwarning("Processing", "Already processing files. Please wait.")
+            return
+        comfyui_path = self.comfyui_path_entry.get().strip()
+        if not comfyui_path or not os.path.isdir(comfyui_path): messagebox.showerror("Path Error", "Please provide a valid ComfyUI Root Folder path."); return
+        hardlink = bool(self.dedupe_hardlink_var.get()) if hasattr(self, 'dedupe_hardlink_var') else False
+        if hardlink:
+            confirm = messagebox.askyesno(
+                title="Confirm Action",
+                message="Duplicate model files will be REPLACED with hardlinks to a single copy.\n\n"
+                        "Editing one of the linked files in place will change all of them.\n\n"
+                        "Continue?",
+                icon=messagebox.WARNING )
+            if not confirm: self.update_status("Operation cancelled by user."); return
+
+        self.status_textbox.configure(state="normal"); self.status_textbox.delete("1.0", tk.END); self.status_textbox.configure(state="disabled")
+        self.update_status(f"Starting duplicate scan (Hardlink: {'On' if hardlink else 'Off'})...")
+        self._set_buttons_processing_state(True)
+        self.processing_thread = threading.Thread(
+            target=self.run_dedupe_thread,
+            args=(comfyui_path, hardlink),
+            daemon=True )
+        self.processing_thread.start()
+
+    def run_dedupe_thread(self, comfyui_path, hardlink):
+        try:
+            # folder_paths 可选: 加载失败时只扫描 ComfyUI/models
+            if folder_paths is None:
+                initialize_folder_paths(comfyui_path, self.update_status)
+            start_time = time.time()
+            report = find_duplicate_models(comfyui_path, self.update_status)
+            if report is None:
+                return
+            report_duplicate_groups(report, self.update_status)
+            if hardlink and report['groups']:
+                self.update_status("-" * 30)
+                self.update_status("开始用硬链接替换重复文件...")
+                linked_count, reclaimed_bytes = hardlink_duplicates(report['groups'], self.update_status)
+                self.update_status(f"已硬链接 {linked_count} 个文件, 回收空间 {format_size(reclaimed_bytes)}")
+            self.update_status(f"去重扫描完成, 用时 {time.time() - start_time:.1f} 秒。")
+        except Exception as e:
+            self.update_status(f"严重错误: 去重过程中发生意外: {e}")
+            import traceback
+            self.update_status(traceback.format_exc())
+            self.after(0, lambda e=e: messagebox.showerror("处理错误", f"发生错误:\n{e}"))
+        finally:
+            self.after(0, self._set_buttons_processing_state, False)
+
+    def start_node_scan(self):
+        if self.processing_thread and self.processing_thread.is_alive():
+            messagebox.showwarning("Processing", "Already processing files. Please wait.")
+            return
+        comfyui_path = self.comfyui_path_entry.get().strip()
+        if not comfyui_path or not os.path.isdir(comfyui_path): messagebox.showerror("Path Error", "Please provide a valid ComfyUI Root Folder path."); return
+        self.update_status(f"Scanning ComfyUI nodes in {comfyui_path} to update '{reference_data_path}'...")
+        self._set_buttons_processing_state(True)
+        self.processing_thread = threading.Thread(target=self.run_node_scan_thread, args=(comfyui_path,), daemon=True)
+        self.processing_thread.start()
+
+    def run_node_scan_thread(self, comfyui_path):
+        try:
+            if folder_paths is None:
+                try_initialize_folder_paths(comfyui_path, self.update_status)
+            if generate_reference_data(comfyui_path, self.update_status) is None:
+                self.after(0, lambda: messagebox.showerror("错误", "更新参考数据失败，详情见处理日志。"))
+        except Exception as e:
+            self.update_status(f"严重错误: 节点扫描过程中发生意外: {e}")
+            import traceback
+            self.update_status(traceback.format_exc())
+            self.after(0, lambda e=e: messagebox.showerror("处理错误", f"发生错误:\n{e}"))
+        finally:
+            self.after(0, self._set_buttons_processing_state, False)
+
     def _set_buttons_processing_state(self, is_processing):
         """Enable/disable buttons based on processing state, checking existence and validity"""
         new_state = "disabled" if is_processing else "normal"
@@ -842,13 +4009,159 @@ class App(ctk.CTk):
                  self.process_button_ai.configure(state=new_state, text=ai_text)
             if hasattr(self, 'list_files_button') and self.list_files_button.winfo_exists():
                  self.list_files_button.configure(state=new_state)
+            if hasattr(self, 'process_button_dedupe') and self.process_button_dedupe.winfo_exists():
+                 self.process_button_dedupe.configure(state=new_state, text="Processing..." if is_processing else "Scan for Duplicates")
+            if hasattr(self, 'scan_nodes_button') and self.scan_nodes_button.winfo_exists():
+                 self.scan_nodes_button.configure(state=new_state)
         except Exception as e: # Catch broader exceptions during configure
              # Log error instead of crashing if configure fails for unexpected reason
              print(f"Error configuring button state: {e}")
 
 
+# --- Command Line Interface ---
+def run_cli(argv):
+    """Run a command line subcommand (no GUI). Returns the process exit code."""
+    parser = argparse.ArgumentParser(prog="main.py", description="ComfyUI Model Mover command line tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    dedupe_parser = subparsers.add_parser("dedupe", help="Find duplicate model files across ComfyUI model folders")
+    dedupe_parser.add_argument("comfyui", help="ComfyUI root folder")
+    dedupe_parser.add_argument("--hardlink", action="store_true", help="Replace duplicates with hardlinks to one copy")
+    dedupe_parser.add_argument("--workers", type=int, default=DEDUPE_MAX_WORKERS, help="Hashing thread pool size")
+
+    serve_parser = subparsers.add_parser("serve", help="Run the local job API that accepts move jobs from download managers")
+    serve_parser.add_argument("--comfyui", help="Default ComfyUI root folder for jobs that don't specify one")
+    serve_parser.add_argument("--allow-comfyui", action="append", metavar="PATH", help="Additional ComfyUI root that jobs may select with 'comfyui' (repeatable)")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Listen address (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=JOB_API_PORT, help=f"Listen port (default: {JOB_API_PORT})")
+    if hasattr(socket, 'AF_UNIX'):
+        serve_parser.add_argument("--socket", help="Listen on this Unix socket path instead of TCP")
+    serve_parser.add_argument("--limit-mbps", type=float, default=0, help="Bandwidth limit per destination device in MB/s (0 = unlimited)")
+    serve_parser.add_argument("--device-limit", action="append", metavar="PATH=MBPS", help="Limit for the device holding PATH (repeatable)")
+    serve_parser.add_argument("--idle-io", action="store_true", help="Use idle-class I/O priority for moves (Linux)")
+
+    throttle_parser = subparsers.add_parser("throttle", help="Show or change the bandwidth limit of a running job API")
+    throttle_parser.add_argument("--limit-mbps", type=float, help="Bandwidth limit per destination device in MB/s (0 = unlimited)")
+    throttle_parser.add_argument("--device-limit", action="append", metavar="PATH=MBPS", help="Limit for the device holding PATH (repeatable, 0 removes it)")
+    throttle_parser.add_argument("--idle-io", dest="idle_io", action="store_true", default=None, help="Switch to idle-class I/O priority (Linux)")
+    throttle_parser.add_argument("--normal-io", dest="idle_io", action="store_false", help="Switch back to normal I/O priority")
+    throttle_parser.add_argument("--host", default="127.0.0.1", help="Job API address (default: 127.0.0.1)")
+    throttle_parser.add_argument("--port", type=int, default=JOB_API_PORT, help=f"Job API port (default: {JOB_API_PORT})")
+    if hasattr(socket, 'AF_UNIX'):
+        throttle_parser.add_argument("--socket", help="Job API Unix socket path")
+
+    submit_parser = subparsers.add_parser("submit", help="Submit a move job to a running job API (retries while it is busy)")
+    submit_parser.add_argument("files", nargs="+", help="Downloaded model files to move")
+    submit_parser.add_argument("--folder-key", help="Target folder key (e.g. loras)")
+    submit_parser.add_argument("--html", help="HTML metadata file used to find the folder keys")
+    submit_parser.add_argument("--priority", type=int, default=0, help="Job priority (higher runs first)")
+    submit_parser.add_argument("--host", default="127.0.0.1", help="Job API address (default: 127.0.0.1)")
+    submit_parser.add_argument("--port", type=int, default=JOB_API_PORT, help=f"Job API port (default: {JOB_API_PORT})")
+    if hasattr(socket, 'AF_UNIX'):
+        submit_parser.add_argument("--socket", help="Job API Unix socket path")
+
+    classify_parser = subparsers.add_parser("classify", help="Predict the ComfyUI folder for model filenames")
+    classify_parser.add_argument("filenames", nargs="+", help="Model filenames (or paths) to classify")
+    classify_parser.add_argument("--min-confidence", type=float, default=None,
+                                 help="Confidence threshold for accepting a prediction (default: the per-class calibrated threshold; classes without one are never accepted)")
+
+    scan_parser = subparsers.add_parser("scan-nodes", help="Regenerate the reference data by statically scanning ComfyUI's nodes and custom_nodes")
+    scan_parser.add_argument("comfyui", help="ComfyUI root folder")
+    scan_parser.add_argument("--output", help=f"Reference JSON to update (default: {reference_data_path} next to main.py)")
+    scan_parser.add_argument("--workers", type=int, default=None, help="Parser process pool size (default: CPU count)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "dedupe":
+        if not os.path.isdir(args.comfyui):
+            print(f"Error: ComfyUI path '{args.comfyui}' is not a valid directory.")
+            return 1
+        initialize_folder_paths(args.comfyui, print, interactive=False)
+        report = find_duplicate_models(args.comfyui, print, max_workers=args.workers)
+        if report is None:
+            return 1
+        report_duplicate_groups(report, print)
+        if args.hardlink and report['groups']:
+            linked_count, reclaimed_bytes = hardlink_duplicates(report['groups'], print)
+            print(f"Hardlinked {linked_count} files, reclaimed {format_size(reclaimed_bytes)}")
+    elif args.command == "serve":
+        if args.comfyui and not os.path.isdir(args.comfyui):
+            print(f"Error: ComfyUI path '{args.comfyui}' is not a valid directory.")
+            return 1
+        try:
+            apply_throttle_settings({'limit_mbps': args.limit_mbps,
+                                     'device_limits': parse_device_limits(args.device_limit),
+                                     'idle_io': args.idle_io})
+        except (ValueError, OSError) as e:
+            print(f"Error: {e}")
+            return 1
+        for allowed_path in args.allow_comfyui or []:
+            if not os.path.isdir(allowed_path):
+                print(f"Error: ComfyUI path '{allowed_path}' is not a valid directory.")
+                return 1
+        serve_job_api(args.comfyui, host=args.host, port=args.port, socket_path=getattr(args, 'socket', None),
+                      allowed_comfyui=args.allow_comfyui)
+    elif args.command == "throttle":
+        try:
+            settings = {'limit_mbps': args.limit_mbps, 'device_limits': parse_device_limits(args.device_limit), 'idle_io': args.idle_io}
+            changed = any(v not in (None, {}) for v in settings.values())
+            status, result = call_job_api("POST" if changed else "GET", "/throttle", settings if changed else None,
+                                          host=args.host, port=args.port, socket_path=getattr(args, 'socket', None))
+        except (ValueError, OSError) as e:
+            print(f"Error: {e}")
+            return 1
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return 0 if status == 200 else 1
+    elif args.command == "submit":
+        payload = {'files': [os.path.abspath(f) for f in args.files], 'priority': args.priority}
+        if args.folder_key:
+            payload['folder_key'] = args.folder_key
+        if args.html:
+            payload['html'] = os.path.abspath(args.html)
+        try:
+            status, result = call_job_api("POST", "/jobs", payload, host=args.host, port=args.port,
+                                          socket_path=getattr(args, 'socket', None))
+        except OSError as e:
+            print(f"Error: {e}")
+            return 1
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return 0 if status in (200, 201, 202) else 1
+    elif args.command == "scan-nodes":
+        if not os.path.isdir(args.comfyui):
+            print(f"Error: ComfyUI path '{args.comfyui}' is not a valid directory.")
+            return 1
+        # folder_paths 只用于列出模型文件; 加载失败时仍可生成 output_types/folder_keys
+        try_initialize_folder_paths(args.comfyui, print)
+        if generate_reference_data(args.comfyui, print, output_path=args.output, max_workers=args.workers) is None:
+            return 1
+    elif args.command == "classify":
+        if np is None:
+            print("Error: the filename classifier requires numpy (pip install numpy).")
+            return 1
+        if not load_reference_data(print):
+            return 1
+        index = get_reference_index()
+        if filename_classifier is None:
+            print("Error: not enough reference data to train the filename classifier.")
+            return 1
+        names = [os.path.basename(f) for f in args.filenames]
+        for name, (target_key, confidence) in zip(names, filename_classifier.predict(names)):
+            match = index.get(name.lower())
+            if match:
+                print(f"{name} -> {match[0]} (reference data)")
+            elif target_key is None:
+                print(f"{name} -> ? (unfamiliar name, a folder the classifier was not trained on, or a prediction the name contradicts)")
+            else:
+                verdict = "" if filename_classifier.accepts(target_key, confidence, args.min_confidence) else " [not accepted]"
+                print(f"{name} -> {target_key} ({confidence:.2f}){verdict}")
+    return 0
+
+
 # --- Program Entry Point ---
 if __name__ == "__main__":
+    # 必须最先调用: 打包成可执行文件 (PyInstaller 等) 后, 节点扫描的 ProcessPoolExecutor 子进程
+    # 会重新运行本文件, freeze_support() 让子进程直接进入工作循环, 而不是再启动一个 GUI
+    multiprocessing.freeze_support()
     # Dependency check
     try:
         import customtkinter
@@ -863,6 +4176,10 @@ if __name__ == "__main__":
         sys.exit(1)
     # 考虑到JSON可能也比较大，放在线程里按需加载更好。
 
+    # 带参数运行时进入命令行模式 (例如: python main.py dedupe <ComfyUI根目录>)
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+
     app = App()
     app.protocol("WM_DELETE_WINDOW", app.destroy) # Graceful exit
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,168 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+import main
+
+REFERENCE_INDEX = {
+    'diffusion_pytorch_model.safetensors': ('checkpoints', 'diffusion_pytorch_model.safetensors'),
+    'model.safetensors': ('clip', 'model.safetensors'),
+    'sd-vae-ft-mse/diffusion_pytorch_model.safetensors': ('vae', 'sd-vae-ft-mse/diffusion_pytorch_model.safetensors'),
+    'ae.safetensors': ('vae', 'ae.safetensors'),
+}
+
+
+@pytest.fixture(autouse=True)
+def script_dir(tmp_path, monkeypatch):
+    script_dir = tmp_path / "script"
+    script_dir.mkdir()
+    monkeypatch.setattr(main, 'get_script_dir', lambda: str(script_dir))
+    return script_dir
+
+
+@pytest.fixture
+def reference_index(monkeypatch):
+    monkeypatch.setattr(main, 'get_reference_index', lambda: REFERENCE_INDEX)
+    return REFERENCE_INDEX
+
+
+@pytest.fixture
+def destinations(tmp_path):
+    return {key: str(tmp_path / "models" / key) for key in ('checkpoints', 'clip', 'vae', 'loras')}
+
+
+def _messages():
+    messages = []
+    return messages, messages.append
+
+
+@pytest.mark.parametrize("name", ["diffusion_pytorch_model.safetensors", "model.fp16.safetensors",
+                                  "model-00001-of-00002.safetensors", "pytorch_model.bin"])
+def test_generic_model_filenames(name):
+    assert main.is_generic_model_filename(name)
+    assert main.is_generic_model_filename("pack/unet/" + name)
+
+
+def test_specific_model_filename_is_not_generic():
+    assert not main.is_generic_model_filename("sd_xl_base_1.0.safetensors")
+
+
+def test_nested_generic_member_does_not_match_bare_reference_entry():
+    assert main.classify_archive_member("sdx/unet/diffusion_pytorch_model.safetensors", {}, REFERENCE_INDEX) is None
+    assert main.classify_archive_member("sdx/text_encoder/model.safetensors", {}, REFERENCE_INDEX) is None
+
+
+def test_nested_generic_member_matches_path_suffix_and_keeps_directories():
+    match = main.classify_archive_member("pack/sd-vae-ft-mse/diffusion_pytorch_model.safetensors", {}, REFERENCE_INDEX)
+    assert match == ('vae', 'sd-vae-ft-mse/diffusion_pytorch_model.safetensors')
+
+
+def test_top_level_and_specific_members_still_match_by_name():
+    assert main.classify_archive_member("diffusion_pytorch_model.safetensors", {}, REFERENCE_INDEX)[0] == 'checkpoints'
+    assert main.classify_archive_member("pack/ae.safetensors", {}, REFERENCE_INDEX) == ('vae', 'ae.safetensors')
+
+
+def test_diffusers_zip_is_not_flattened(tmp_path, reference_index, destinations):
+    archive = str(tmp_path / "sdx.zip")
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr("sdx/unet/diffusion_pytorch_model.safetensors", b"unet")
+        zf.writestr("sdx/vae/diffusion_pytorch_model.safetensors", b"vae")
+        zf.writestr("sdx/text_encoder/model.safetensors", b"te")
+    messages, log = _messages()
+    counts = main.ingest_archive(archive, {}, destinations, log)
+    assert counts == {'moved': 0, 'overwritten': 0, 'skipped': 3, 'errors': 0}
+    assert not os.path.exists(tmp_path / "models")
+
+
+def test_zip_members_with_same_destination_are_refused(tmp_path, reference_index, destinations):
+    archive = str(tmp_path / "two.zip")
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr("a/my_lora.safetensors", b"a")
+        zf.writestr("b/my_lora.safetensors", b"b")
+        zf.writestr("ae.safetensors", b"vae")
+    mapping = {'my_lora.safetensors': ('loras', 'my_lora.safetensors')}
+    messages, log = _messages()
+    counts = main.ingest_archive(archive, mapping, destinations, log)
+    assert counts['errors'] == 2 and counts['moved'] == 1
+    assert not os.path.exists(os.path.join(destinations['loras'], "my_lora.safetensors"))
+    with open(os.path.join(destinations['vae'], "ae.safetensors"), 'rb') as f:
+        assert f.read() == b"vae"
+
+
+def test_tar_member_with_taken_destination_is_refused(tmp_path, reference_index, destinations):
+    archive = str(tmp_path / "two.tar.gz")
+    with tarfile.open(archive, 'w:gz') as tf:
+        for name, data in (("a/my_lora.safetensors", b"first"), ("b/my_lora.safetensors", b"second")):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    mapping = {'my_lora.safetensors': ('loras', 'my_lora.safetensors')}
+    messages, log = _messages()
+    counts = main.ingest_archive(archive, mapping, destinations, log)
+    assert counts['errors'] == 1 and counts['moved'] == 1
+    with open(os.path.join(destinations['loras'], "my_lora.safetensors"), 'rb') as f:
+        assert f.read() == b"first"
+
+
+def test_unsafe_and_symlink_members_are_not_extracted(tmp_path, reference_index, destinations):
+    archive = str(tmp_path / "bad.tar")
+    with tarfile.open(archive, 'w') as tf:
+        info = tarfile.TarInfo("../ae.safetensors")
+        info.size = 1
+        tf.addfile(info, io.BytesIO(b"x"))
+        link = tarfile.TarInfo("ae.safetensors")
+        link.type = tarfile.SYMTYPE
+        link.linkname = "/etc/passwd"
+        tf.addfile(link)
+    messages, log = _messages()
+    counts = main.ingest_archive(archive, {}, destinations, log)
+    assert counts == {'moved': 0, 'overwritten': 0, 'skipped': 1, 'errors': 0}
+    assert not os.path.exists(destinations['vae'])
+
+
+def test_fully_ingested_archive_is_removed(tmp_path, reference_index, destinations):
+    download = tmp_path / "download"
+    download.mkdir()
+    archive = str(download / "vae.zip")
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr("pack/ae.safetensors", b"vae")
+    messages, log = _messages()
+    counts = main.ingest_archive(archive, {}, destinations, log)
+    assert counts['moved'] == 1
+    assert not os.path.exists(archive)
+    assert main.find_archives(str(download)) == []
+
+
+def test_partly_ingested_archive_is_kept_and_skipped_later(tmp_path, reference_index, destinations):
+    download = tmp_path / "download"
+    download.mkdir()
+    archive = str(download / "vae.zip")
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr("pack/ae.safetensors", b"vae")
+        zf.writestr("pack/README.txt", b"notes")
+    assert main.find_archives(str(download)) == ["vae.zip"]
+    messages, log = _messages()
+    assert main.ingest_archive(archive, {}, destinations, log)['moved'] == 1
+    assert os.path.exists(archive)
+    assert main.find_archives(str(download)) == []
+    # 压缩包被替换 (大小/修改时间变化) 后重新导入
+    with zipfile.ZipFile(archive, 'a') as zf:
+        zf.writestr("pack/other.txt", b"more")
+    assert main.find_archives(str(download)) == ["vae.zip"]
+
+
+def test_archive_with_errors_is_kept_for_retry(tmp_path, reference_index, destinations):
+    download = tmp_path / "download"
+    download.mkdir()
+    archive = str(download / "two.zip")
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr("a/my_lora.safetensors", b"a")
+        zf.writestr("b/my_lora.safetensors", b"b")
+        zf.writestr("ae.safetensors", b"vae")
+    mapping = {'my_lora.safetensors': ('loras', 'my_lora.safetensors')}
+    messages, log = _messages()
+    main.ingest_archive(archive, mapping, destinations, log)
+    assert main.find_archives(str(download)) == ["two.zip"]
@@ -0,0 +1,112 @@
+import json
+import os
+
+import pytest
+
+import main
+
+np = pytest.importorskip("numpy")
+
+
+def _words(filename):
+    return [f[2:] for f in main.tokenize_model_filename(filename) if f.startswith("w:")]
+
+
+def test_tokenize_model_filename():
+    features = main.tokenize_model_filename("SDXL_vae-fp16.safetensors")
+    assert "ext:safetensors" in features
+    assert {"w:sdxl", "w:vae", "w:fp16"} <= set(features)
+    assert "b:sdxl_vae" in features
+    assert "c:#sd" in features
+
+
+@pytest.mark.parametrize("filename, key", [
+    ("ip-adapter_sdxl.safetensors", 'ipadapter'),
+    ("ip-adapter-plus_sdxl_vit-h.safetensors", 'ipadapter'),
+    ("ip-adapter-faceid_sdxl.bin", 'ipadapter'),
+    ("IPAdapter_sd15.bin", 'ipadapter'),
+    ("sd_xl_base_1.0.safetensors", 'checkpoints'),
+    ("sdxl-refiner-1.0.safetensors", 'checkpoints'),
+    ("flux1-dev.safetensors", 'unet'),
+    ("add_detail_lora.safetensors", 'loras'),
+    ("control-lora-canny-rank256.safetensors", None),
+    ("flux1-dev-controlnet-union.safetensors", None),
+    ("sdxl_vae.safetensors", None),
+    ("lora_unet_merge.safetensors", ''),
+])
+def test_hinted_key(filename, key):
+    assert main.FilenameClassifier.hinted_key(_words(filename)) == key
+
+
+LABELLED = ([(f"control_v11p_sd15_{name}.pth", 'controlnet') for name in
+             ("canny", "depth", "openpose", "lineart", "scribble", "seg", "normalbae", "mlsd", "softedge", "inpaint")] * 3
+            + [(f"{name}_v{i}.safetensors", 'checkpoints') for i in range(3) for name in
+               ("dreamshaper", "realisticvision", "juggernaut", "deliberate", "revanimated", "epicrealism", "absolutereality", "majicmix")]
+            + [("vae_ft_mse.safetensors", 'vae'), ("sdxl_vae.safetensors", 'vae')])
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    labelled = sorted(LABELLED)
+    model = main.FilenameClassifier.train(labelled)
+    model.thresholds = {'controlnet': 0.9, 'checkpoints': 0.9, 'vae': float('inf')}
+    return model
+
+
+def test_untrained_hinted_class_is_refused(classifier):
+    assert classifier.predict(["ip-adapter_sd15_canny.pth"]) == [(None, 0.0)]
+
+
+def test_prediction_contradicting_hint_is_refused(classifier):
+    # 'v11p_sd15' 的特征像 controlnet, 但 sd_xl_base 表示 checkpoint
+    assert classifier.predict(["control_v11p_sd15_canny.pth"])[0][0] == 'controlnet'
+    assert classifier.predict(["v11p_sd15_seg_sdxl_base.pth"]) == [(None, 0.0)]
+
+
+def test_accepts_uses_per_class_thresholds(classifier):
+    assert classifier.accepts('controlnet', 0.95)
+    assert not classifier.accepts('controlnet', 0.85)
+    assert not classifier.accepts('vae', 1.0) # 没有校准阈值的类别从不采用
+    assert not classifier.accepts('vae', 1.0, min_confidence=0.5)
+    assert classifier.accepts('controlnet', 0.6, min_confidence=0.5)
+    assert not classifier.accepts(None, 1.0)
+    assert not classifier.accepts('loras', 1.0)
+
+
+def test_calibration_never_accepts_low_support_classes():
+    thresholds = main.FilenameClassifier.calibrate_thresholds(sorted(LABELLED))
+    assert thresholds['vae'] == float('inf')
+    assert thresholds['controlnet'] <= 1
+
+
+def test_save_and_load_keep_thresholds(classifier, tmp_path):
+    path = str(tmp_path / "model.classifier.npz")
+    classifier.save(path, [1, 2])
+    loaded = main.FilenameClassifier.load(path, [1, 2])
+    assert loaded.thresholds == classifier.thresholds
+    assert loaded.predict(["control_v11p_sd15_depth.pth"]) == classifier.predict(["control_v11p_sd15_depth.pth"])
+    assert main.FilenameClassifier.load(path, [1, 3]) is None
+
+
+@pytest.fixture(scope="module")
+def reference_classifier():
+    ref_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), main.reference_data_path)
+    with open(ref_path, 'r', encoding='utf-8') as f:
+        index = main.build_reference_filename_index(json.load(f))
+    labelled = sorted((rel_path, key) for key, rel_path in set(index.values()))
+    model = main.FilenameClassifier.train(labelled)
+    model.thresholds = main.FilenameClassifier.calibrate_thresholds(labelled)
+    return model
+
+
+@pytest.mark.parametrize("filename", [
+    "sd_xl_base_1.0.safetensors",
+    "ip-adapter_sdxl.safetensors",
+    "ip-adapter-plus_sdxl_vit-h.safetensors",
+    "ip-adapter-faceid_sdxl.bin",
+    "flux1-dev.safetensors",
+    "add_detail_lora.safetensors",
+])
+def test_reference_classifier_does_not_accept_known_mistakes(reference_classifier, filename):
+    key, confidence = reference_classifier.predict([filename])[0]
+    assert not reference_classifier.accepts(key, confidence)
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+import main
+
+SAMPLE = main.DEDUPE_SAMPLE_SIZE
+
+
+@pytest.fixture
+def models(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'folder_paths', None)
+    root = tmp_path / "ComfyUI"
+    (root / "models" / "checkpoints").mkdir(parents=True)
+    (root / "models" / "loras").mkdir(parents=True)
+    return root
+
+
+def _write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def _scan(root, tmp_path):
+    return main.find_duplicate_models(str(root), lambda msg: None, cache_path=str(tmp_path / "cache.json"), max_workers=2)
+
+
+def test_stages_only_read_what_they_need(models, tmp_path):
+    body = os.urandom(SAMPLE * 8)
+    a = _write(models / "models" / "checkpoints" / "a.safetensors", body)
+    b = _write(models / "models" / "loras" / "b.safetensors", body)
+    # 头部和尾部相同, 只有中部不同: 必须在采样阶段就被排除
+    middle = bytearray(body)
+    middle[len(body) // 2] ^= 0xFF
+    c = _write(models / "models" / "loras" / "c.safetensors", bytes(middle))
+    _write(models / "models" / "loras" / "unique.safetensors", os.urandom(SAMPLE * 2))
+
+    report = _scan(models, tmp_path)
+    assert [g['paths'] for g in report['groups']] == [sorted([a, b])]
+    assert report['wasted_bytes'] == len(body)
+    # 3 个文件采样 + 2 个文件完整哈希; 大小唯一的文件一个字节也不读
+    assert report['bytes_read'] == 3 * 3 * SAMPLE + 2 * len(body)
+
+    cache = main.load_hash_cache(str(tmp_path / "cache.json"))
+    assert 'sha256' not in cache[c]
+    assert _scan(models, tmp_path)['bytes_read'] == 0
+
+
+def test_small_files_are_fingerprinted_whole(models, tmp_path):
+    a = _write(models / "models" / "loras" / "a.pt", b"x" * 100 + b"1")
+    b = _write(models / "models" / "loras" / "b.pt", b"x" * 100 + b"2")
+    assert main._sample_fingerprint(a, 101)[0] != main._sample_fingerprint(b, 101)[0]
+    assert _scan(models, tmp_path)['groups'] == []
+
+
+def test_hardlink_replaces_duplicates(models, tmp_path):
+    body = os.urandom(SAMPLE * 4)
+    a = _write(models / "models" / "checkpoints" / "a.safetensors", body)
+    b = _write(models / "models" / "loras" / "b.safetensors", body)
+    report = _scan(models, tmp_path)
+    assert main.hardlink_duplicates(report['groups'], lambda msg: None) == (1, len(body))
+    assert os.stat(a).st_ino == os.stat(b).st_ino
+    # 已硬链接的文件不再算作重复
+    assert _scan(models, tmp_path)['groups'] == []
+
+
+def test_hardlink_skips_file_modified_after_scan(models, tmp_path):
+    body = os.urandom(SAMPLE * 4)
+    _write(models / "models" / "checkpoints" / "a.safetensors", body)
+    b = _write(models / "models" / "loras" / "b.safetensors", body)
+    report = _scan(models, tmp_path)
+
+    # 相同大小的新内容: 只检查大小时会被错误地替换
+    _write(models / "models" / "loras" / "b.safetensors", os.urandom(len(body)))
+    os.utime(b, ns=(1, 1))
+    messages = []
+    assert main.hardlink_duplicates(report['groups'], messages.append) == (0, 0)
+    assert any("已变化" in m for m in messages)
+    assert os.path.getsize(b) == len(body) and open(b, 'rb').read() != body
+
+
+def test_hardlink_skips_file_replaced_after_scan(models, tmp_path):
+    body = os.urandom(SAMPLE * 4)
+    _write(models / "models" / "checkpoints" / "a.safetensors", body)
+    b = _write(models / "models" / "loras" / "b.safetensors", body)
+    report = _scan(models, tmp_path)
+    stat = os.stat(b)
+
+    replacement = _write(tmp_path / "replacement.bin", os.urandom(len(body)))
+    os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(replacement, b)
+    assert main.hardlink_duplicates(report['groups'], lambda msg: None) == (0, 0)
+
+
+def test_hardlink_skips_group_when_kept_file_changed(models, tmp_path):
+    body = os.urandom(SAMPLE * 4)
+    a = _write(models / "models" / "checkpoints" / "a.safetensors", body)
+    b = _write(models / "models" / "loras" / "b.safetensors", body)
+    report = _scan(models, tmp_path)
+    _write(models / "models" / "checkpoints" / "a.safetensors", os.urandom(len(body)))
+    os.utime(a, ns=(1, 1))
+    assert main.hardlink_duplicates(report['groups'], lambda msg: None) == (0, 0)
+    assert open(b, 'rb').read() == body
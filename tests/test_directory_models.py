@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+import main
+
+FILES = [
+    ('clip', 'PixArt-XL-2-1024-MS/transformer/diffusion_pytorch_model.safetensors'),
+    ('clip', 'PixArt-XL-2-1024-MS/vae/diffusion_pytorch_model.safetensors'),
+    ('checkpoints', 'OmniGen-v1/model.safetensors'),
+    ('checkpoints', 'OmniGen-v1/vae/diffusion_pytorch_model.safetensors'),
+    ('vae', 'restoration/VAE_A_quality/latest_net_G.pth'),
+    ('vae', 'restoration/VAE_B_quality/latest_net_G.pth'),
+    ('controlnet', 'SD3/sd3-controlnet-tile.safetensors'),
+    ('clip', 'sd3/clip_g.safetensors'),
+]
+FILE_INDEX = {rel_path.lower(): (key, rel_path) for key, rel_path in FILES}
+
+
+def _write(path, data=b"x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+@pytest.fixture
+def reference_index(monkeypatch):
+    monkeypatch.setattr(main, 'get_reference_index', lambda: FILE_INDEX)
+    return FILE_INDEX
+
+
+def test_multi_component_pipelines_are_indexed():
+    index = main.build_directory_index(FILE_INDEX)
+    assert index['pixart-xl-2-1024-ms'] == ('clip', 'PixArt-XL-2-1024-MS')
+    assert index['omnigen-v1'] == ('checkpoints', 'OmniGen-v1')
+
+
+def test_leaf_directories_and_unique_aliases_are_indexed():
+    index = main.build_directory_index(FILE_INDEX)
+    assert index['restoration/vae_a_quality'] == ('vae', 'restoration/VAE_A_quality')
+    assert index['vae_a_quality'] == ('vae', 'restoration/VAE_A_quality')
+
+
+def test_components_and_mixed_directories_are_not_indexed():
+    index = main.build_directory_index(FILE_INDEX)
+    assert 'transformer' not in index
+    assert 'vae' not in index
+    assert 'sd3' not in index # controlnet 和 clip 混合
+
+
+def test_find_model_directories_matches_pipeline(tmp_path, reference_index):
+    download = tmp_path / "download"
+    _write(str(download / "PixArt-XL-2-1024-MS" / "transformer" / "diffusion_pytorch_model.safetensors"))
+    _write(str(download / "PixArt-XL-2-1024-MS" / "vae" / "diffusion_pytorch_model.safetensors"))
+    _write(str(download / "PixArt-XL-2-1024-MS" / "model_index.json"))
+    assert main.find_model_directories(str(download), {}) == [("PixArt-XL-2-1024-MS", 'clip', 'PixArt-XL-2-1024-MS')]
+
+
+def test_directory_with_unknown_model_file_is_not_matched(tmp_path, reference_index):
+    download = tmp_path / "download"
+    _write(str(download / "OmniGen-v1" / "model.safetensors"))
+    _write(str(download / "OmniGen-v1" / "my_finetune.safetensors"))
+    assert main.find_model_directories(str(download), {}) == []
+
+
+def test_move_merges_into_existing_directory(tmp_path):
+    source = tmp_path / "download" / "OmniGen-v1"
+    destination = tmp_path / "models" / "checkpoints" / "OmniGen-v1"
+    _write(str(source / "model.safetensors"), b"new")
+    _write(str(source / "vae" / "diffusion_pytorch_model.safetensors"), b"vae")
+    _write(str(destination / "model.safetensors"), b"old")
+    _write(str(destination / "user_notes.txt"), b"keep")
+    assert main.move_model_directory(str(source), str(destination), lambda msg: None) is True
+    assert (destination / "model.safetensors").read_bytes() == b"new"
+    assert (destination / "vae" / "diffusion_pytorch_model.safetensors").read_bytes() == b"vae"
+    assert (destination / "user_notes.txt").read_bytes() == b"keep"
+    assert not source.exists()
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+import main
+
+
+class FakeClassifier:
+    def predict(self, filenames):
+        return [("vae", 0.99) if "vae" in name else ("loras", 0.4) for name in filenames]
+
+    def accepts(self, key, confidence, min_confidence=None):
+        return confidence >= 0.9
+
+
+@pytest.fixture
+def planner(monkeypatch):
+    monkeypatch.setattr(main, 'reference_data', {})
+    monkeypatch.setattr(main, 'get_reference_index', lambda: {"known_lora.safetensors": ("loras", "known_lora.safetensors")})
+    monkeypatch.setattr(main, 'filename_classifier', FakeClassifier())
+    monkeypatch.setattr(main, 'peek_destination_folder', lambda key, comfyui_path: f"{comfyui_path}/models/{key}")
+
+
+def test_plan_download_files(planner):
+    rows = main.plan_download_files(
+        ["Known_Lora.safetensors", "my_vae.safetensors", "mystery.safetensors", "bundle.zip", "readme.txt"], "/comfy")
+    assert rows == [
+        ("loras", "/comfy/models/loras"),
+        ("vae ~99%", "/comfy/models/vae"),
+        ("", ""),
+        ("(archive)", ""),
+        ("", ""),
+    ]
+
+
+def test_plan_without_comfyui_path_has_no_destinations(planner):
+    assert main.plan_download_files(["known_lora.safetensors"], None) == [("loras", "")]
+
+
+def test_scan_download_folder_batches(planner, tmp_path):
+    for i in range(5):
+        (tmp_path / f"file{i}.safetensors").write_bytes(b"x" * i)
+    (tmp_path / "subdir").mkdir()
+    batches = list(main.scan_download_folder(str(tmp_path), "/comfy", batch_size=2))
+    assert [len(names) for names, _, _, _ in batches] == [2, 2, 1]
+    sizes = {name: size for names, sizes, _, _ in batches for name, size in zip(names, sizes)}
+    assert sizes == {f"file{i}.safetensors": i for i in range(5)}
+
+
+def test_scan_download_folder_stops(planner, tmp_path):
+    for i in range(5):
+        (tmp_path / f"file{i}.safetensors").write_bytes(b"")
+    stop = threading.Event()
+    scan = main.scan_download_folder(str(tmp_path), None, batch_size=2, stop_event=stop)
+    next(scan)
+    stop.set()
+    assert list(scan) == []
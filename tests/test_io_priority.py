@@ -0,0 +1,72 @@
+import os
+import threading
+import zipfile
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def priority_calls(monkeypatch):
+    """Record the threads that set an idle I/O priority"""
+    calls = set()
+
+    def fake_set_io_priority(idle):
+        if idle:
+            calls.add(threading.get_ident())
+        return True
+
+    monkeypatch.setattr(main, 'set_io_priority', fake_set_io_priority)
+    monkeypatch.setattr(main.bandwidth_limiter, 'idle_io', True)
+    return calls
+
+
+def test_zip_extraction_threads_use_idle_priority(tmp_path, monkeypatch, priority_calls):
+    monkeypatch.setattr(main, 'get_reference_index', lambda: {})
+    monkeypatch.setattr(main, 'get_script_dir', lambda: str(tmp_path))
+    writers = set()
+    real_extract = main._extract_one_member
+
+    def recording_extract(*args, **kwargs):
+        writers.add(threading.get_ident())
+        return real_extract(*args, **kwargs)
+
+    monkeypatch.setattr(main, '_extract_one_member', recording_extract)
+    archive = str(tmp_path / "pack.zip")
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr("my_lora.safetensors", b"x")
+    mapping = {'my_lora.safetensors': ('loras', 'my_lora.safetensors')}
+    counts = main.ingest_archive(archive, mapping, {'loras': str(tmp_path / "loras")}, lambda msg: None)
+    assert counts['moved'] == 1
+    assert writers and writers <= priority_calls
+
+
+def test_directory_copy_threads_use_idle_priority(tmp_path, monkeypatch, priority_calls):
+    source = tmp_path / "download" / "model"
+    source.mkdir(parents=True)
+    (source / "a.safetensors").write_bytes(b"a")
+    (source / "b.safetensors").write_bytes(b"b")
+    destination = tmp_path / "models" / "model"
+    real_stat = os.stat
+
+    def cross_device_stat(path, *args, **kwargs):
+        result = real_stat(path, *args, **kwargs)
+        if os.fspath(path) == str(source):
+            values = list(result)
+            values[2] += 1 # st_dev: 让源目录看起来在另一个设备上
+            return os.stat_result(values)
+        return result
+
+    monkeypatch.setattr(main.os, 'stat', cross_device_stat)
+    copiers = set()
+    real_copy = main._copy_file_for_directory
+
+    def recording_copy(*args, **kwargs):
+        copiers.add(threading.get_ident())
+        return real_copy(*args, **kwargs)
+
+    monkeypatch.setattr(main, '_copy_file_for_directory', recording_copy)
+    main.move_model_directory(str(source), str(destination), lambda msg: None, max_workers=2)
+    assert (destination / "a.safetensors").read_bytes() == b"a"
+    assert copiers and copiers <= priority_calls
@@ -0,0 +1,77 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+import main
+
+
+class _EchoHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(0.005) # 模拟处理时间, 让连接在监听队列中堆积
+        data = json.dumps({'echo': json.loads(body)}).encode('utf-8')
+        self.send_response(202)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = main.JobAPIServer(("127.0.0.1", 0), _EchoHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_server_backlog_is_large():
+    assert main.JobAPIServer.request_queue_size >= 128
+
+
+def test_burst_of_concurrent_submissions_is_accepted(server):
+    port = server.server_address[1]
+
+    def post(i):
+        return main.call_job_api("POST", "/jobs", {'files': [f"/downloads/{i}.safetensors"]}, port=port)
+
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        results = list(executor.map(post, range(200)))
+    assert [status for status, _ in results] == [202] * 200
+
+
+def test_call_job_api_retries_reset_connections(server, monkeypatch):
+    port = server.server_address[1]
+    real_request = main.http.client.HTTPConnection.request
+    failures = []
+
+    def flaky_request(self, *args, **kwargs):
+        if len(failures) < 2:
+            failures.append(1)
+            raise ConnectionResetError("connection reset by peer")
+        return real_request(self, *args, **kwargs)
+
+    monkeypatch.setattr(main.http.client.HTTPConnection, 'request', flaky_request)
+    monkeypatch.setattr(main.time, 'sleep', lambda seconds: None)
+    status, result = main.call_job_api("POST", "/jobs", {'files': ["a"]}, port=port)
+    assert status == 202 and result == {'echo': {'files': ["a"]}}
+    assert len(failures) == 2
+
+
+def test_call_job_api_gives_up_after_retries(monkeypatch):
+    def refused(self, *args, **kwargs):
+        raise ConnectionRefusedError("refused")
+
+    monkeypatch.setattr(main.http.client.HTTPConnection, 'request', refused)
+    monkeypatch.setattr(main.time, 'sleep', lambda seconds: None)
+    with pytest.raises(ConnectionRefusedError):
+        main.call_job_api("GET", "/jobs", port=1, retries=2)
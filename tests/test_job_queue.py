@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def job_queue(tmp_path, monkeypatch):
+    comfyui = tmp_path / "ComfyUI"
+    comfyui.mkdir()
+    destination = tmp_path / "ComfyUI" / "models" / "loras"
+    monkeypatch.setattr(main, 'load_reference_data', lambda status_callback: True)
+    monkeypatch.setattr(main, 'initialize_folder_paths', lambda *args, **kwargs: True)
+    monkeypatch.setattr(main, 'get_destination_folder', lambda key, comfyui_path, status_callback: str(destination))
+    queue = main.MoveJobQueue(str(tmp_path / "jobs.json"), default_comfyui=str(comfyui))
+    return queue, destination
+
+
+def _write(path):
+    with open(path, 'wb') as f:
+        f.write(b"model")
+    return str(path)
+
+
+def test_file_vanishing_during_planning_does_not_fail_batch(tmp_path, job_queue, monkeypatch):
+    queue, destination = job_queue
+    kept = _write(tmp_path / "kept.safetensors")
+    vanished = _write(tmp_path / "vanished.safetensors")
+    job = queue.submit({'files': [kept, vanished], 'folder_key': 'loras'})
+    real_getsize = os.path.getsize
+
+    def getsize(path):
+        if path == vanished:
+            raise FileNotFoundError(2, "No such file or directory", path)
+        return real_getsize(path)
+
+    monkeypatch.setattr(main.os.path, 'getsize', getsize)
+    with queue.lock:
+        job['status'] = 'running'
+    queue._run_batch([job])
+
+    result = queue.get(job['id'])
+    assert result['status'] == 'done'
+    assert result['report']['moved'] == 1 and result['report']['skipped'] == 1
+    assert result['report']['files'][kept] == 'moved'
+    assert result['report']['files'][vanished].startswith('skipped')
+    assert (destination / "kept.safetensors").exists()
+
+
+def test_results_of_submitted_tasks_are_recorded_when_planning_fails(tmp_path, job_queue, monkeypatch):
+    queue, destination = job_queue
+    first = _write(tmp_path / "first.safetensors")
+    second = _write(tmp_path / "second.safetensors")
+    job = queue.submit({'files': [first, second], 'folder_key': 'loras'})
+    real_is_same_device = main.is_same_device
+
+    def is_same_device(path, folder):
+        if path == second:
+            raise RuntimeError("unexpected")
+        return real_is_same_device(path, folder)
+
+    monkeypatch.setattr(main, 'is_same_device', is_same_device)
+    with pytest.raises(RuntimeError):
+        queue._run_batch([job])
+    assert queue.get(job['id'])['report']['files'][first] == 'moved'
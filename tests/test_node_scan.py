@@ -0,0 +1,83 @@
+import json
+import textwrap
+
+import pytest
+
+import main
+
+NODES = textwrap.dedent('''
+    import folder_paths
+
+    def lora_list():
+        return folder_paths.get_filename_list("loras")
+
+    class BaseLoader:
+        @classmethod
+        def INPUT_TYPES(cls):
+            return {"required": {"name": (folder_paths.get_filename_list("instantid"),)}}
+        RETURN_TYPES = ("INSTANTID",)
+
+    class InheritedLoader(BaseLoader):
+        pass
+
+    class HelperLoader:
+        @classmethod
+        def INPUT_TYPES(cls):
+            return {"required": {"lora_name": (lora_list(),)}}
+        RETURN_TYPES = ("MODEL", "CLIP")
+
+    class NotALoader:
+        RETURN_TYPES = ("IMAGE",)
+
+    NODE_CLASS_MAPPINGS = {"BaseLoader": BaseLoader, "NotALoader": NotALoader}
+    NODE_CLASS_MAPPINGS["InheritedLoader"] = InheritedLoader
+    NODE_CLASS_MAPPINGS.update({"HelperLoader": HelperLoader})
+''')
+
+
+@pytest.fixture
+def comfyui(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'folder_paths', None)
+    monkeypatch.setattr(main, 'get_script_dir', lambda: str(tmp_path))
+    root = tmp_path / "ComfyUI"
+    (root / "custom_nodes" / "pack").mkdir(parents=True)
+    (root / "custom_nodes" / "pack" / "__init__.py").write_text(NODES)
+    return root
+
+
+def test_scan_node_file_finds_loaders(comfyui):
+    result = main.scan_node_file(str(comfyui / "custom_nodes" / "pack" / "__init__.py"))
+    assert result['classes']['BaseLoader']['folder_keys'] == ["instantid"]
+    assert result['classes']['HelperLoader']['folder_keys'] == ["loras"]
+    assert result['classes']['InheritedLoader']['bases'] == ["BaseLoader"]
+    assert set(result['mappings']) == {"BaseLoader", "NotALoader", "InheritedLoader", "HelperLoader"}
+
+
+def test_inherited_input_types_are_resolved(comfyui, tmp_path):
+    loaders = main.scan_comfyui_nodes(str(comfyui), lambda msg: None, cache_path=str(tmp_path / "scan.json"))
+    assert loaders == {
+        "BaseLoader": {'output_types': ["INSTANTID"], 'folder_keys': ["instantid"]},
+        "InheritedLoader": {'output_types': ["INSTANTID"], 'folder_keys': ["instantid"]},
+        "HelperLoader": {'output_types': ["MODEL", "CLIP"], 'folder_keys': ["loras"]},
+    }
+
+
+def test_scan_without_folder_paths_warns_and_keeps_model_files(comfyui, tmp_path):
+    output = tmp_path / "reference.json"
+    output.write_text(json.dumps({"HelperLoader": {'model_files': ["old.safetensors"], 'output_types': [], 'folder_keys': []}}))
+    messages = []
+    assert main.generate_reference_data(str(comfyui), messages.append, output_path=str(output),
+                                        cache_path=str(tmp_path / "scan.json")) == 3
+    data = json.loads(output.read_text())
+    assert data["HelperLoader"] == {'model_files': ["old.safetensors"], 'output_types': ["MODEL", "CLIP"], 'folder_keys': ["loras"]}
+    assert data["BaseLoader"]['model_files'] == []
+    assert any("未合并" in m for m in messages)
+
+
+def test_scan_nodes_cli_reports_missing_folder_paths_as_warning(comfyui, tmp_path, capsys):
+    output = tmp_path / "reference.json"
+    assert main.run_cli(["scan-nodes", str(comfyui), "--output", str(output)]) == 0
+    out = capsys.readouterr().out
+    assert "Error" not in out
+    assert "Warning: ComfyUI's folder_paths module could not be loaded" in out
+    assert "InheritedLoader" in json.loads(output.read_text())
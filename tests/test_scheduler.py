@@ -0,0 +1,119 @@
+import io
+import os
+import threading
+
+import pytest
+
+import main
+
+
+def _wait_for(predicate, timeout=5.0):
+    event = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if predicate():
+            return True
+        event.wait(0.01)
+    return predicate()
+
+
+def test_submit_refuses_path_in_use(tmp_path):
+    scheduler = main.MoveScheduler(workers=1)
+    scheduler.pause()
+    source = str(tmp_path / "a.safetensors")
+    first = scheduler.submit("a", lambda control, progress: 'moved', paths=(source, str(tmp_path / "dest" / "a.safetensors")))
+    with pytest.raises(main.MoveConflict):
+        scheduler.submit("a again", lambda control, progress: 'moved', paths=(source, str(tmp_path / "other.safetensors")))
+    with pytest.raises(main.MoveConflict):
+        scheduler.submit("same destination", lambda control, progress: 'moved',
+                         paths=(str(tmp_path / "b.safetensors"), str(tmp_path / "dest" / "a.safetensors")))
+    scheduler.resume()
+    assert first.wait(5) == 'moved'
+    # 任务结束后路径被释放
+    again = scheduler.submit("a again", lambda control, progress: 'moved', paths=(source,))
+    assert again.wait(5) == 'moved'
+
+
+def test_submit_refuses_parent_and_child_directories(tmp_path):
+    scheduler = main.MoveScheduler(workers=1)
+    scheduler.pause()
+    scheduler.submit("dir", lambda control, progress: 'moved', paths=(str(tmp_path / "model"),))
+    with pytest.raises(main.MoveConflict):
+        scheduler.submit("child", lambda control, progress: 'moved', paths=(str(tmp_path / "model" / "vae" / "x.bin"),))
+    with pytest.raises(main.MoveConflict):
+        scheduler.submit("parent", lambda control, progress: 'moved', paths=(str(tmp_path),))
+    scheduler.submit("sibling", lambda control, progress: 'moved', paths=(str(tmp_path / "model2"),))
+    scheduler.cancel_all()
+
+
+def test_cancelled_pending_task_releases_paths(tmp_path):
+    scheduler = main.MoveScheduler(workers=1)
+    scheduler.pause()
+    source = str(tmp_path / "a.safetensors")
+    task = scheduler.submit("a", lambda control, progress: 'moved', paths=(source,))
+    assert scheduler.cancel(task.id)
+    assert task.wait(1) == 'cancelled'
+    scheduler.submit("a", lambda control, progress: 'moved', paths=(source,))
+    scheduler.cancel_all()
+
+
+def test_pause_holds_queued_tasks_and_cancel_stops_running_copy(tmp_path):
+    scheduler = main.MoveScheduler(workers=1)
+    started = threading.Event()
+
+    def slow(control, progress):
+        started.set()
+        while True:
+            control.checkpoint()
+            threading.Event().wait(0.01)
+
+    running = scheduler.submit("slow", slow)
+    assert started.wait(5)
+    scheduler.pause()
+    queued = scheduler.submit("queued", lambda control, progress: 'moved')
+    assert not queued.done_event.wait(0.3)
+    assert scheduler.cancel(running.id)
+    scheduler.resume()
+    assert running.wait(5) == 'cancelled'
+    assert queued.wait(5) == 'moved'
+
+
+class _PausingReader(io.BytesIO):
+    """Pauses the given run_event after every chunk read"""
+    def __init__(self, data, run_event):
+        super().__init__(data)
+        self.run_event = run_event
+        self.reads = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.reads += 1
+        self.run_event.clear()
+        return chunk
+
+
+def test_concurrent_streams_to_same_destination_do_not_share_part_file(tmp_path):
+    destination = str(tmp_path / "model.safetensors")
+    control = main.MoveControl()
+    reader = _PausingReader(b"B" * 64, control.run_event)
+    result = {}
+
+    def paused_writer():
+        try:
+            main.stream_to_file(reader, destination, chunk_size=16, control=control)
+        except main.MoveCancelled:
+            result['cancelled'] = True
+
+    thread = threading.Thread(target=paused_writer)
+    thread.start()
+    assert _wait_for(lambda: not control.run_event.is_set())
+    # 暂停的写入者之外, 另一个写入者完成同一目标
+    main.stream_to_file(io.BytesIO(b"A" * 64), destination, chunk_size=16)
+    # 恢复后暂停的写入者再写一块, 然后被取消: 已完成的目标文件必须保持不变
+    control.run_event.set()
+    assert _wait_for(lambda: reader.reads == 2 and not control.run_event.is_set())
+    control.cancel()
+    thread.join(5)
+    assert result.get('cancelled')
+    with open(destination, 'rb') as f:
+        assert f.read() == b"A" * 64
+    assert os.listdir(tmp_path) == ["model.safetensors"]